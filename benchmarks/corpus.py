@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+from dataclasses import asdict, dataclass
+from typing import List
+
+import numpy as np
+import soundfile as sf
+
+
+@dataclass
+class CorpusSpec:
+    """
+    Shape of a synthetic corpus. The same spec always produces the same files.
+    """
+
+    clips: int = 100
+    # "lognormal" around median_seconds (most game lines are short barks), or "uniform"
+    distribution: str = "lognormal"
+    median_seconds: float = 2.5
+    min_seconds: float = 0.5
+    max_seconds: float = 12.0
+    # Share of clips with music and ambiance under the voice; the rest are dry voice-over
+    background_ratio: float = 0.7
+    # Share of clips that are exact copies of an earlier clip, as repeated barks are
+    repeat_ratio: float = 0.1
+    speakers: int = 6
+    sample_rate: int = 44100
+    channels: int = 1
+    seed: int = 0
+
+    def durations(self) -> List[float]:
+        rng = np.random.default_rng(self.seed)
+        if self.distribution == "uniform":
+            durations = rng.uniform(self.min_seconds, self.max_seconds, self.clips)
+        elif self.distribution == "lognormal":
+            durations = rng.lognormal(np.log(self.median_seconds), 0.6, self.clips)
+        else:
+            raise ValueError(f"Unknown clip length distribution: {self.distribution}")
+        return [round(float(d), 2) for d in np.clip(durations, self.min_seconds, self.max_seconds)]
+
+    def fingerprint(self) -> str:
+        return hashlib.sha256(json.dumps(asdict(self), sort_keys=True).encode()).hexdigest()[:12]
+
+
+def _speaker(rng: np.random.Generator):
+    """Pitch and three formants (center, bandwidth) of a random voice."""
+    f0 = rng.uniform(95, 230)
+    formants = [(rng.uniform(350, 800), 140), (rng.uniform(1100, 2100), 220), (rng.uniform(2400, 3000), 300)]
+    return f0, formants
+
+
+def voice(seconds: float, rate: int, f0: float, formants, rng: np.random.Generator) -> np.ndarray:
+    """
+    Speech-like signal: harmonics of a wavering pitch shaped by formants, pulsed at syllable rate,
+    with short pauses between words.
+    """
+    t = np.arange(int(rate * seconds)) / rate
+    pitch = f0 * (1 + 0.08 * np.sin(2 * np.pi * rng.uniform(0.3, 0.8) * t + rng.uniform(0, 6)))
+    phase = 2 * np.pi * np.cumsum(pitch) / rate
+    samples = np.zeros_like(t)
+    for k in range(1, 40):
+        if k * f0 > min(7000, rate / 2 - 500):
+            break
+        amplitude = sum(np.exp(-(((k * f0 - center) / width) ** 2)) for center, width in formants) + 0.02
+        samples += amplitude * np.sin(k * phase + rng.uniform(0, 6))
+    syllables = np.clip(np.sin(2 * np.pi * rng.uniform(3, 5) * t + rng.uniform(0, 6)), 0, None) ** 0.7
+    words = (np.sin(2 * np.pi * rng.uniform(0.6, 1.0) * t + rng.uniform(0, 6)) > -0.8).astype(np.float64)
+    samples *= syllables * words
+    return 0.3 * samples / (np.abs(samples).max() + 1e-9)
+
+
+def background(frames: int, rate: int, rng: np.random.Generator) -> np.ndarray:
+    """Brownish ambiance under a slow chord, around 20 dB below the voice."""
+    noise = np.cumsum(rng.normal(0, 1, frames))
+    noise -= np.convolve(noise, np.ones(512) / 512, mode="same")
+    t = np.arange(frames) / rate
+    root = rng.uniform(110, 220)
+    chord = sum(np.sin(2 * np.pi * root * ratio * t + rng.uniform(0, 6)) for ratio in (1, 1.25, 1.5))
+    mix = noise / (np.abs(noise).max() + 1e-9) + 0.5 * chord / 3
+    return 0.03 * mix / (np.abs(mix).max() + 1e-9)
+
+
+def make_corpus(spec: CorpusSpec, output_dir: str) -> List[str]:
+    """
+    Writes the corpus as 16-bit WAVs named clip_00001.wav, ... and returns their paths.
+    A corpus already written for the same spec is reused.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    marker = os.path.join(output_dir, "corpus.json")
+    paths = [os.path.join(output_dir, f"clip_{i + 1:05d}.wav") for i in range(spec.clips)]
+    if os.path.exists(marker):
+        with open(marker, "r") as f:
+            if json.load(f).get("fingerprint") == spec.fingerprint() and all(map(os.path.exists, paths)):
+                return paths
+
+    rng = np.random.default_rng(spec.seed)
+    speakers = [_speaker(rng) for _ in range(max(1, spec.speakers))]
+    for i, (path, seconds) in enumerate(zip(paths, spec.durations())):
+        clip_rng = np.random.default_rng([spec.seed, i])
+        if i and clip_rng.random() < spec.repeat_ratio:
+            # Bytes of an earlier clip, as a game reusing the same bark under another name
+            with open(paths[int(clip_rng.integers(0, i))], "rb") as src, open(path, "wb") as dst:
+                dst.write(src.read())
+            continue
+        f0, formants = speakers[int(clip_rng.integers(0, len(speakers)))]
+        samples = voice(seconds, spec.sample_rate, f0, formants, clip_rng)
+        if clip_rng.random() < spec.background_ratio:
+            samples += background(samples.shape[0], spec.sample_rate, clip_rng)
+        else:
+            # Dither only: recorded dry in a booth
+            samples += clip_rng.normal(0, 1e-5, samples.shape[0])
+        data = np.repeat(samples[:, None], spec.channels, axis=1).astype(np.float32)
+        sf.write(path, data, spec.sample_rate, subtype="PCM_16")
+
+    with open(marker, "w") as f:
+        json.dump({"fingerprint": spec.fingerprint(), "spec": asdict(spec)}, f, indent=4)
+    return paths
@@ -0,0 +1,287 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, fields
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional, Union
+
+import numpy as np
+
+from src.models.tts import TTSRequest
+from src.models.voice_prompt_cache import VoicePromptCache
+from src.utils.audio_io import AudioBuffer
+from src.utils.audio_processor import AudioProcessor
+
+WORDS = (
+    "the enemy is coming hold this position we need more ammo over there move out cover me "
+    "I will check the north gate stay close watch your back they are everywhere fall back now "
+    "the bridge is clear get to the truck reloading target down good work keep moving "
+    "someone is behind that wall find the key before night open the door quickly"
+).split()
+
+
+@dataclass
+class BackendLatency:
+    """
+    Seconds the stand-in backends spend per call and per second of audio (or per token), roughly
+    those of the real models on a mid-range GPU. Each backend runs one call at a time, as the
+    Demucs and DeepFilterNet workers and the loaded STT and TTS models do.
+    """
+
+    separate_call: float = 0.15
+    separate_per_second: float = 0.04
+    denoise_call: float = 0.05
+    denoise_per_second: float = 0.02
+    stt_call: float = 0.08
+    stt_per_second: float = 0.03
+    tts_call: float = 0.2
+    # Per second of generated speech
+    tts_per_second: float = 0.5
+    # A batch runs at the pace of its longest line; each further line adds this share of it
+    tts_batch_overhead: float = 0.1
+    llm_request: float = 0.15
+    llm_per_token: float = 0.012
+
+    def scaled(self, factor: float) -> "BackendLatency":
+        """
+        All latencies multiplied by `factor`; 0 leaves only the pipeline's own work to measure.
+        """
+        return BackendLatency(**{f.name: getattr(self, f.name) * factor for f in fields(self)})
+
+
+def _busy(lock: threading.Lock, seconds: float):
+    """Holds the backend for `seconds`, as a model busy with one call would."""
+    with lock:
+        if seconds > 0:
+            time.sleep(seconds)
+
+
+def _seed(*parts) -> int:
+    digest = hashlib.blake2b("\x1f".join(map(str, parts)).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def _audio_seed(audio: AudioBuffer) -> int:
+    return int.from_bytes(hashlib.blake2b(audio.samples.tobytes(), digest_size=8).digest(), "little")
+
+
+def fake_translation(text: str) -> str:
+    """Deterministic stand-in translation of about the same length: every word spelled backwards."""
+    return re.sub(r"[A-Za-z]+", lambda match: match.group(0)[::-1], text)
+
+
+class FakeOllamaServer:
+    """
+    Local HTTP server answering /api/generate like Ollama, so the real OllamaTranslator and its
+    client (pooling, batching, retries) are part of the benchmark. Translations are fake_translation()
+    of each line. Answers take `llm_request` plus `llm_per_token` per generated token, with at most
+    `parallel` requests generating at once, as OLLAMA_NUM_PARALLEL allows.
+    """
+
+    def __init__(self, latency: Optional[BackendLatency] = None, parallel: int = 2):
+        self.latency = latency or BackendLatency()
+        self.requests = 0
+        self._slots = threading.BoundedSemaphore(max(1, parallel))
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-ollama", daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeOllamaServer":
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeOllamaServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def respond(self, prompt: str) -> str:
+        """
+        The model's answer to a translation prompt of OllamaTranslator, as JSON text.
+        """
+        target = re.search(r"from English to (.+?)\.", prompt)
+        language = (target.group(1) if target else "portuguese").split()[-1].lower()
+        quoted = re.search(r"###\s*(.*?)\s*###", prompt, re.DOTALL)
+        source = quoted.group(1) if quoted else ""
+
+        def fields_of(text: str) -> dict:
+            return {
+                "text": fake_translation(text),
+                "tts_instruction": f"Neutral {language} pronunciation",
+                "target_language": language,
+            }
+
+        if "Lines to translate:" in prompt:
+            lines = json.loads(source)
+            return json.dumps({"translations": [{"id": line["id"], **fields_of(line["text"])} for line in lines]})
+        return json.dumps(fields_of(source))
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if self.path != "/api/generate":
+                    self.send_error(404)
+                    return
+                with fake._lock:
+                    fake.requests += 1
+                response = fake.respond(payload.get("prompt", ""))
+                # About four characters per token
+                _busy(fake._slots, fake.latency.llm_request + fake.latency.llm_per_token * len(response) / 4)
+                body = json.dumps({"model": payload.get("model"), "response": response, "done": True}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+
+class FakeTranscriber:
+    """
+    Stand-in for FasterWhisperTranscriber. The same audio always gets the same text: about
+    2.5 words per second from a fixed vocabulary, in sentences of up to four seconds.
+    """
+
+    def __init__(self, latency: Optional[BackendLatency] = None, model_size: str = "fake-whisper"):
+        self.latency = latency or BackendLatency()
+        self.model_size = model_size
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _segments(self, audio: AudioBuffer) -> List[dict]:
+        rng = np.random.default_rng(_audio_seed(audio))
+        segments, start = [], 0.0
+        while start < audio.duration - 0.2:
+            end = min(audio.duration, start + 4.0)
+            words = [str(word) for word in rng.choice(WORDS, max(1, round((end - start) * 2.5)))]
+            text = " ".join(words).capitalize() + "."
+            segments.append({"start": round(start, 2), "end": round(end, 2), "text": f" {text}"})
+            start = end
+        return segments or [{"start": 0.0, "end": round(audio.duration, 2), "text": " Hey."}]
+
+    @staticmethod
+    def _load(audio: Union[str, AudioBuffer]) -> AudioBuffer:
+        return audio if isinstance(audio, AudioBuffer) else AudioBuffer.read(audio, 16000, 1)
+
+    def transcribe(self, audio: Union[str, AudioBuffer], language: str = "en") -> List[dict]:
+        audio = self._load(audio)
+        self.calls += 1
+        _busy(self._lock, self.latency.stt_call + self.latency.stt_per_second * audio.duration)
+        return self._segments(audio)
+
+    def transcribe_batch(self, audios: List[Union[str, AudioBuffer]], language: str = "en") -> List[List[dict]]:
+        audios = [self._load(audio) for audio in audios]
+        self.calls += 1
+        seconds = sum(audio.duration for audio in audios)
+        _busy(self._lock, self.latency.stt_call + self.latency.stt_per_second * seconds)
+        return [self._segments(audio) for audio in audios]
+
+
+class FakeTTS:
+    """
+    Stand-in for TTSWrapper producing a pitched, syllable-pulsed tone of about 14 characters
+    per second at the Qwen3-TTS output rate.
+    """
+
+    SAMPLE_RATE = 24000
+
+    def __init__(self, latency: Optional[BackendLatency] = None, model_id: str = "fake-tts"):
+        self.latency = latency or BackendLatency()
+        self.model_id = model_id
+        self.voice_cache = VoicePromptCache()
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def seconds_for(text: str) -> float:
+        return max(0.4, len(text) / 14)
+
+    def _speech(self, text: str, instruct: Optional[str]) -> AudioBuffer:
+        seconds = self.seconds_for(text)
+        t = np.arange(int(self.SAMPLE_RATE * seconds)) / self.SAMPLE_RATE
+        f0 = 100 + _seed(text, instruct) % 120
+        pulse = np.clip(np.sin(2 * np.pi * 4 * t), 0, None)
+        return AudioBuffer((0.2 * np.sin(2 * np.pi * f0 * t) * pulse).astype(np.float32), self.SAMPLE_RATE)
+
+    def synthesize(
+        self,
+        text: str,
+        ref_audio: Union[str, AudioBuffer],
+        language: str = "Portuguese",
+        ref_text: Optional[str] = None,
+        instruct: Optional[str] = None,
+    ) -> Optional[AudioBuffer]:
+        self.calls += 1
+        _busy(self._lock, self.latency.tts_call + self.latency.tts_per_second * self.seconds_for(text))
+        return self._speech(text, instruct)
+
+    def synthesize_batch(self, requests: List[TTSRequest]) -> List[Optional[AudioBuffer]]:
+        if not requests:
+            return []
+        self.calls += 1
+        longest = max(self.seconds_for(request.text) for request in requests)
+        padded = longest * (1 + self.latency.tts_batch_overhead * (len(requests) - 1))
+        _busy(self._lock, self.latency.tts_call + self.latency.tts_per_second * padded)
+        return [self._speech(request.text, request.instruct) for request in requests]
+
+
+class FakeAudioProcessor(AudioProcessor):
+    """
+    AudioProcessor whose Demucs and DeepFilterNet workers are replaced by stand-ins. Separation writes
+    44.1 kHz stereo stems as Demucs does, with the clip as vocals and a quieter copy as background;
+    denoising rewrites the vocals. Mixing, dry voice-over detection and everything else is the real code.
+    """
+
+    SEPARATION_RATE = 44100
+
+    def __init__(self, latency: Optional[BackendLatency] = None):
+        super().__init__()
+        self.latency = latency or BackendLatency()
+        self.separations = 0
+        self.denoises = 0
+        self._separate_lock = threading.Lock()
+        self._denoise_lock = threading.Lock()
+
+    def separate_vocals(self, audio_path: str, output_dir: str) -> Optional[dict]:
+        audio = AudioBuffer.read(audio_path, self.SEPARATION_RATE, 2)
+        self.separations += 1
+        _busy(self._separate_lock, self.latency.separate_call + self.latency.separate_per_second * audio.duration)
+        stem_dir = os.path.join(output_dir, self.SEPARATION_MODEL, os.path.splitext(os.path.basename(audio_path))[0])
+        os.makedirs(stem_dir, exist_ok=True)
+        stems = {
+            "vocals": os.path.join(stem_dir, "vocals.wav"),
+            "background": os.path.join(stem_dir, "no_vocals.wav"),
+        }
+        audio.write(stems["vocals"])
+        AudioBuffer(audio.samples * 0.1, audio.sample_rate).write(stems["background"])
+        return stems
+
+    def denoise_vocals(self, vocal_path: str, output_path: str) -> Optional[str]:
+        audio = AudioBuffer.read(vocal_path)
+        self.denoises += 1
+        _busy(self._denoise_lock, self.latency.denoise_call + self.latency.denoise_per_second * audio.duration)
+        audio.write(output_path)
+        return output_path
@@ -0,0 +1,293 @@
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from dataclasses import asdict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import typer
+
+from benchmarks.corpus import CorpusSpec, make_corpus
+from benchmarks.fakes import BackendLatency, FakeAudioProcessor, FakeOllamaServer, FakeTranscriber, FakeTTS
+from src.core.pipeline import DubbingPipeline
+from src.models.model_registry import MIB, ModelRegistry, resident_bytes
+
+logger = logging.getLogger(__name__)
+
+app = typer.Typer(help="Throughput benchmark of the dubbing pipeline on synthetic clips with stand-in models.")
+
+MODES = ("pipelined", "sequential")
+
+
+class PeakRSS:
+    """
+    Samples the resident set size in a background thread and keeps the highest value seen.
+    """
+
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.peak = resident_bytes() or 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name="peak-rss", daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, resident_bytes() or 0)
+
+    def __enter__(self) -> "PeakRSS":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, resident_bytes() or 0)
+
+
+def written_bytes() -> Optional[int]:
+    """
+    Bytes this process has passed to write calls so far (files and sockets), or None without /proc.
+    """
+    try:
+        with open("/proc/self/io", "r") as f:
+            counters = dict(line.split(": ") for line in f.read().splitlines())
+        return int(counters["wchar"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def directory_bytes(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def build_pipeline(output_dir: str, ollama_url: str, latency: BackendLatency, **options) -> DubbingPipeline:
+    """
+    A DubbingPipeline whose STT, TTS, separation and denoising are the stand-ins of benchmarks.fakes and whose
+    translator talks to a fake Ollama server. Everything between the models runs as in production.
+    """
+    pipeline = DubbingPipeline(output_dir, ollama_urls=[ollama_url], model_registry=ModelRegistry(), **options)
+    pipeline.stt = FakeTranscriber(latency)
+    pipeline.tts = FakeTTS(latency)
+    pipeline.processor.close()
+    pipeline.processor = FakeAudioProcessor(latency)
+    return pipeline
+
+
+def run_mode(
+    mode: str,
+    audio_paths: List[str],
+    work_dir: str,
+    latency: BackendLatency,
+    ollama_url: str,
+    queue_size: int = 4,
+    **options,
+) -> Dict:
+    """
+    Dubs the corpus once from a clean output folder: in "pipelined" mode through process_batch,
+    in "sequential" mode one process_clip call after another. Returns the run's measurements.
+    A clip only counts as dubbed if its output file exists; clips reported done without one are
+    counted as missing outputs.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode {mode}; expected one of {', '.join(MODES)}")
+    output_dir = os.path.join(work_dir, mode)
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.makedirs(output_dir)
+
+    pipeline = build_pipeline(output_dir, ollama_url, latency, **options)
+    written_before = written_bytes()
+    with PeakRSS() as rss:
+        start = time.perf_counter()
+        if mode == "pipelined":
+            outcomes = pipeline.process_batch(audio_paths, queue_size=queue_size)
+        else:
+            outcomes = {}
+            for path in audio_paths:
+                job = pipeline.process_clip(path)
+                outcomes[path] = job is None or job.error is None
+        wall = time.perf_counter() - start
+        stats = pipeline.stats()
+        pipeline.close()
+    written_after = written_bytes()
+
+    clips = len(audio_paths)
+    missing = [
+        path
+        for path, ok in outcomes.items()
+        if ok and not os.path.exists(os.path.join(output_dir, os.path.basename(path)))
+    ]
+    stage_seconds = stats.pop("stage_seconds", {})
+    return {
+        "mode": mode,
+        "clips": clips,
+        "failed": sum(not ok for ok in outcomes.values()),
+        "missing_outputs": len(missing),
+        "wall_seconds": round(wall, 3),
+        "clips_per_minute": round(clips / wall * 60, 1) if wall > 0 else None,
+        "stage_seconds": stage_seconds,
+        "stage_ms_per_clip": {name: round(seconds / clips * 1000, 1) for name, seconds in stage_seconds.items()},
+        "peak_rss_mb": round(rss.peak / MIB, 1),
+        "bytes_written": written_after - written_before if written_before is not None else None,
+        "output_bytes": directory_bytes(output_dir),
+        "backend_calls": {
+            "separate": pipeline.processor.separations,
+            "denoise": pipeline.processor.denoises,
+            "transcribe": pipeline.stt.calls,
+            "synthesize": pipeline.tts.calls,
+        },
+        "stats": stats,
+    }
+
+
+def environment() -> Dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "commit": commit or None,
+    }
+
+
+def run_benchmark(
+    spec: CorpusSpec,
+    work_dir: str,
+    modes: List[str] = MODES,
+    latency_scale: float = 1.0,
+    ollama_parallel: int = 2,
+    queue_size: int = 4,
+    **options,
+) -> Dict:
+    """
+    Generates (or reuses) the corpus in work_dir and runs each mode on it against fresh fake backends.
+    """
+    audio_paths = make_corpus(spec, os.path.join(work_dir, "corpus"))
+    latency = BackendLatency().scaled(latency_scale)
+    runs = []
+    for mode in modes:
+        with FakeOllamaServer(latency, parallel=ollama_parallel) as ollama:
+            run = run_mode(mode, audio_paths, work_dir, latency, ollama.url, queue_size=queue_size, **options)
+            run["backend_calls"]["translate"] = ollama.requests
+        runs.append(run)
+        logger.info(f"{mode}: {run['clips_per_minute']} clips/min")
+
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "environment": environment(),
+        "corpus": {
+            **asdict(spec),
+            "audio_seconds": round(sum(spec.durations()), 1),
+            "bytes": sum(os.path.getsize(path) for path in audio_paths),
+        },
+        "latency": {**asdict(latency), "scale": latency_scale},
+        "settings": {"queue_size": queue_size, "ollama_parallel": ollama_parallel, **options},
+        "runs": runs,
+    }
+
+
+def compare(baseline: Dict, results: Dict) -> List[str]:
+    """
+    One line per mode found in both results: throughput and busiest stages against the baseline.
+    """
+    lines = []
+    previous = {run["mode"]: run for run in baseline.get("runs", [])}
+    for run in results["runs"]:
+        before = previous.get(run["mode"])
+        if not before or not before.get("clips_per_minute") or not run.get("clips_per_minute"):
+            continue
+        change = run["clips_per_minute"] / before["clips_per_minute"] - 1
+        stages = ", ".join(
+            f"{name} {before['stage_seconds'].get(name, 0):.2f}s -> {seconds:.2f}s"
+            for name, seconds in sorted(run["stage_seconds"].items(), key=lambda item: -item[1])[:3]
+        )
+        lines.append(
+            f"{run['mode']}: {before['clips_per_minute']} -> {run['clips_per_minute']} clips/min "
+            f"({change:+.1%}); {stages}"
+        )
+    return lines
+
+
+@app.command()
+def main(
+    clips: int = typer.Option(100, help="Clips in the synthetic corpus"),
+    distribution: str = typer.Option("lognormal", help="Clip length distribution: lognormal or uniform"),
+    median_seconds: float = typer.Option(2.5, help="Median clip length of the lognormal distribution"),
+    min_seconds: float = typer.Option(0.5, help="Shortest clip"),
+    max_seconds: float = typer.Option(12.0, help="Longest clip"),
+    background_ratio: float = typer.Option(0.7, help="Share of clips with a background under the voice"),
+    repeat_ratio: float = typer.Option(0.1, help="Share of clips repeating an earlier clip"),
+    seed: int = typer.Option(0, help="Seed of the corpus"),
+    modes: str = typer.Option(",".join(MODES), help="Comma-separated modes to run: pipelined, sequential"),
+    latency_scale: float = typer.Option(1.0, help="Multiplier of the stand-in model latencies; 0 removes them"),
+    ollama_parallel: int = typer.Option(2, help="Requests the fake Ollama server generates at once"),
+    queue_size: int = typer.Option(4, help="Queue size between stages in pipelined mode"),
+    segment_mode: bool = typer.Option(False, help="Run the pipeline in segment mode"),
+    work_dir: str = typer.Option(
+        os.path.join(tempfile.gettempdir(), "dubber-benchmark"), help="Where the corpus and outputs are written"
+    ),
+    output: str = typer.Option("benchmark.json", help="JSON file the results are written to"),
+    baseline: Optional[str] = typer.Option(None, help="Earlier results JSON to compare against"),
+    verbose: bool = typer.Option(False, help="Show the pipeline's own logging"),
+):
+    """
+    Dubs a synthetic corpus with stand-in models of realistic latency and reports clips/min,
+    per-stage time, peak RSS and bytes written.
+    """
+    logging.basicConfig(level=logging.INFO if verbose else logging.WARNING)
+    spec = CorpusSpec(
+        clips=clips,
+        distribution=distribution,
+        median_seconds=median_seconds,
+        min_seconds=min_seconds,
+        max_seconds=max_seconds,
+        background_ratio=background_ratio,
+        repeat_ratio=repeat_ratio,
+        seed=seed,
+    )
+    results = run_benchmark(
+        spec,
+        work_dir,
+        modes=[mode.strip() for mode in modes.split(",") if mode.strip()],
+        latency_scale=latency_scale,
+        ollama_parallel=ollama_parallel,
+        queue_size=queue_size,
+        segment_mode=segment_mode,
+    )
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=4)
+
+    for run in results["runs"]:
+        stages = ", ".join(f"{name}={ms:.0f}ms" for name, ms in run["stage_ms_per_clip"].items())
+        typer.echo(
+            f"{run['mode']}: {run['clips_per_minute']} clips/min, {run['failed']} failed, "
+            f"{run['missing_outputs']} missing outputs, "
+            f"peak RSS {run['peak_rss_mb']} MiB, {run['bytes_written'] or 0} bytes written"
+        )
+        typer.echo(f"  per clip: {stages}")
+    if baseline:
+        with open(baseline, "r", encoding="utf-8") as f:
+            for line in compare(json.load(f), results):
+                typer.echo(f"vs baseline: {line}")
+    typer.echo(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,117 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+from difflib import SequenceMatcher
+from typing import Dict, Optional, Tuple
+
+from src.utils.translation_cache import normalize_text
+
+logger = logging.getLogger(__name__)
+
+
+class DedupGroup:
+    """
+    Clips that share one translation and one synthesized dub.
+    Hold `lock` while producing or reading `dub_path`.
+    """
+
+    def __init__(self, group_id: int, text: str):
+        self.id = group_id
+        self.text = text
+        self.translation: Optional[dict] = None
+        self.dub_path: Optional[str] = None
+        self.lock = threading.Lock()
+
+
+class LineDeduplicator:
+    """
+    Groups clips whose transcripts match, for the same target language and voice reference.
+
+    With `threshold` below 1.0, a transcript also joins a group whose text is at least that similar
+    (difflib ratio on the normalized, lower-cased text), e.g. 0.9 folds "Get down!" into "Get down".
+    Only the `max_groups` most recent groups are remembered; the dubs of older ones are deleted.
+    """
+
+    def __init__(self, threshold: float = 1.0, max_groups: int = 5000):
+        self.threshold = threshold
+        self.max_groups = max_groups
+        self.lines = 0
+        self.matches = 0
+        self.reused_dubs = 0
+        self._next_id = 0
+        self._buckets: Dict[Tuple[str, str], Dict[str, DedupGroup]] = {}
+        self._recent: "OrderedDict[int, Tuple[Tuple[str, str], str, DedupGroup]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Taken by callers holding a group's lock, so it is never held together with `_lock`
+        self._reuse_lock = threading.Lock()
+
+    def _similar(self, bucket: Dict[str, DedupGroup], text: str) -> Optional[DedupGroup]:
+        best, best_ratio = None, self.threshold
+        for candidate, group in bucket.items():
+            ratio = SequenceMatcher(None, text, candidate).ratio()
+            if ratio >= best_ratio:
+                best, best_ratio = group, ratio
+        return best
+
+    def group_for(self, text: str, target_lang: str, voice_key: str) -> DedupGroup:
+        """
+        Returns the group of an earlier matching clip, or starts a new one with `text` as its source line.
+        """
+        normalized = normalize_text(text).lower()
+        bucket_key = (target_lang.strip().lower(), voice_key)
+        with self._lock:
+            self.lines += 1
+            bucket = self._buckets.setdefault(bucket_key, {})
+            group = bucket.get(normalized)
+            if group is None and self.threshold < 1.0:
+                group = self._similar(bucket, normalized)
+            if group is not None:
+                self.matches += 1
+                self._recent.move_to_end(group.id)
+                return group
+
+            group = DedupGroup(self._next_id, text)
+            self._next_id += 1
+            bucket[normalized] = group
+            self._recent[group.id] = (bucket_key, normalized, group)
+            evicted = []
+            while len(self._recent) > self.max_groups:
+                evicted.append(self._forget(*self._recent.popitem(last=False)[1]))
+
+        # Outside our lock: a clip being synthesized holds its group's lock, and takes ours in record_reuse
+        for old_group in evicted:
+            self._delete_dub(old_group)
+        return group
+
+    def _forget(self, bucket_key: Tuple[str, str], normalized: str, group: DedupGroup) -> DedupGroup:
+        """
+        Drops a group from the lookup tables. Caller holds the lock.
+        """
+        bucket = self._buckets[bucket_key]
+        del bucket[normalized]
+        if not bucket:
+            del self._buckets[bucket_key]
+        return group
+
+    @staticmethod
+    def _delete_dub(group: DedupGroup):
+        with group.lock:
+            if group.dub_path:
+                try:
+                    os.remove(group.dub_path)
+                except OSError:
+                    pass
+                group.dub_path = None
+
+    def record_reuse(self):
+        with self._reuse_lock:
+            self.reused_dubs += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "lines": self.lines,
+            "unique": self.lines - self.matches,
+            "matches": self.matches,
+            "reused_dubs": self.reused_dubs,
+        }
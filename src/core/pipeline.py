@@ -2,120 +2,1020 @@ import logging
 import os
 import shutil
 import tempfile
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
 
-from src.core.state_manager import StateManager
+import numpy as np
+
+from src.core.dedup import DedupGroup, LineDeduplicator
+from src.core.speakers import SpeakerPlan, SpeakerVoice
+from src.core.stage_cache import StageCache, link_or_copy
+from src.core.stage_runner import Stage, run_stages
+from src.core.state_manager import StateManager, config_fingerprint
+from src.models.model_registry import MIB, ModelRegistry, shared_registry
 from src.models.stt import FasterWhisperTranscriber
 from src.models.translator import OllamaTranslator
-from src.models.tts import TTSWrapper
+from src.models.tts import TTSRequest, TTSWrapper
+from src.models.voice_prompt_cache import VoicePromptCache
+from src.utils.audio_classifier import AudioClassifier, Classification, ClassifierThresholds
+from src.utils.audio_io import AudioBuffer
 from src.utils.audio_processor import AudioProcessor
+from src.utils.hashing import hash_file
+from src.utils.translation_cache import TranslationCache
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class DubSegment:
+    """
+    One Whisper segment of a clip dubbed on its own in segment mode.
+    """
+
+    start: float
+    end: float
+    text: str
+    translation: Optional[dict] = None
+    dub: Optional[AudioBuffer] = None
+
+    @property
+    def translated_text(self) -> str:
+        return self.translation["text"] if self.translation else ""
+
+
+@dataclass
+class ClipJob:
+    """
+    Everything the pipeline knows about one clip while it moves through the stages.
+    """
+
+    audio_path: str
+    temp_dir: str
+    classification: Optional[Classification] = None
+    # Set when the clip is deliberately not dubbed, e.g. because it holds no speech
+    skip_reason: Optional[str] = None
+    # Level of the clip's quietest frames relative to its speech, and whether that made it dry voice-over
+    background_level: Optional[float] = None
+    dry_vo: bool = False
+    vocal_path: Optional[str] = None
+    # The same vocals decoded once, shared by transcription and voice cloning
+    vocals: Optional[AudioBuffer] = None
+    background_path: Optional[str] = None
+    segments: List[dict] = field(default_factory=list)
+    original_text: str = ""
+    translated_text: str = ""
+    tts_instruction: str = ""
+    base_language: str = ""
+    dedup_group: Optional[DedupGroup] = None
+    # Segment mode: the clip's segments, each translated and synthesized on its own
+    dub_segments: List[DubSegment] = field(default_factory=list)
+    dub: Optional[AudioBuffer] = None
+    # Only set when the dub had to be written, e.g. for the stage cache
+    dub_path: Optional[str] = None
+    # Name of the speaker whose shared reference voice is cloned, if the batch was grouped by speaker
+    speaker: Optional[str] = None
+    output_path: Optional[str] = None
+    error: Optional[str] = None
+    timings: Dict[str, float] = field(default_factory=dict)
+    # Stage cache keys of the clip's current artifacts: "source", "vocals", ...
+    cache_keys: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def filename(self) -> str:
+        return os.path.basename(self.audio_path)
+
+    def metadata(self) -> Dict[str, str]:
+        """
+        The details stored in the manifest for a completed clip.
+        """
+        metadata = {"original_text": self.original_text, "translated_text": self.translated_text}
+        if self.classification:
+            metadata["classification"] = self.classification.to_dict()
+        if self.background_level is not None:
+            metadata["background_level_db"] = round(self.background_level, 1)
+            metadata["dry_vo"] = self.dry_vo
+        if self.speaker:
+            metadata["speaker"] = self.speaker
+        if self.dub_segments:
+            metadata["segments"] = [
+                {
+                    "start": segment.start,
+                    "end": segment.end,
+                    "original_text": segment.text,
+                    "translated_text": segment.translated_text,
+                }
+                for segment in self.dub_segments
+            ]
+        return metadata
+
+
 class DubbingPipeline:
     """
     Coordinates the end-to-end dubbing flow.
     """
 
-    def __init__(self, output_dir: str, target_lang: str = "Portuguese"):
+    # Worker threads per stage in pipelined batch mode. Translation is I/O bound on Ollama,
+    # so two requests can be in flight while the other stages work on neighbouring clips.
+    STAGE_WORKERS = {"translate": 2}
+    # Stages that take a list of jobs in pipelined batch mode, and the most they take at once.
+    # A batch is whatever is already queued; these stages' queues have room for a full batch.
+    STAGE_BATCH_SIZES = {"transcribe": 16, "translate": 16, "synthesize": 8}
+
+    def __init__(
+        self,
+        output_dir: str,
+        target_lang: str = "Portuguese",
+        translation_cache_path: Optional[str] = None,
+        ollama_urls: Optional[List[str]] = None,
+        translation_concurrency: int = 4,
+        dedup_threshold: Optional[float] = 1.0,
+        stage_cache_dir: Optional[str] = None,
+        stage_cache_bytes: int = 20 * 1024**3,
+        classify: bool = True,
+        classifier_thresholds: Optional[ClassifierThresholds] = None,
+        dry_vo_threshold_db: Optional[float] = AudioProcessor.DRY_VO_THRESHOLD_DB,
+        voice_prompt_cache_dir: Optional[str] = None,
+        persist_voice_prompts: bool = True,
+        speaker_plan: Optional[SpeakerPlan] = None,
+        stt_batch_size: int = STAGE_BATCH_SIZES["transcribe"],
+        stt_beam_size: int = 5,
+        stt_cpu_threads: int = 0,
+        stt_num_workers: int = 1,
+        segment_mode: bool = False,
+        model_registry: Optional[ModelRegistry] = None,
+        model_memory_bytes: Optional[int] = None,
+        read_only_manifest: bool = False,
+    ):
+        """
+        Args:
+            output_dir: Where dubbed files, the manifest and caches are written.
+            target_lang: Target language for dubbing.
+            translation_cache_path: SQLite file for cached translations. Defaults to a file under
+                output_dir/.cache; point several output folders at one file to share it.
+            ollama_urls: Ollama hosts to spread translation requests over (default: the local instance).
+            translation_concurrency: Translation requests allowed in flight at once across all hosts.
+            dedup_threshold: Clips with the same voice reference whose transcripts are at least this
+                similar share one translation and one synthesized dub. 1.0 only matches repeats of the
+                same line, None turns deduplication off. Clips share a reference through `speaker_plan`;
+                without one, only clips with identical vocals match.
+            stage_cache_dir: Where stems, cleaned vocals, transcripts and dubs are kept between runs, so a
+                file that failed late resumes from its last good stage. Defaults to output_dir/.cache/stages.
+            stage_cache_bytes: Size budget of the stage cache; least recently used results are evicted
+                beyond it. 0 turns the stage cache off.
+            classify: Check each file for speech before any model runs. Music, ambiance, SFX and silence
+                are copied to the output unchanged and recorded as skipped.
+            classifier_thresholds: Decision thresholds of the classifier (default: ClassifierThresholds()).
+            dry_vo_threshold_db: Clips whose quietest frames sit at least this far (in dB) below their speech
+                are dry voice-over: they skip separation and denoising and the dub is written without a
+                background. None always separates.
+            voice_prompt_cache_dir: Where the TTS model's analysis of each reference voice is kept between runs.
+                Defaults to output_dir/.cache/voice_prompts.
+            persist_voice_prompts: Keep voice prompts on disk; otherwise they only live for this run.
+            speaker_plan: Speaker of each clip and the clip providing each speaker's reference voice
+                (see plan_speakers). Clips of a speaker are all cloned from that one reference;
+                clips without a speaker clone their own vocals.
+            stt_batch_size: Clips transcribed in one Faster-Whisper batch in pipelined mode.
+            stt_beam_size: Beam width of the Faster-Whisper decoder.
+            stt_cpu_threads: CTranslate2 threads per Faster-Whisper worker on CPU (0 uses the library default).
+            stt_num_workers: Faster-Whisper transcriptions allowed to run in parallel.
+            segment_mode: Translate and synthesize each Whisper segment of a multi-segment clip on its own,
+                placing the dubs at the segments' start times. Segment dubs are cached one by one,
+                so a retry only synthesizes the segments that failed.
+            model_registry: Where the STT and TTS models are loaded. Defaults to the process-wide registry,
+                so pipelines of one process (e.g. one per target language) share their models.
+            model_memory_bytes: Memory budget of the registry's models; least recently used models are
+                unloaded beyond it. 0 removes the limit, None keeps the registry's current budget.
+            read_only_manifest: Check the manifest without ever writing it, for worker processes whose
+                parent records their outcomes.
+        """
         self.output_dir = output_dir
         self.target_lang = target_lang
 
         # Initialize components
-        self.stt = FasterWhisperTranscriber()
-        self.translator = OllamaTranslator()
-        self.tts = TTSWrapper()
+        self.models = model_registry or shared_registry()
+        if model_memory_bytes is not None:
+            self.models.set_budget(model_memory_bytes)
+        self.stt = FasterWhisperTranscriber(
+            beam_size=stt_beam_size,
+            batch_size=stt_batch_size,
+            cpu_threads=stt_cpu_threads,
+            num_workers=stt_num_workers,
+            registry=self.models,
+        )
+        self.stage_batch_sizes = {**self.STAGE_BATCH_SIZES, "transcribe": stt_batch_size}
+        self.translation_cache = TranslationCache(
+            translation_cache_path or os.path.join(output_dir, ".cache", "translations.sqlite3")
+        )
+        translator_options = {"base_url": ollama_urls} if ollama_urls else {}
+        self.translator = OllamaTranslator(
+            cache=self.translation_cache, max_concurrency=translation_concurrency, **translator_options
+        )
+        voice_prompt_dir = voice_prompt_cache_dir or os.path.join(output_dir, ".cache", "voice_prompts")
+        self.tts = TTSWrapper(
+            voice_cache=VoicePromptCache(cache_dir=voice_prompt_dir if persist_voice_prompts else None),
+            registry=self.models,
+        )
         self.processor = AudioProcessor()
-        self.state = StateManager(output_dir)
+        self.dry_vo_threshold_db = dry_vo_threshold_db
+        self.dry_vo_counts: Counter = Counter()
+        self.classifier = AudioClassifier(classifier_thresholds) if classify else None
+        self.classification_counts: Counter = Counter()
+        # Busy time of each stage summed over all clips; a batched call counts once
+        self.stage_seconds: Counter = Counter()
+        self._stage_seconds_lock = threading.Lock()
+        self.segment_mode = segment_mode
+        self.speaker_plan = speaker_plan
+        # Without the classifier, files it skipped in earlier runs are dubbed like any other
+        done_statuses = ("completed", "skipped") if classify else ("completed",)
+        self.state = StateManager(
+            output_dir, self.config_fingerprint(), done_statuses=done_statuses, read_only=read_only_manifest
+        )
+        self.dedup = LineDeduplicator(dedup_threshold) if dedup_threshold is not None else None
+        self._shared_dub_dir: Optional[str] = None
+        self._speaker_voices: Dict[str, SpeakerVoice] = {}
+        self._speaker_lock = threading.Lock()
+        self.stage_cache = (
+            StageCache(stage_cache_dir or os.path.join(output_dir, ".cache", "stages"), stage_cache_bytes)
+            if stage_cache_bytes > 0
+            else None
+        )
+
+    def config_fingerprint(self) -> str:
+        """
+        Hash of the settings that change a dub. Changing any of them makes every file process again.
+        Options left at their default are not part of it, so turning them on is what invalidates.
+        """
+        config = {
+            "target_lang": self.target_lang,
+            "stt_model": self.stt.model_size,
+            "translation_model": self.translator.model,
+            "tts_model": self.tts.model_id,
+        }
+        if self.dry_vo_threshold_db is not None:
+            config["dry_vo_threshold_db"] = self.dry_vo_threshold_db
+        if self.segment_mode:
+            config["segment_mode"] = True
+        if self.speaker_plan:
+            # The reference clip decides the voice of all of a speaker's lines
+            config["speaker_references"] = {
+                speaker: os.path.basename(path) for speaker, path in self.speaker_plan.references.items()
+            }
+        return config_fingerprint(config)
+
+    def close(self):
+        """
+        Writes the manifest snapshot and stops background workers and connections.
+        """
+        self.state.close()
+        self.processor.close()
+        self.translation_cache.close()
+        if self.stage_cache:
+            self.stage_cache.close()
+        if self._shared_dub_dir:
+            shutil.rmtree(self._shared_dub_dir, ignore_errors=True)
+            self._shared_dub_dir = None
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Counters gathered while processing, for the end-of-run report.
+        """
+        stats = {"translation_cache": self.translation_cache.stats()}
+        if self.stage_cache:
+            stats["stage_cache"] = self.stage_cache.stats()
+        if self.dedup:
+            stats["dedup"] = self.dedup.stats()
+        stats["voice_prompts"] = self.tts.voice_cache.stats()
+        stats["models"] = self.models.stats()
+        resident = self.models.resident()
+        if resident:
+            stats["model_memory_mb"] = {key: round(size / MIB) for key, size in resident.items()}
+        if self.classifier:
+            stats["classifier"] = dict(self.classification_counts)
+        if self.dry_vo_threshold_db is not None:
+            stats["dry_vo"] = {"bypassed": self.dry_vo_counts["bypassed"], "separated": self.dry_vo_counts["separated"]}
+        if self.stage_seconds:
+            with self._stage_seconds_lock:
+                stats["stage_seconds"] = {name: round(seconds, 2) for name, seconds in self.stage_seconds.items()}
+        return stats
+
+    def _add_stage_time(self, name: str, seconds: float):
+        with self._stage_seconds_lock:
+            self.stage_seconds[name] += seconds
+
+    def _batch_stages(self) -> Dict[str, Callable[[List[ClipJob]], None]]:
+        return {
+            "transcribe": self._transcribe_batch,
+            "translate": self._translate_batch,
+            "synthesize": self._synthesize_batch,
+        }
+
+    def _stages(self) -> List[tuple]:
+        stages = [("classify", self._classify)] if self.classifier else []
+        return stages + [
+            ("separate", self._separate),
+            ("denoise", self._denoise),
+            ("transcribe", self._transcribe),
+            ("translate", self._translate),
+            ("synthesize", self._synthesize),
+            ("mix", self._mix),
+        ]
+
+    def _run_stage(self, job: ClipJob, name: str, fn: Callable[[ClipJob], None]):
+        """
+        Runs one stage on a job, recording its duration. Failures are stored on the job
+        and every later stage is skipped for it, as they are for skipped clips.
+        """
+        if job.error or job.skip_reason:
+            return
+        start = time.perf_counter()
+        try:
+            fn(job)
+        except Exception as e:
+            job.error = str(e)
+            logger.error(f"Failed to process {job.filename}: {e}")
+        finally:
+            job.timings[name] = time.perf_counter() - start
+            self._add_stage_time(name, job.timings[name])
+
+    def _run_batch_stage(self, jobs: List[ClipJob], name: str, fn: Callable[[List[ClipJob]], None]):
+        """
+        Runs a batched stage on the jobs that have not failed yet. Each job records the batch duration.
+        """
+        active = [job for job in jobs if not job.error and not job.skip_reason]
+        if not active:
+            return
+        start = time.perf_counter()
+        try:
+            fn(active)
+        except Exception as e:
+            for job in active:
+                job.error = str(e)
+            logger.error(f"Failed to process batch of {len(active)} files at {name}: {e}")
+        finally:
+            elapsed = time.perf_counter() - start
+            for job in active:
+                job.timings[name] = elapsed
+            self._add_stage_time(name, elapsed)
+
+    def _cache_key(self, job: ClipJob, stage: str, input_name: str, *settings) -> Optional[str]:
+        """
+        Stage cache key of a stage's result: the key of its input artifact plus the stage settings.
+        None when the stage cache is off or the input has no key.
+        """
+        if not self.stage_cache:
+            return None
+        if "source" not in job.cache_keys:
+            try:
+                job.cache_keys["source"] = self.state.content_hash(job.audio_path)
+            except OSError:
+                return None
+        input_key = job.cache_keys.get(input_name)
+        return StageCache.make_key(stage, input_key, *settings) if input_key else None
+
+    def _restore_files(self, job: ClipJob, key: Optional[str], stage: str) -> Optional[Dict[str, str]]:
+        """
+        Links a cached result into the job's temp folder, so eviction cannot pull it from under the job.
+        """
+        cached = self.stage_cache.get_files(key) if key else None
+        if cached is None:
+            return None
+        restored_dir = os.path.join(job.temp_dir, "cached", stage)
+        os.makedirs(restored_dir, exist_ok=True)
+        restored = {}
+        try:
+            for name, path in cached.items():
+                restored[name] = os.path.join(restored_dir, name)
+                link_or_copy(path, restored[name])
+        except OSError as e:
+            # Evicted or pruned by another process since the lookup: run the stage as on a miss
+            logger.debug(f"Cached {stage} result for {job.filename} vanished: {e}")
+            shutil.rmtree(restored_dir, ignore_errors=True)
+            return None
+        logger.info(f"Reusing cached {stage} result for {job.filename}")
+        return restored
+
+    # 0. Classify
+    def _classify(self, job: ClipJob):
+        try:
+            job.classification = self.classifier.classify(job.audio_path)
+        except Exception as e:
+            # Dubbing a clip for nothing is cheaper than losing a line, so unreadable clips go ahead
+            logger.warning(f"Could not classify {job.filename}, processing it as voice: {e}")
+            return
+        label = job.classification.label
+        self.classification_counts[label] += 1
+        if job.classification.is_voice:
+            return
+
+        job.skip_reason = f"Classified as {label}"
+        job.output_path = os.path.join(self.output_dir, job.filename)
+        shutil.copyfile(job.audio_path, job.output_path)
+        logger.info(f"Skipping {job.filename}: classified as {label}, copied to output unchanged")
+
+    # 1. Separate Vocals
+    def _check_dry_vo(self, job: ClipJob) -> bool:
+        """
+        Measures the clip's non-vocal sound. Dry voice-over is used as its own vocal stem with no background.
+        """
+        if self.dry_vo_threshold_db is None:
+            return False
+        try:
+            job.background_level = self.processor.background_level(job.audio_path)
+        except Exception as e:
+            logger.warning(f"Could not measure background of {job.filename}, separating it: {e}")
+            return False
+
+        job.dry_vo = job.background_level <= self.dry_vo_threshold_db
+        self.dry_vo_counts["bypassed" if job.dry_vo else "separated"] += 1
+        if not job.dry_vo:
+            return False
+        logger.info(f"{job.filename} is dry voice-over ({job.background_level:.1f} dB background), skipping separation")
+        job.vocal_path = job.audio_path
+        job.background_path = None
+        key = self._cache_key(job, "separate", "source", "dry")
+        if key:
+            job.cache_keys["vocals"] = key
+        return True
+
+    def _separate(self, job: ClipJob):
+        if self._check_dry_vo(job):
+            return
+
+        key = self._cache_key(job, "separate", "source", self.processor.SEPARATION_MODEL)
+        cached = self._restore_files(job, key, "separate")
+        if cached:
+            job.vocal_path = cached["vocals.wav"]
+            job.background_path = cached.get("background.wav")
+            job.cache_keys["vocals"] = key
+            return
+
+        vocal_root = os.path.join(job.temp_dir, "vocals")
+        separated = self.processor.separate_vocals(job.audio_path, vocal_root)
+        if not separated:
+            raise Exception("Vocal separation failed")
+
+        job.vocal_path = separated["vocals"]
+        job.background_path = separated["background"]
+        if key:
+            stems = {"vocals.wav": job.vocal_path}
+            if job.background_path:
+                stems["background.wav"] = job.background_path
+            self.stage_cache.put_files("separate", key, stems)
+            job.cache_keys["vocals"] = key
+
+    # 2. Denoise Vocals
+    def _denoise(self, job: ClipJob):
+        if job.dry_vo:
+            return
+
+        key = self._cache_key(job, "denoise", "vocals", self.processor.DENOISE_MODEL)
+        cached = self._restore_files(job, key, "denoise")
+        if cached:
+            job.vocal_path = cached["vocals_clean.wav"]
+            job.cache_keys["vocals"] = key
+            return
+
+        denoised_vocal_path = os.path.join(job.temp_dir, "vocals_clean.wav")
+        denoised = self.processor.denoise_vocals(job.vocal_path, denoised_vocal_path)
+        if not denoised:
+            # Carry on with the separated vocals; their cache key still describes job.vocal_path
+            return
+        job.vocal_path = denoised
+        if key:
+            self.stage_cache.put_files("denoise", key, {"vocals_clean.wav": denoised})
+            job.cache_keys["vocals"] = key
+
+    def _vocals(self, job: ClipJob) -> AudioBuffer:
+        """
+        Decodes the clip's vocals the first time a stage needs them in memory.
+        """
+        if job.vocals is None:
+            job.vocals = AudioBuffer.read(job.vocal_path)
+        return job.vocals
+
+    # 3. Transcribe
+    def _transcribe(self, job: ClipJob):
+        key = self._cache_key(job, "transcribe", "vocals", self.stt.model_size)
+        cached = self.stage_cache.get_json(key) if key else None
+        self._apply_segments(job, cached or self.stt.transcribe(self._vocals(job)), None if cached else key)
+
+    def _transcribe_batch(self, jobs: List[ClipJob]):
+        """
+        Transcribes the clips waiting together in pipelined mode in one batched Faster-Whisper call.
+        Clips with cached transcripts are left out of it.
+        """
+        pending = []
+        for job in jobs:
+            key = self._cache_key(job, "transcribe", "vocals", self.stt.model_size)
+            cached = self.stage_cache.get_json(key) if key else None
+            if cached:
+                self._apply_segments(job, cached, None)
+                continue
+            try:
+                pending.append((job, key, self._vocals(job)))
+            except Exception as e:
+                job.error = str(e)
+                logger.error(f"Failed to process {job.filename}: {e}")
+        if not pending:
+            return
+
+        results = self.stt.transcribe_batch([vocals for _, _, vocals in pending])
+        for (job, key, _), segments in zip(pending, results):
+            try:
+                self._apply_segments(job, segments, key)
+            except Exception as e:
+                job.error = str(e)
+                logger.error(f"Failed to process {job.filename}: {e}")
+
+    def _apply_segments(self, job: ClipJob, segments: List[dict], key: Optional[str]):
+        """
+        Takes a clip's transcript, storing it in the stage cache under `key` if given.
+        """
+        if not segments:
+            raise Exception("Transcription returned no segments")
+        job.segments = segments
+        if key:
+            self.stage_cache.put_json("transcribe", key, segments)
+        spoken = [segment for segment in segments if segment["text"].strip()]
+        if self.segment_mode and len(spoken) > 1:
+            job.dub_segments = [DubSegment(seg["start"], seg["end"], seg["text"].strip()) for seg in spoken]
+
+        job.original_text = " ".join([seg["text"] for seg in job.segments])
+        logger.info(f"Transcription: {job.original_text}")
+
+    # 4. Translate
+    def _assign_dedup_group(self, job: ClipJob):
+        """
+        Puts the clip in a group with earlier clips saying the same line in the same voice.
+        """
+        if not self.dedup:
+            return
+        speaker = self._speaker_name(job)
+        try:
+            # Clips of one speaker share a reference, so their repeated lines sound the same anyway.
+            # Without a speaker each clip clones its own voice, which only an identical take shares.
+            voice_key = f"speaker:{speaker}" if speaker else hash_file(job.vocal_path)
+        except (OSError, TypeError):
+            return
+        job.dedup_group = self.dedup.group_for(job.original_text, self.target_lang, voice_key)
+
+    def _translate(self, job: ClipJob):
+        self._translate_jobs([job], self._translate_texts)
+
+    def _translate_batch(self, jobs: List[ClipJob]):
+        self._translate_jobs(jobs, lambda texts: self.translator.translate_batch(texts, self.target_lang))
+
+    def _translate_texts(self, texts: List[str]) -> List[dict]:
+        if len(texts) == 1:
+            return [self.translator.translate(texts[0], self.target_lang)]
+        return self.translator.translate_batch(texts, self.target_lang)
+
+    def _translate_jobs(self, jobs: List[ClipJob], translate_texts: Callable[[List[str]], List[dict]]):
+        # Clips of a group are all translated from its first transcript, once.
+        # Segmented clips send each segment instead and are left out of deduplication.
+        pending: Dict[str, List[Callable[[dict], None]]] = {}
+        for job in jobs:
+            if job.dub_segments:
+                for segment in job.dub_segments:
+                    pending.setdefault(segment.text, []).append(partial(setattr, segment, "translation"))
+                continue
+            self._assign_dedup_group(job)
+            group = job.dedup_group
+            if group and group.translation:
+                self._apply_translation(job, group.translation)
+            else:
+                text = group.text if group else job.original_text
+                pending.setdefault(text, []).append(partial(self._apply_group_translation, job))
+
+        if pending:
+            texts = list(pending)
+            for text, translation_result in zip(texts, translate_texts(texts)):
+                for apply in pending[text]:
+                    apply(translation_result)
+
+        for job in jobs:
+            if job.dub_segments:
+                # The clip speaks in one language and style; the first segment's hints stand for all of them
+                translated = " ".join(segment.translated_text for segment in job.dub_segments)
+                self._apply_translation(job, {**job.dub_segments[0].translation, "text": translated})
+
+    def _apply_group_translation(self, job: ClipJob, translation_result: dict):
+        if job.dedup_group:
+            job.dedup_group.translation = translation_result
+        self._apply_translation(job, translation_result)
+
+    def _apply_translation(self, job: ClipJob, translation_result: dict):
+        job.translated_text = translation_result["text"]
+        job.tts_instruction = translation_result.get("tts_instruction", "")
+        target_language_response = translation_result.get("target_language", "")
+        logger.info(f"Translation: {job.translated_text}")
+        if job.tts_instruction:
+            logger.info(f"TTS instruction: {job.tts_instruction}")
+
+        # Normalize language to base language name for TTS compatibility
+        if target_language_response:
+            job.base_language = target_language_response
+            logger.info(f"Using LLM-provided base language: '{job.base_language}'")
+        else:
+            # Fallback to simple split if LLM fails to return target_language
+            job.base_language = self.target_lang.split()[-1].lower()
+            logger.warning(f"LLM did not return target_language. Falling back to heuristic: '{job.base_language}'")
+
+    # 5. Synthesize Dub
+    def _synthesize(self, job: ClipJob):
+        if job.dub_segments:
+            self._synthesize_segments([job])
+            return
+        group = job.dedup_group
+        if group is None:
+            self._generate_dub(job)
+            return
+
+        # Later clips of the group wait here for the first one's dub instead of synthesizing their own
+        with group.lock:
+            if self._reuse_group_dub(job):
+                return
+            self._generate_dub(job)
+            self._share_dub(job)
+
+    def _synthesize_batch(self, jobs: List[ClipJob]):
+        """
+        Synthesizes the clips waiting together in pipelined mode with as few TTS calls as possible.
+        Cached dubs and dubs of repeated lines are reused as in _synthesize; clips repeating a line
+        of the same batch take the dub of its first clip.
+        """
+        segmented = [job for job in jobs if job.dub_segments]
+        if segmented:
+            self._synthesize_segments(segmented)
+            jobs = [job for job in jobs if not job.dub_segments]
+
+        generate: List[tuple] = []
+        waiting: List[ClipJob] = []
+        leaders = set()
+        for job in jobs:
+            group = job.dedup_group
+            if group and group.id in leaders:
+                waiting.append(job)
+                continue
+            if group:
+                with group.lock:
+                    if self._reuse_group_dub(job):
+                        continue
+            key = self._dub_cache_key(job)
+            if self._restore_dub(job, key):
+                if group:
+                    with group.lock:
+                        self._share_dub(job)
+                continue
+            if group:
+                leaders.add(group.id)
+            generate.append((job, key))
+
+        dubs = self.tts.synthesize_batch([self._tts_request(job) for job, _ in generate]) if generate else []
+        for (job, key), dub in zip(generate, dubs):
+            if dub is None:
+                job.error = "TTS synthesis failed"
+                logger.error(f"Failed to process {job.filename}: {job.error}")
+                continue
+            job.dub = dub
+            self._store_dub(job, key)
+            if job.dedup_group:
+                with job.dedup_group.lock:
+                    self._share_dub(job)
+
+        for job in waiting:
+            with job.dedup_group.lock:
+                if not self._reuse_group_dub(job):
+                    job.error = "TTS synthesis failed"
+
+    def _synthesize_segments(self, jobs: List[ClipJob]):
+        """
+        Synthesizes the segments of segmented clips in one batched TTS call, cloning each clip's
+        reference for all of its segments. Cached segment dubs are reused, and segments that
+        succeed are cached even when others fail, so a retry only redoes the failed ones.
+        """
+        generate: List[tuple] = []
+        requests: List[TTSRequest] = []
+        for job in jobs:
+            try:
+                ref_audio, ref_text = None, None
+                for i, segment in enumerate(job.dub_segments):
+                    key = self._dub_cache_key(job, segment.translated_text)
+                    cached = self._restore_files(job, key, os.path.join("synthesize", f"segment_{i}"))
+                    if cached:
+                        segment.dub = AudioBuffer.read(cached["dub.wav"])
+                        continue
+                    if ref_audio is None:
+                        ref_audio, ref_text = self._tts_reference(job)
+                    generate.append((job, i, key))
+                    requests.append(
+                        TTSRequest(
+                            segment.translated_text,
+                            ref_audio,
+                            language=job.base_language,
+                            ref_text=ref_text,
+                            instruct=job.tts_instruction,
+                        )
+                    )
+            except Exception as e:
+                job.error = str(e)
+                logger.error(f"Failed to process {job.filename}: {e}")
+
+        dubs = self.tts.synthesize_batch(requests) if requests else []
+        for (job, i, key), dub in zip(generate, dubs):
+            job.dub_segments[i].dub = dub
+            if dub is not None and key:
+                path = os.path.join(job.temp_dir, f"segment_{i}.wav")
+                dub.write(path)
+                self.stage_cache.put_files("synthesize", key, {"dub.wav": path})
+
+        for job in jobs:
+            if job.error:
+                continue
+            failed = sum(1 for segment in job.dub_segments if segment.dub is None)
+            if failed:
+                job.error = f"TTS synthesis failed for {failed} of {len(job.dub_segments)} segments"
+                logger.error(f"Failed to process {job.filename}: {job.error}")
+            else:
+                job.dub = self._assemble_segments(job)
+
+    def _assemble_segments(self, job: ClipJob) -> AudioBuffer:
+        """
+        Places each segment's dub at the segment's start time. A dub running past the next segment's
+        start pushes that segment back rather than overlapping it. The result lasts at least as long
+        as the source vocals.
+        """
+        sample_rate = job.dub_segments[0].dub.sample_rate
+        placed = []
+        position = 0
+        for segment in job.dub_segments:
+            samples = segment.dub.to_mono().resample(sample_rate).samples[:, 0]
+            start = max(int(round(segment.start * sample_rate)), position)
+            placed.append((start, samples))
+            position = start + samples.shape[0]
+
+        length = max(position, int(round(self._vocals(job).duration * sample_rate)))
+        dub = np.zeros(length, dtype=np.float32)
+        for start, samples in placed:
+            dub[start : start + samples.shape[0]] = samples
+        return AudioBuffer(dub, sample_rate)
+
+    def _reuse_group_dub(self, job: ClipJob) -> bool:
+        """
+        Takes the dub an earlier clip of the job's group produced, if there is one. Caller holds the group lock.
+        """
+        group = job.dedup_group
+        if not (group and group.dub_path and os.path.exists(group.dub_path)):
+            return False
+        job.dub = AudioBuffer.read(group.dub_path)
+        self.dedup.record_reuse()
+        logger.info(f"Reusing dub of an identical line for {job.filename}")
+        return True
+
+    def _share_dub(self, job: ClipJob):
+        """
+        Keeps the job's dub for later clips of its group. Caller holds the group lock.
+        """
+        group = job.dedup_group
+        if self._shared_dub_dir is None:
+            self._shared_dub_dir = tempfile.mkdtemp(dir=self.output_dir, prefix="dub_shared_")
+        group.dub_path = os.path.join(self._shared_dub_dir, f"{group.id}.wav")
+        job.dub.write(group.dub_path)
+
+    def _speaker_name(self, job: ClipJob) -> Optional[str]:
+        if job.speaker is None and self.speaker_plan:
+            job.speaker = self.speaker_plan.speaker_of(job.audio_path)
+        return job.speaker
+
+    def _speaker_voice(self, job: ClipJob) -> Optional[SpeakerVoice]:
+        """
+        The shared reference of the clip's speaker, prepared by the first clip of the speaker that needs it.
+        None when the clip has no speaker or the reference could not be prepared.
+        """
+        name = self._speaker_name(job)
+        if name is None:
+            return None
+        with self._speaker_lock:
+            voice = self._speaker_voices.get(name)
+            if voice is None:
+                voice = self._speaker_voices[name] = SpeakerVoice(name, self.speaker_plan.reference_of(name) or "")
+        with voice.lock:
+            if voice.vocals is None and not voice.failed:
+                self._prepare_speaker_voice(voice)
+        return voice if voice.vocals is not None else None
+
+    def _prepare_speaker_voice(self, voice: SpeakerVoice):
+        """
+        Separates, cleans and transcribes the speaker's representative clip. With the stage cache on,
+        the representative's own turn in the batch then reuses this work.
+        """
+        logger.info(f"Preparing reference voice of {voice.name} from {os.path.basename(voice.reference_path)}")
+        with tempfile.TemporaryDirectory(dir=self.output_dir, prefix="speaker_ref_") as temp_dir:
+            ref_job = ClipJob(voice.reference_path, temp_dir)
+            for name, fn in (
+                ("separate", self._separate),
+                ("denoise", self._denoise),
+                ("transcribe", self._transcribe),
+            ):
+                self._run_stage(ref_job, name, fn)
+                if ref_job.error:
+                    break
+            if not ref_job.error:
+                try:
+                    voice.vocals = self._vocals(ref_job)
+                    voice.key = self.state.content_hash(voice.reference_path)
+                except Exception as e:
+                    ref_job.error = str(e)
+        if ref_job.error:
+            voice.vocals = None
+            voice.failed = True
+            logger.warning(f"Reference voice of {voice.name} unavailable ({ref_job.error}); its clips clone themselves")
+            return
+        voice.text = ref_job.original_text
+
+    def _tts_reference(self, job: ClipJob) -> Tuple[AudioBuffer, str]:
+        """
+        Voice to clone for a clip and its transcript: the speaker's shared reference, or the clip's own vocals.
+        """
+        voice = self._speaker_voice(job)
+        if voice:
+            return voice.vocals, voice.text
+        return self._vocals(job), job.original_text
+
+    def _dub_cache_key(self, job: ClipJob, text: Optional[str] = None) -> Optional[str]:
+        """
+        Stage cache key of a dub of `text` (the clip's translation by default) in the clip's voice.
+        """
+        settings = [
+            text or job.translated_text,
+            job.base_language,
+            job.original_text,
+            job.tts_instruction,
+            self.tts.model_id,
+        ]
+        voice = self._speaker_voice(job) if self.stage_cache else None
+        if voice:
+            settings += [voice.key, voice.text]
+        return self._cache_key(job, "synthesize", "vocals", *settings)
+
+    def _restore_dub(self, job: ClipJob, key: Optional[str]) -> bool:
+        cached = self._restore_files(job, key, "synthesize")
+        if not cached:
+            return False
+        job.dub_path = cached["dub.wav"]
+        job.dub = AudioBuffer.read(job.dub_path)
+        return True
+
+    def _store_dub(self, job: ClipJob, key: Optional[str]):
+        if key:
+            job.dub_path = os.path.join(job.temp_dir, "dub.wav")
+            job.dub.write(job.dub_path)
+            self.stage_cache.put_files("synthesize", key, {"dub.wav": job.dub_path})
+
+    def _tts_request(self, job: ClipJob) -> TTSRequest:
+        ref_audio, ref_text = self._tts_reference(job)
+        return TTSRequest(
+            job.translated_text,
+            ref_audio,
+            language=job.base_language,
+            ref_text=ref_text,
+            instruct=job.tts_instruction,
+        )
+
+    def _generate_dub(self, job: ClipJob):
+        key = self._dub_cache_key(job)
+        if self._restore_dub(job, key):
+            return
+
+        ref_audio, ref_text = self._tts_reference(job)
+        job.dub = self.tts.synthesize(
+            job.translated_text,
+            ref_audio,
+            language=job.base_language,
+            ref_text=ref_text,
+            instruct=job.tts_instruction,
+        )
+        if job.dub is None:
+            raise Exception("TTS synthesis failed")
+        self._store_dub(job, key)
+
+    # 6. Mix with background
+    def _mix(self, job: ClipJob):
+        job.output_path = os.path.join(self.output_dir, job.filename)
+
+        if job.background_path and os.path.exists(job.background_path):
+            self.processor.mix_audio(job.dub, job.background_path, job.output_path)
+        else:
+            job.dub.write(job.output_path)
+
+    # 7. Record the outcome
+    def _record(self, job: ClipJob) -> bool:
+        if job.error:
+            self.state.mark_failed(job.audio_path, job.error)
+            return False
+        if job.skip_reason:
+            self.state.mark_skipped(job.audio_path, job.skip_reason, job.metadata())
+            return True
+
+        self.state.mark_completed(job.audio_path, job.metadata())
+        logger.info(f"Successfully dubbed: {job.filename}")
+        return True
+
+    def dub_file(self, audio_path: str) -> ClipJob:
+        """
+        Runs one file through every stage without touching the manifest.
+        The outcome is left on the returned job for the caller to record.
+        """
+        logger.info(f"--- Processing: {os.path.basename(audio_path)} ---")
+
+        # Use a unique temporary directory for this file processing task
+        with tempfile.TemporaryDirectory(dir=self.output_dir, prefix="dub_tmp_") as temp_dir:
+            job = ClipJob(audio_path, temp_dir)
+            for name, fn in self._stages():
+                self._run_stage(job, name, fn)
+        return job
 
     def process_file(self, audio_path: str) -> bool:
         """
         Processes a single audio file through the full pipeline.
         """
+        job = self.process_clip(audio_path)
+        return job is None or job.error is None
+
+    def process_clip(self, audio_path: str, force: bool = False) -> Optional[ClipJob]:
+        """
+        Like process_file, but returns the recorded job with its output path, error and stage timings.
+        None when the file was already processed, unless `force` dubs it again regardless.
+        """
         filename = os.path.basename(audio_path)
 
-        if self.state.is_processed(audio_path):
+        if not force and self.state.is_processed(audio_path):
             logger.info(f"Skipping already processed file: {filename}")
-            return True
-
-        logger.info(f"--- Processing: {filename} ---")
+            return None
 
         try:
-            # Use a unique temporary directory for this file processing task
-            with tempfile.TemporaryDirectory(dir=self.output_dir, prefix="dub_tmp_") as temp_dir:
-                # 1. Separate Vocals
-                vocal_root = os.path.join(temp_dir, "vocals")
-                separated = self.processor.separate_vocals(audio_path, vocal_root)
-                if not separated:
-                    raise Exception("Vocal separation failed")
-
-                vocal_path = separated["vocals"]
-                bg_path = separated["background"]
-
-                # 2. Denoise Vocals
-                denoised_vocal_path = os.path.join(temp_dir, "vocals_clean.wav")
-                vocal_path = self.processor.denoise_vocals(vocal_path, denoised_vocal_path) or vocal_path
-
-                # 3. Transcribe
-                segments = self.stt.transcribe(vocal_path)
-                if not segments:
-                    raise Exception("Transcription returned no segments")
-
-                original_text = " ".join([seg["text"] for seg in segments])
-                logger.info(f"Transcription: {original_text}")
-
-                # 4. Translate
-                translation_result = self.translator.translate(original_text, self.target_lang)
-                translated_text = translation_result["text"]
-                tts_instruction = translation_result.get("tts_instruction", "")
-                target_language_response = translation_result.get("target_language", "")
-                logger.info(f"Translation: {translated_text}")
-                if tts_instruction:
-                    logger.info(f"TTS instruction: {tts_instruction}")
-
-                # 5. Synthesize Dub
-                dub_output_path = os.path.join(temp_dir, "dubs", filename)
-                os.makedirs(os.path.dirname(dub_output_path), exist_ok=True)
-
-                # Normalize language to base language name for TTS compatibility
-                if target_language_response:
-                    base_language = target_language_response
-                    logger.info(f"Using LLM-provided base language: '{base_language}'")
-                else:
-                    # Fallback to simple split if LLM fails to return target_language
-                    base_language = self.target_lang.split()[-1].lower()
-                    logger.warning(f"LLM did not return target_language. Falling back to heuristic: '{base_language}'")
-
-                synthesized_path = self.tts.generate_dub(
-                    translated_text,
-                    vocal_path,
-                    dub_output_path,
-                    language=base_language,
-                    ref_text=original_text,
-                    instruct=tts_instruction,
-                )
-                if not synthesized_path:
-                    raise Exception("TTS synthesis failed")
+            job = self.dub_file(audio_path)
+            self._record(job)
+        except Exception as e:
+            logger.error(f"Failed to process {filename}: {e}")
+            self.state.mark_failed(audio_path, str(e))
+            job = ClipJob(audio_path, "", error=str(e))
+        return job
 
-                # 6. Mix with background
-                final_output_path = os.path.join(self.output_dir, filename)
+    def process_batch(
+        self,
+        audio_paths: List[str],
+        queue_size: int = 4,
+        on_result: Optional[Callable[[str, bool], None]] = None,
+    ) -> Dict[str, bool]:
+        """
+        Processes many files with the stages overlapped: while one clip is synthesized, the next ones
+        are already being transcribed and separated. Each stage has its own worker thread(s) and a
+        bounded queue of `queue_size` clips in front of it. Clips waiting together in front of
+        the transcription, translation and TTS stages are handled with a single batched call each.
+
+        Results are recorded in the manifest from this thread only, as clips leave the last stage.
+        Returns a mapping of input path to success; `on_result` is called as each file finishes.
+        """
+        results: Dict[str, bool] = {}
+        pending = []
+        for audio_path in audio_paths:
+            if self.state.is_processed(audio_path):
+                logger.info(f"Skipping already processed file: {os.path.basename(audio_path)}")
+                results[audio_path] = True
+                if on_result:
+                    on_result(audio_path, True)
+            else:
+                pending.append(audio_path)
 
-                if bg_path and os.path.exists(bg_path):
-                    self.processor.mix_audio(synthesized_path, bg_path, final_output_path)
-                else:
-                    shutil.copy(synthesized_path, final_output_path)
+        def jobs():
+            for audio_path in pending:
+                yield ClipJob(audio_path, tempfile.mkdtemp(dir=self.output_dir, prefix="dub_tmp_"))
 
-                # 7. Mark success
-                self.state.mark_completed(
-                    audio_path, {"original_text": original_text, "translated_text": translated_text}
+        batch_stages = self._batch_stages()
+        stages = []
+        for name, fn in self._stages():
+            workers = self.STAGE_WORKERS.get(name, 1)
+            batch_size = self.stage_batch_sizes.get(name, 1)
+            if name in batch_stages and batch_size > 1:
+                stages.append(
+                    Stage(name, partial(self._run_batch_stage, name=name, fn=batch_stages[name]), workers, batch_size)
                 )
-                logger.info(f"Successfully dubbed: {filename}")
-                return True
+            else:
+                stages.append(Stage(name, partial(self._run_stage, name=name, fn=fn), workers))
 
-        except Exception as e:
-            logger.error(f"Failed to process {filename}: {e}")
-            self.state.mark_failed(audio_path, str(e))
-            return False
+        for job in run_stages(jobs(), stages, queue_size=queue_size):
+            ok = self._record(job)
+            shutil.rmtree(job.temp_dir, ignore_errors=True)
+            results[job.audio_path] = ok
+            if on_result:
+                on_result(job.audio_path, ok)
+
+        return results
 
 
 if __name__ == "__main__":
@@ -0,0 +1,255 @@
+import fnmatch
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.utils.audio_classifier import AudioClassifier
+from src.utils.audio_io import AudioBuffer
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_RATE = 16000
+# 25 ms windows every 10 ms, as usual for cepstral features
+WINDOW = 400
+HOP = 160
+MEL_BANDS = 40
+CEPSTRA = 20
+
+
+@lru_cache(maxsize=1)
+def _mel_filterbank() -> np.ndarray:
+    """
+    (WINDOW // 2 + 1, MEL_BANDS) triangular filters spaced evenly on the mel scale between 60 Hz and 7.6 kHz.
+    """
+    mel = np.linspace(2595 * np.log10(1 + 60 / 700), 2595 * np.log10(1 + 7600 / 700), MEL_BANDS + 2)
+    edges = 700 * (10 ** (mel / 2595) - 1)
+    freqs = np.fft.rfftfreq(WINDOW, 1 / EMBEDDING_RATE)
+    lower, center, upper = edges[:-2, None], edges[1:-1, None], edges[2:, None]
+    rising = (freqs[None, :] - lower) / (center - lower)
+    falling = (upper - freqs[None, :]) / (upper - center)
+    filters = np.clip(np.minimum(rising, falling), 0, None).T.astype(np.float32)
+    filters.flags.writeable = False
+    return filters
+
+
+@lru_cache(maxsize=1)
+def _dct_matrix() -> np.ndarray:
+    n = np.arange(MEL_BANDS)
+    matrix = np.cos(np.pi / MEL_BANDS * (n[:, None] + 0.5) * np.arange(CEPSTRA)[None, :]).astype(np.float32)
+    matrix.flags.writeable = False
+    return matrix
+
+
+def speaker_embedding(audio: AudioBuffer) -> Optional[np.ndarray]:
+    """
+    Lightweight voice fingerprint: mean and standard deviation of the MFCCs of a clip's louder frames.
+    The first coefficient (overall loudness) is left out. None when the clip has too little sound.
+    """
+    samples = audio.to_mono().resample(EMBEDDING_RATE).samples[:, 0]
+    if samples.shape[0] < WINDOW:
+        return None
+    starts = np.arange(0, samples.shape[0] - WINDOW + 1, HOP)
+    frames = samples[starts[:, None] + np.arange(WINDOW)[None, :]] * np.hanning(WINDOW).astype(np.float32)
+    power = np.abs(np.fft.rfft(frames, axis=1)) ** 2
+    log_mel = np.log(power @ _mel_filterbank() + 1e-10)
+    cepstra = log_mel @ _dct_matrix()
+
+    # Mean log energy per frame; frames within about 35 dB of the loudest carry the voice,
+    # and frames near digital silence (log energy -23) never do
+    energy = cepstra[:, 0] / MEL_BANDS
+    voiced = cepstra[energy > max(energy.max() - 8.0, -18.0)]
+    if voiced.shape[0] < 20:
+        return None
+    return np.concatenate([voiced[:, 1:].mean(axis=0), voiced[:, 1:].std(axis=0)]).astype(np.float32)
+
+
+@dataclass
+class SpeakerPlan:
+    """
+    Which speaker each clip belongs to and which clip provides each speaker's reference voice.
+    Plain data, so it can be saved, edited by hand and handed to worker processes.
+    """
+
+    # Absolute clip path -> speaker name
+    speakers: Dict[str, str] = field(default_factory=dict)
+    # Speaker name -> absolute path of the clip whose vocals are cloned for all of the speaker's lines
+    references: Dict[str, str] = field(default_factory=dict)
+
+    def speaker_of(self, audio_path: str) -> Optional[str]:
+        return self.speakers.get(os.path.abspath(audio_path))
+
+    def reference_of(self, speaker: str) -> Optional[str]:
+        return self.references.get(speaker)
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"speakers": self.speakers, "references": self.references}, f, indent=4)
+
+    @classmethod
+    def load(cls, path: str) -> "SpeakerPlan":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data.get("speakers", {}), data.get("references", {}))
+
+
+@dataclass
+class SpeakerVoice:
+    """
+    A speaker's shared reference while a batch runs: the representative clip's cleaned vocals and transcript.
+    """
+
+    name: str
+    reference_path: str
+    vocals: Optional[AudioBuffer] = None
+    text: str = ""
+    # Content hash of the representative clip, identifying the reference in cache keys
+    key: str = ""
+    failed: bool = False
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+
+def load_speaker_map(path: str) -> Dict[str, str]:
+    """
+    Reads a manual speaker map: a JSON object of glob patterns to speaker names, e.g.
+    {"guards/*": "guard", "*_hero_*.wav": "hero"}. Patterns are matched against the clip path
+    relative to the input folder, and against the bare filename.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        mapping = json.load(f)
+    if not isinstance(mapping, dict) or not all(isinstance(v, str) for v in mapping.values()):
+        raise ValueError(f"Speaker map {path} must be a JSON object of pattern -> speaker name")
+    return mapping
+
+
+def _match_speaker(audio_path: str, input_dir: Optional[str], speaker_map: Dict[str, str]) -> Optional[str]:
+    relative = os.path.relpath(audio_path, input_dir) if input_dir else os.path.basename(audio_path)
+    relative = relative.replace(os.sep, "/")
+    name = os.path.basename(audio_path)
+    for pattern, speaker in speaker_map.items():
+        if fnmatch.fnmatch(relative, pattern) or fnmatch.fnmatch(name, pattern):
+            return speaker
+    return None
+
+
+def _cluster(embeddings: np.ndarray, threshold: float) -> List[int]:
+    """
+    Greedy centroid clustering on cosine similarity: each embedding joins the most similar existing
+    cluster if it is at least `threshold` similar, or starts a new one. Linear in the number of clips.
+    """
+    labels: List[int] = []
+    sums: List[np.ndarray] = []
+    centroids = np.zeros((0, embeddings.shape[1]), dtype=np.float32)
+    for embedding in embeddings:
+        similarities = centroids @ embedding
+        best = int(np.argmax(similarities)) if len(sums) else -1
+        if best >= 0 and similarities[best] >= threshold:
+            sums[best] = sums[best] + embedding
+            centroids[best] = sums[best] / np.linalg.norm(sums[best])
+        else:
+            best = len(sums)
+            sums.append(embedding.copy())
+            centroids = np.vstack([centroids, embedding[None, :]])
+        labels.append(best)
+    return labels
+
+
+def _representative(members: List[int], embeddings: np.ndarray, durations: List[float]) -> int:
+    """
+    Picks the clip closest to the speaker's average voice, preferring 3-12 s clips, which clone best.
+    """
+    centroid = embeddings[members].mean(axis=0)
+    centroid /= np.linalg.norm(centroid) + 1e-10
+    preferred = [i for i in members if 3.0 <= durations[i] <= 12.0] or members
+    return max(preferred, key=lambda i: float(embeddings[i] @ centroid))
+
+
+def plan_speakers(
+    audio_paths: List[str],
+    input_dir: Optional[str] = None,
+    speaker_map: Optional[Dict[str, str]] = None,
+    cluster: bool = True,
+    threshold: float = 0.75,
+    max_seconds: float = 30.0,
+    classifier: Optional[AudioClassifier] = None,
+) -> SpeakerPlan:
+    """
+    Groups clips by speaker before a batch runs. Clips matching `speaker_map` take its speaker;
+    with `cluster`, the rest are grouped by voice similarity into speaker_1, speaker_2, ...
+    Clusters of a single clip are left out, since they gain nothing from a shared reference.
+    Every speaker gets one representative clip whose vocals are used as the reference for all its lines.
+    With a `classifier`, clips it does not take for voice are neither clustered nor picked as references.
+    """
+    speaker_map = speaker_map or {}
+    paths = [os.path.abspath(path) for path in dict.fromkeys(audio_paths)]
+    assigned: Dict[str, str] = {}
+    unassigned = []
+    for path in paths:
+        speaker = _match_speaker(path, input_dir and os.path.abspath(input_dir), speaker_map)
+        if speaker:
+            assigned[path] = speaker
+        else:
+            unassigned.append(path)
+
+    # Embeddings of every clip that needs them: all clips for reference picking, and the unmapped ones for clustering
+    needed = paths if cluster else list(assigned)
+    features: Dict[str, Tuple[np.ndarray, float]] = {}
+    for path in needed:
+        try:
+            audio = AudioBuffer.read(path, EMBEDDING_RATE, 1, max_seconds=max_seconds)
+            if classifier and not classifier.classify_audio(audio).is_voice:
+                continue
+            embedding = speaker_embedding(audio)
+        except Exception as e:
+            logger.warning(f"Could not analyse voice of {os.path.basename(path)}: {e}")
+            continue
+        if embedding is not None:
+            features[path] = (embedding, audio.duration)
+
+    analysed = [path for path in needed if path in features]
+    plan = SpeakerPlan()
+    if not analysed and not assigned:
+        return plan
+
+    embeddings = np.stack([features[path][0] for path in analysed]) if analysed else np.zeros((0, 1))
+    if analysed:
+        # Standardize each feature over the batch so no single coefficient dominates the similarity
+        embeddings = (embeddings - embeddings.mean(axis=0)) / (embeddings.std(axis=0) + 1e-6)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-10
+    durations = [features[path][1] for path in analysed]
+    index = {path: i for i, path in enumerate(analysed)}
+
+    groups: Dict[str, List[str]] = {}
+    for path, speaker in assigned.items():
+        groups.setdefault(speaker, []).append(path)
+
+    if cluster:
+        to_cluster = [path for path in unassigned if path in index]
+        # Longer clips give steadier fingerprints, so they seed the clusters
+        to_cluster.sort(key=lambda path: -durations[index[path]])
+        labels = _cluster(embeddings[[index[path] for path in to_cluster]], threshold) if to_cluster else []
+        clusters: Dict[int, List[str]] = {}
+        for path, label in zip(to_cluster, labels):
+            clusters.setdefault(label, []).append(path)
+        number = 0
+        for members in sorted(clusters.values(), key=len, reverse=True):
+            if len(members) < 2:
+                continue
+            number += 1
+            groups[f"speaker_{number}"] = members
+
+    for speaker, members in groups.items():
+        candidates = [index[path] for path in members if path in index]
+        # A mapped speaker none of whose clips could be analysed still gets a reference
+        reference = analysed[_representative(candidates, embeddings, durations)] if candidates else members[0]
+        plan.references[speaker] = reference
+        for path in members:
+            plan.speakers[path] = speaker
+
+    logger.info(f"Assigned {len(plan.speakers)} of {len(paths)} clips to {len(plan.references)} speakers")
+    return plan
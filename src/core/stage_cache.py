@@ -0,0 +1,255 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def link_or_copy(src: str, dst: str):
+    """
+    Hard-links a file where the filesystem allows it, copies it otherwise.
+    """
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy(src, dst)
+
+
+class StageCache:
+    """
+    Content-addressed store of intermediate pipeline results (stems, cleaned vocals, transcripts, dubs).
+
+    Each entry is a directory named after a key built from the stage's inputs and settings, so a stage
+    only runs again when something it depends on changed. An SQLite index next to the entries tracks
+    their size and last use; once the cache grows past `max_bytes` the least recently used entries
+    are deleted. Entries are written to a temporary directory and renamed into place, so an
+    interrupted write never leaves a partial entry behind.
+
+    Hits do not write on their own: last-used times are saved once `touch_batch` entries were hit, and
+    before any eviction, so a warm re-run does not wait on a commit for every cached stage.
+    """
+
+    VALUE_FILE = "value.json"
+
+    def __init__(self, root: str, max_bytes: int = 20 * 1024**3, touch_batch: int = 100):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.touch_batch = max(1, touch_batch)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Key -> last-used time of hits not written yet
+        self._touched: Dict[str, float] = {}
+
+        os.makedirs(root, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(root, "index.sqlite3"), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, stage TEXT NOT NULL, size INTEGER NOT NULL,"
+            " created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(stage: str, *parts: Any) -> str:
+        """
+        Key of a stage result given everything it depends on: input keys or hashes, model names, options.
+        """
+        encoded = json.dumps([stage, *parts], sort_keys=True, default=str)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def _lookup(self, key: str) -> Optional[str]:
+        entry_dir = self._entry_dir(key)
+        with self._lock:
+            try:
+                row = self._conn.execute("SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is not None and not os.path.isdir(entry_dir):
+                    # Deleted behind our back, e.g. by hand
+                    self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    self._touched.pop(key, None)
+                    self._conn.commit()
+                    row = None
+                if row is not None:
+                    self._touched[key] = time.time()
+                    if len(self._touched) >= self.touch_batch:
+                        self._flush_touches()
+                        self._conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Stage cache lookup failed: {e}")
+                row = None
+
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry_dir
+
+    def _store(self, stage: str, key: str, write) -> Optional[str]:
+        """
+        Fills a fresh directory with `write(directory)` and publishes it under `key`.
+        """
+        entry_dir = self._entry_dir(key)
+        tmp_dir = os.path.join(self.root, f"tmp-{uuid.uuid4().hex}")
+        try:
+            os.makedirs(tmp_dir)
+            write(tmp_dir)
+            size = sum(os.path.getsize(os.path.join(tmp_dir, name)) for name in os.listdir(tmp_dir))
+            os.makedirs(os.path.dirname(entry_dir), exist_ok=True)
+            try:
+                os.rename(tmp_dir, entry_dir)
+            except OSError:
+                # Another worker stored the same result first
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                if not os.path.isdir(entry_dir):
+                    raise
+        except Exception as e:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            logger.warning(f"Failed to store {stage} result in stage cache: {e}")
+            return None
+
+        now = time.time()
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, stage, size, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                    (key, stage, size, now, now),
+                )
+                self._evict(self.max_bytes, keep=key)
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Stage cache index update failed: {e}")
+        return entry_dir
+
+    def get_files(self, key: str) -> Optional[Dict[str, str]]:
+        """
+        Returns the cached files of an entry by name, or None on a miss. The files must not be modified.
+        """
+        entry_dir = self._lookup(key)
+        if entry_dir is None:
+            return None
+        try:
+            names = os.listdir(entry_dir)
+        except OSError as e:
+            # Evicted by another process between the lookup and the listing
+            logger.debug(f"Stage cache entry {key} vanished: {e}")
+            with self._lock:
+                self.hits -= 1
+                self.misses += 1
+            return None
+        return {name: os.path.join(entry_dir, name) for name in names}
+
+    def put_files(self, stage: str, key: str, files: Dict[str, str]):
+        """
+        Stores copies of `files` (name -> path) under `key`.
+        """
+
+        def write(directory: str):
+            for name, path in files.items():
+                link_or_copy(path, os.path.join(directory, name))
+
+        self._store(stage, key, write)
+
+    def get_json(self, key: str) -> Optional[Any]:
+        entry_dir = self._lookup(key)
+        if entry_dir is None:
+            return None
+        try:
+            with open(os.path.join(entry_dir, self.VALUE_FILE), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Unreadable stage cache entry {key}: {e}")
+            return None
+
+    def put_json(self, stage: str, key: str, value: Any):
+        def write(directory: str):
+            with open(os.path.join(directory, self.VALUE_FILE), "w", encoding="utf-8") as f:
+                json.dump(value, f, ensure_ascii=False)
+
+        self._store(stage, key, write)
+
+    def _flush_touches(self):
+        """
+        Writes the last-used times of pending hits. Caller holds the lock and commits.
+        """
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE entries SET last_used = ? WHERE key = ?",
+                [(used, key) for key, used in self._touched.items()],
+            )
+            self._touched.clear()
+
+    def _evict(self, max_bytes: int, keep: Optional[str] = None) -> Dict[str, int]:
+        """
+        Deletes least recently used entries until the cache fits in `max_bytes`. Caller holds the lock.
+        """
+        self._flush_touches()
+        (total,) = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()
+        removed = freed = 0
+        if total <= max_bytes:
+            return {"removed": removed, "freed_bytes": freed}
+
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY last_used").fetchall():
+            if total <= max_bytes:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            removed += 1
+            freed += size
+        return {"removed": removed, "freed_bytes": freed}
+
+    def prune(self, max_bytes: Optional[int] = None) -> Dict[str, int]:
+        """
+        Shrinks the cache to `max_bytes` (default: the configured budget) and removes
+        directories left behind by interrupted writes.
+        """
+        with self._lock:
+            result = self._evict(self.max_bytes if max_bytes is None else max_bytes)
+            known = {key for (key,) in self._conn.execute("SELECT key FROM entries")}
+            self._conn.commit()
+
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.startswith("tmp-"):
+                # Leave writes that may still be in progress in another process alone
+                if time.time() - os.path.getmtime(path) > 3600:
+                    shutil.rmtree(path, ignore_errors=True)
+            elif os.path.isdir(path) and len(name) == 2:
+                for key in os.listdir(path):
+                    if key not in known:
+                        shutil.rmtree(os.path.join(path, key), ignore_errors=True)
+                        result["removed"] += 1
+        return result
+
+    def size(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
+
+    def close(self):
+        with self._lock:
+            try:
+                self._flush_touches()
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Stage cache index update failed: {e}")
+            self._conn.close()
@@ -0,0 +1,115 @@
+import logging
+import queue
+import threading
+from typing import Any, Callable, Iterable, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of the stream on a stage queue
+_DONE = object()
+
+
+class Stage:
+    """
+    One step of a staged run: a function applied to every item by `workers` threads.
+
+    With `batch_size` > 1 the function receives a list instead: whatever is already waiting
+    in the stage's queue, up to `batch_size` items. A stage never waits to fill a batch,
+    so batching only kicks in when items pile up in front of it. The stage's queue holds
+    at least `batch_size` items, so a full batch can pile up whatever the queue size.
+    """
+
+    def __init__(self, name: str, fn: Callable[[Any], None], workers: int = 1, batch_size: int = 1):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+
+
+def _stage_worker(
+    stage: Stage,
+    inbox: queue.Queue,
+    outbox: queue.Queue,
+    next_workers: int,
+    remaining: List[int],
+    lock: threading.Lock,
+):
+    finished = False
+    while not finished:
+        batch = []
+        item = inbox.get()
+        while item is not _DONE:
+            batch.append(item)
+            if len(batch) >= stage.batch_size:
+                break
+            try:
+                item = inbox.get_nowait()
+            except queue.Empty:
+                break
+        finished = item is _DONE
+
+        if batch:
+            try:
+                stage.fn(batch if stage.batch_size > 1 else batch[0])
+            except Exception as e:
+                logger.error(f"Stage '{stage.name}' raised unexpectedly: {e}", exc_info=True)
+            for done in batch:
+                outbox.put(done)
+
+    with lock:
+        remaining[0] -= 1
+        last = remaining[0] == 0
+    # The last worker of a stage closes the next stage's queue
+    if last:
+        for _ in range(next_workers):
+            outbox.put(_DONE)
+
+
+def run_stages(items: Iterable[Any], stages: List[Stage], queue_size: int = 4) -> Iterator[Any]:
+    """
+    Streams items through the stages, each with its own worker threads and a bounded input queue,
+    so different items can occupy different stages at the same time. Input queues hold `queue_size`
+    items, or the stage's batch size if that is larger.
+
+    Stage functions work on the item in place and are expected to record failures on the item
+    rather than raise; anything they do raise is logged and the item moves on. Items are yielded
+    in completion order, which may differ from input order when a stage has several workers.
+    """
+    sizes = [max(1, queue_size, stage.batch_size) for stage in stages] + [max(1, queue_size)]
+    queues = [queue.Queue(maxsize=size) for size in sizes]
+
+    def feed():
+        try:
+            for item in items:
+                queues[0].put(item)
+        except Exception as e:
+            logger.error(f"Failed to produce stage input: {e}", exc_info=True)
+        finally:
+            for _ in range(stages[0].workers if stages else 1):
+                queues[0].put(_DONE)
+
+    threads = [threading.Thread(target=feed, name="stage-feeder", daemon=True)]
+
+    for index, stage in enumerate(stages):
+        next_workers = stages[index + 1].workers if index + 1 < len(stages) else 1
+        remaining = [stage.workers]
+        lock = threading.Lock()
+
+        for n in range(stage.workers):
+            threads.append(
+                threading.Thread(
+                    target=_stage_worker,
+                    args=(stage, queues[index], queues[index + 1], next_workers, remaining, lock),
+                    name=f"stage-{stage.name}-{n}",
+                    daemon=True,
+                )
+            )
+
+    for thread in threads:
+        thread.start()
+
+    while True:
+        item = queues[-1].get()
+        if item is _DONE:
+            break
+        yield item
@@ -1,50 +1,216 @@
+import hashlib
 import json
 import logging
 import os
+import shutil
+import threading
 from datetime import datetime
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.utils.hashing import hash_file
 
 logger = logging.getLogger(__name__)
 
 
+def config_fingerprint(config: Dict[str, Any]) -> str:
+    """
+    Short stable hash of the settings that change a dub (target language, model IDs, ...).
+    """
+    encoded = json.dumps(config, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:12]
+
+
 class StateManager:
     """
     Manages the state of the batch processing job to allow resumes.
+
+    The state lives in two files: manifest.json, a snapshot, and manifest.journal, an append-only
+    log of JSON lines with the entries changed since that snapshot. Each update appends one line
+    instead of rewriting the whole manifest. Every `compact_every` updates, and on close(), the
+    journal is folded into a new snapshot. The snapshot is written to a temporary file and
+    renamed over the old one, so a crash never leaves a truncated manifest behind. Existing
+    manifest.json files from older versions load unchanged.
+
+    Entries are keyed by a hash of the audio bytes plus `config_fingerprint`, so resumes do not
+    depend on where the batch is run from or where the files live, a re-recorded take is dubbed
+    again, and a change of target language or model starts fresh. Files whose size and mtime are
+    unchanged since they were last hashed are not read again.
+
+    Done entries list the output names written for them (output_dir/<input filename>). A file whose
+    bytes match an entry recorded under another name, e.g. a bark shipped twice, gets a copy of that
+    output under its own name instead of counting as processed without one.
+
+    Files left alone on purpose, e.g. music found by the classifier, are recorded as "skipped".
+    They count as processed unless "skipped" is left out of `done_statuses`.
+
+    A read-only manager, e.g. in a worker process whose parent owns the manifest, keeps its updates
+    in memory and never writes either file.
     """
 
-    def __init__(self, output_dir: str):
+    def __init__(
+        self,
+        output_dir: str,
+        config_fingerprint: str = "",
+        compact_every: int = 1000,
+        done_statuses: Tuple[str, ...] = ("completed", "skipped"),
+        read_only: bool = False,
+    ):
         self.output_dir = output_dir
+        self.config_fingerprint = config_fingerprint
+        self.done_statuses = done_statuses
         self.manifest_path = os.path.join(output_dir, "manifest.json")
+        self.journal_path = os.path.join(output_dir, "manifest.journal")
+        self.compact_every = compact_every
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        self._journal = None
+        # Lines this manager appended, and lines it found in the journal at load. Only the former make
+        # a snapshot due on close: compacting a journal another process is appending to would lose its lines.
+        self._journal_entries = 0
+        self._replayed_entries = 0
         self.state: Dict[str, Any] = self._load_state()
+        # Absolute path -> (size, mtime_ns, content hash), so unchanged files are hashed once
+        self._hashes: Dict[str, Tuple[int, int, str]] = {}
+        for entry in self.state.values():
+            source = entry.get("source") if isinstance(entry, dict) else None
+            if source and {"path", "size", "mtime_ns", "content_hash"} <= source.keys():
+                self._hashes[source["path"]] = (source["size"], source["mtime_ns"], source["content_hash"])
 
     def _load_state(self) -> Dict[str, Any]:
         """
-        Loads state from manifest.json if it exists.
+        Loads the manifest.json snapshot if it exists and replays the journal on top of it.
         """
+        state: Dict[str, Any] = {}
         if os.path.exists(self.manifest_path):
             try:
                 with open(self.manifest_path, "r", encoding="utf-8") as f:
-                    return json.load(f)
+                    state = json.load(f)
             except Exception as e:
-                logger.error(f"Failed to load manifest: {e}")
-                return {}
-        return {}
+                if self.read_only:
+                    logger.error(f"Failed to load manifest: {e}")
+                else:
+                    # Keep the damaged file for inspection instead of silently reprocessing everything
+                    backup_path = f"{self.manifest_path}.corrupt-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+                    logger.error(f"Failed to load manifest: {e}. Moving it to {backup_path}")
+                    try:
+                        os.replace(self.manifest_path, backup_path)
+                    except OSError as move_error:
+                        logger.error(f"Failed to move damaged manifest: {move_error}")
+                state = {}
 
-    def _save_state(self):
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "rb") as f:
+                journal = f.read()
+            for line_number, line in enumerate(journal.splitlines(), start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    state[record["key"]] = record["entry"]
+                    self._replayed_entries += 1
+                except (json.JSONDecodeError, UnicodeDecodeError, KeyError, TypeError):
+                    # Usually the last line of a journal cut short by a crash
+                    logger.warning(f"Ignoring unreadable manifest journal line {line_number}")
+            if journal and not journal.endswith(b"\n") and not self.read_only:
+                # Drop the torn tail, or the next appended record would be glued onto it and lost too
+                try:
+                    with open(self.journal_path, "r+b") as f:
+                        f.truncate(journal.rfind(b"\n") + 1)
+                except OSError as e:
+                    logger.error(f"Failed to truncate manifest journal: {e}")
+        return state
+
+    def _append(self, key: str, entry: Dict[str, Any]):
+        """
+        Records one changed entry at the end of the journal.
         """
-        Saves current state to manifest.json.
+        with self._lock:
+            self.state[key] = entry
+            if self.read_only:
+                return
+            if self._journal is None:
+                os.makedirs(self.output_dir, exist_ok=True)
+                self._journal = open(self.journal_path, "a", encoding="utf-8")
+            try:
+                self._journal.write(json.dumps({"key": key, "entry": entry}) + "\n")
+                self._journal.flush()
+                self._journal_entries += 1
+            except Exception as e:
+                logger.error(f"Failed to append to manifest journal: {e}")
+                return
+
+            if self._journal_entries + self._replayed_entries >= self.compact_every:
+                self._compact()
+
+    def _compact(self):
+        """
+        Writes the full state to a fresh manifest.json and empties the journal. Caller holds the lock.
         """
         os.makedirs(self.output_dir, exist_ok=True)
+        tmp_path = f"{self.manifest_path}.tmp"
         try:
-            with open(self.manifest_path, "w", encoding="utf-8") as f:
+            with open(tmp_path, "w", encoding="utf-8") as f:
                 json.dump(self.state, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.manifest_path)
         except Exception as e:
             logger.error(f"Failed to save manifest: {e}")
+            return
+
+        # Replaying a journal over a snapshot that already contains it is harmless,
+        # so a crash between the rename and the truncation loses nothing.
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        open(self.journal_path, "w", encoding="utf-8").close()
+        self._journal_entries = 0
+        self._replayed_entries = 0
+
+    def flush(self):
+        """
+        Folds the journal into manifest.json now, if this manager has written to it.
+        """
+        with self._lock:
+            if self._journal_entries:
+                self._compact()
+
+    def close(self):
+        """
+        Compacts the journal and releases the file handle. The manager can still be used afterwards.
+        """
+        self.flush()
 
-    def _get_key(self, file_path: str) -> str:
+    def _source(self, file_path: str) -> Dict[str, Any]:
         """
-        Generates a unique key for a file path.
-        Uses relative path from current working directory to avoid collisions.
+        Identifies a file by content, using the size and mtime as a quick check before hashing it.
+        """
+        path = os.path.abspath(file_path)
+        stat = os.stat(path)
+        known = self._hashes.get(path)
+        if known and known[:2] == (stat.st_size, stat.st_mtime_ns):
+            content_hash = known[2]
+        else:
+            content_hash = hash_file(path)
+            self._hashes[path] = (stat.st_size, stat.st_mtime_ns, content_hash)
+        return {"path": path, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "content_hash": content_hash}
+
+    def content_hash(self, file_path: str) -> str:
+        """
+        Hash of a file's bytes, reusing the manifest's record while its size and mtime are unchanged.
+        """
+        return self._source(file_path)["content_hash"]
+
+    def key_for(self, file_path: str) -> str:
+        """
+        Manifest key of a file: its content hash combined with the pipeline configuration.
+        """
+        content_hash = self.content_hash(file_path)
+        return f"{content_hash}-{self.config_fingerprint}" if self.config_fingerprint else content_hash
+
+    def _get_legacy_key(self, file_path: str) -> str:
+        """
+        Key used by older versions: the path relative to the current working directory.
         """
         try:
             return os.path.relpath(file_path, os.getcwd())
@@ -52,28 +218,126 @@ class StateManager:
             # Fallback for different drives on Windows
             return os.path.abspath(file_path)
 
+    def _legacy_completed(self, file_path: str) -> bool:
+        """
+        Honors a completed entry written by an older version under a path key, as long as the
+        file has not been modified since that entry was recorded.
+        """
+        entry = self.state.get(self._get_legacy_key(file_path), {})
+        if entry.get("status") != "completed" or "source" in entry:
+            return False
+        try:
+            completed_at = datetime.fromisoformat(entry["timestamp"]).timestamp()
+        except (KeyError, TypeError, ValueError):
+            return False
+        return os.path.getmtime(file_path) < completed_at
+
+    @staticmethod
+    def _output_names(entry: Dict[str, Any]) -> List[str]:
+        """
+        Output filenames written for an entry; entries from before they were recorded name their source.
+        """
+        if "outputs" in entry:
+            return list(entry["outputs"])
+        source = entry.get("source") or {}
+        return [os.path.basename(source["path"])] if "path" in source else []
+
+    def recorded_output(self, file_path: str) -> Optional[str]:
+        """
+        Path of an existing output recorded for the file's content, preferring one under its own name.
+        """
+        names = self._output_names(self.state.get(self.key_for(file_path), {}))
+        own = os.path.basename(file_path)
+        for name in sorted(names, key=lambda recorded: recorded != own):
+            path = os.path.join(self.output_dir, name)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def check_processed(self, file_path: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """
+        Like is_processed, but leaves recording to the caller. Returns whether the file is done and, when
+        its output was just copied from an identical file under another name, the updated entry to record
+        under key_for(file_path). A match whose recorded output is gone is not done.
+        """
+        if not os.path.exists(file_path):
+            return False, None
+        entry = self.state.get(self.key_for(file_path), {})
+        if entry.get("status") not in self.done_statuses:
+            return self._legacy_completed(file_path), None
+
+        names = self._output_names(entry)
+        name = os.path.basename(file_path)
+        if not names or name in names:
+            return True, None
+        for recorded in names:
+            recorded_path = os.path.join(self.output_dir, recorded)
+            if os.path.exists(recorded_path):
+                # A copy, not a link: re-dubbing one of the names later must not change the other
+                shutil.copyfile(recorded_path, os.path.join(self.output_dir, name))
+                logger.info(f"Reusing the output of identical file {recorded} for {name}")
+                return True, {**entry, "outputs": names + [name]}
+        return False, None
+
     def is_processed(self, file_path: str) -> bool:
         """
-        Checks if a file is already marked as 'completed' in the manifest.
+        Checks if a file is already marked as 'completed' (or another of `done_statuses`) in the manifest.
+        """
+        done, entry = self.check_processed(file_path)
+        if entry is not None:
+            self.record(self.key_for(file_path), entry)
+        return done
+
+    def make_entry(self, file_path: str, status: str, **details: Any) -> Dict[str, Any]:
+        """
+        Builds a manifest entry for a file, e.g. make_entry(path, "failed", error="...").
+        """
+        entry = {"status": status, "timestamp": datetime.now().isoformat(), **details}
+        if status in self.done_statuses:
+            entry["outputs"] = [os.path.basename(file_path)]
+        try:
+            entry["source"] = self._source(file_path)
+        except OSError:
+            pass
+        return entry
+
+    def record(self, key: str, entry: Dict[str, Any]):
+        """
+        Stores an entry built elsewhere, e.g. by a worker process with make_entry().
         """
-        key = self._get_key(file_path)
-        return self.state.get(key, {}).get("status") == "completed"
+        self._append(key, entry)
 
-    def mark_completed(self, file_path: str, metadata: Dict[str, Any] = None):
+    def mark_completed(self, file_path: str, metadata: Optional[Dict[str, Any]] = None):
         """
         Marks a file as completed and saves metadata.
         """
-        key = self._get_key(file_path)
-        self.state[key] = {"status": "completed", "timestamp": datetime.now().isoformat(), "metadata": metadata or {}}
-        self._save_state()
+        self.record(self.key_for(file_path), self.make_entry(file_path, "completed", metadata=metadata or {}))
+
+    def mark_skipped(self, file_path: str, reason: str, metadata: Optional[Dict[str, Any]] = None):
+        """
+        Marks a file as deliberately not dubbed, with the reason why.
+        """
+        entry = self.make_entry(file_path, "skipped", reason=reason, metadata=metadata or {})
+        self.record(self.key_for(file_path), entry)
+
+    def entries(self, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Snapshot of the manifest entries, optionally only those with the given status.
+        """
+        with self._lock:
+            entries = list(self.state.values())
+        return [entry for entry in entries if isinstance(entry, dict) and status in (None, entry.get("status"))]
 
     def mark_failed(self, file_path: str, error: str):
         """
         Marks a file as failed with an error message.
         """
-        key = self._get_key(file_path)
-        self.state[key] = {"status": "failed", "timestamp": datetime.now().isoformat(), "error": error}
-        self._save_state()
+        try:
+            key = self.key_for(file_path)
+        except OSError:
+            # Unreadable or missing files have no content key
+            key = os.path.abspath(file_path)
+        self.record(key, self.make_entry(file_path, "failed", error=error))
 
 
 if __name__ == "__main__":
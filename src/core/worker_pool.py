@@ -0,0 +1,257 @@
+import logging
+import multiprocessing
+import os
+from contextlib import contextmanager
+from datetime import datetime
+from multiprocessing.connection import Connection, wait
+from typing import Callable, Dict, Iterator, List, Optional
+
+from src.core.state_manager import StateManager
+
+logger = logging.getLogger(__name__)
+
+# Tells a worker process there are no more files
+_STOP = None
+
+_THREAD_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+# Stats describing the caches shared by all workers rather than counting work; they are not summed
+_SHARED_STATS = ("entries", "bytes")
+
+
+@contextmanager
+def _limit_threads(threads: int) -> Iterator[None]:
+    """
+    Keeps N workers from each starting a full-machine thread pool. Wraps the start of worker processes:
+    spawned workers take their environment from the parent at start, before anything is unpickled,
+    so the limits are in place before any of them imports torch. The parent's own settings are restored.
+    """
+    previous = {var: os.environ.get(var) for var in _THREAD_VARS}
+    for var in _THREAD_VARS:
+        os.environ.setdefault(var, str(threads))
+    try:
+        yield
+    finally:
+        for var, value in previous.items():
+            if value is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = value
+
+
+def merge_stats(total: dict, stats: dict) -> dict:
+    """
+    Adds one worker's pipeline stats into `total`, group by group. Counters are summed; the size of
+    shared caches is the largest any worker saw.
+    """
+    for name, value in stats.items():
+        if isinstance(value, dict):
+            merge_stats(total.setdefault(name, {}), value)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            if name in _SHARED_STATS:
+                total[name] = max(total.get(name, 0), value)
+            else:
+                total[name] = round(total.get(name, 0) + value, 2)
+        else:
+            total.setdefault(name, value)
+    return total
+
+
+def _failure(error: str) -> dict:
+    """
+    Manifest entry for a file that failed outside a pipeline.
+    """
+    return {"status": "failed", "timestamp": datetime.now().isoformat(), "error": error}
+
+
+def _worker_main(
+    worker_id: int,
+    pipeline_factory: Callable,
+    output_dir: str,
+    target_lang: str,
+    pipeline_options: dict,
+    tasks,
+    results,
+):
+    """
+    Entry point of a worker process: builds one pipeline, keeps its models warm and dubs files
+    pulled from the shared task queue until told to stop. Outcomes go back to the parent over
+    this worker's own pipe; the parent is the only process writing the manifest.
+
+    Workers hash the files and check the manifest themselves, since only the pipeline knows the
+    configuration its manifest keys depend on. Messages are (kind, audio_path, key, entry); the last
+    one, ("stats", None, None, stats), carries the pipeline's counters when the queue is drained.
+    """
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f"%(asctime)s - worker-{worker_id} - %(name)s - %(levelname)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+
+    # The parent appends to the manifest while workers run; a worker writing it would overwrite those lines
+    pipeline = pipeline_factory(output_dir, target_lang, read_only_manifest=True, **pipeline_options)
+    try:
+        while True:
+            audio_path = tasks.get()
+            if audio_path is _STOP:
+                break
+            state = pipeline.state
+            try:
+                key = state.key_for(audio_path)
+                # An output reused from an identical file comes back as an entry for the parent to record
+                done, reused = state.check_processed(audio_path)
+                if done:
+                    results.send(("skip", audio_path, key, reused))
+                    continue
+            except OSError as e:
+                results.send(("done", audio_path, None, _failure(str(e))))
+                continue
+
+            results.send(("start", audio_path, key, None))
+            job = None
+            try:
+                job = pipeline.dub_file(audio_path)
+                error = job.error
+                metadata = job.metadata()
+            except Exception as e:
+                error = str(e)
+                metadata = None
+            if error:
+                entry = state.make_entry(audio_path, "failed", error=error)
+            elif getattr(job, "skip_reason", None):
+                entry = state.make_entry(audio_path, "skipped", reason=job.skip_reason, metadata=metadata or {})
+            else:
+                entry = state.make_entry(audio_path, "completed", metadata=metadata or {})
+            results.send(("done", audio_path, key, entry))
+        stats = getattr(pipeline, "stats", None)
+        if stats is not None:
+            results.send(("stats", None, None, stats()))
+    finally:
+        close = getattr(pipeline, "close", None)
+        if close is not None:
+            close()
+
+
+def run_worker_pool(
+    audio_paths: List[str],
+    output_dir: str,
+    target_lang: str,
+    workers: int,
+    on_result: Optional[Callable[[str, bool], None]] = None,
+    pipeline_factory: Optional[Callable] = None,
+    pipeline_options: Optional[dict] = None,
+    on_stats: Optional[Callable[[dict], None]] = None,
+) -> Dict[str, bool]:
+    """
+    Dubs files with `workers` processes, each holding its own warm STT and TTS models.
+
+    Files are handed out one at a time from a shared queue, so a worker stuck on a long cutscene
+    does not hold back the short barks behind it. This process owns the manifest: workers only
+    report outcomes, and a worker that dies mid-file has that file marked failed and is replaced.
+    Already processed files are recognised by the workers, which know the pipeline configuration.
+    `pipeline_options` are passed as keyword arguments to every worker's pipeline. `on_stats`
+    gets the workers' pipeline stats added together (see merge_stats) once they have all finished.
+    """
+    if pipeline_factory is None:
+        from src.core.pipeline import DubbingPipeline
+
+        pipeline_factory = DubbingPipeline
+
+    pending = list(dict.fromkeys(audio_paths))
+    results: Dict[str, bool] = {}
+    if not pending:
+        return results
+    state = StateManager(output_dir)
+
+    workers = max(1, min(workers, len(pending)))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    # spawn keeps CUDA and the torch thread pools out of a forked parent state
+    ctx = multiprocessing.get_context("spawn")
+    tasks = ctx.Queue()
+    for audio_path in pending:
+        tasks.put(audio_path)
+    for _ in range(workers):
+        tasks.put(_STOP)
+
+    # One pipe per worker: sends are synchronous, so nothing reported before a crash is lost,
+    # and the pipe reaching EOF is how we notice the worker has gone.
+    processes: Dict[Connection, multiprocessing.Process] = {}
+    # Worker -> (file, manifest key) it is dubbing right now
+    in_flight: Dict[Connection, tuple] = {}
+    next_id = 0
+
+    def start_worker():
+        nonlocal next_id
+        receiver, sender = ctx.Pipe(duplex=False)
+        process = ctx.Process(
+            target=_worker_main,
+            args=(next_id, pipeline_factory, output_dir, target_lang, pipeline_options or {}, tasks, sender),
+            name=f"dub-worker-{next_id}",
+        )
+        with _limit_threads(threads):
+            process.start()
+        sender.close()
+        processes[receiver] = process
+        next_id += 1
+
+    def record(audio_path: str, key: Optional[str], entry: Optional[dict]):
+        if audio_path in results:
+            return
+        ok = True
+        if entry is not None:
+            ok = entry.get("status") in ("completed", "skipped")
+            # Files that could not be read have no content key; their failure is kept under the path
+            state.record(key or os.path.abspath(audio_path), entry)
+        results[audio_path] = ok
+        if on_result:
+            on_result(audio_path, ok)
+
+    total_stats: dict = {}
+    logger.info(f"Starting {workers} worker processes for {len(pending)} files ({threads} threads each)")
+    for _ in range(workers):
+        start_worker()
+
+    try:
+        # Until every worker has exited, so the stats they send after their last file arrive too
+        while processes:
+            for receiver in wait(list(processes)):
+                try:
+                    kind, audio_path, key, entry = receiver.recv()
+                except EOFError:
+                    process = processes.pop(receiver)
+                    process.join()
+                    lost = in_flight.pop(receiver, None)
+                    if process.exitcode == 0:
+                        continue
+                    # A worker that vanished without reporting (crash, OOM kill) loses its current file.
+                    # Only workers that died on a file are replaced; one that cannot even start would loop forever.
+                    logger.error(f"{process.name} exited with code {process.exitcode}")
+                    if lost:
+                        error = f"Worker process exited unexpectedly (exit code {process.exitcode})"
+                        record(*lost, _failure(error))
+                        start_worker()
+                    continue
+
+                if kind == "stats":
+                    merge_stats(total_stats, entry)
+                elif kind == "start":
+                    in_flight[receiver] = (audio_path, key)
+                elif kind == "skip":
+                    logger.info(f"Skipping already processed file: {os.path.basename(audio_path)}")
+                    record(audio_path, key, entry)
+                else:
+                    in_flight.pop(receiver, None)
+                    record(audio_path, key, entry)
+    finally:
+        for process in processes.values():
+            process.join(timeout=30)
+            if process.is_alive():
+                process.terminate()
+
+    for audio_path in pending:
+        record(audio_path, None, _failure("No worker process available"))
+
+    state.close()
+    if on_stats and total_stats:
+        on_stats(total_stats)
+    return results
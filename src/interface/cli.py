@@ -1,14 +1,50 @@
 import glob
 import logging
 import os
+from collections import Counter
+from dataclasses import fields
+from typing import List, Optional
 
 import typer
 from tqdm import tqdm
 
 from src.core.pipeline import DubbingPipeline
+from src.core.speakers import load_speaker_map, plan_speakers
+from src.core.stage_cache import StageCache
+from src.core.state_manager import StateManager
+from src.core.worker_pool import run_worker_pool
+from src.interface.server import JobServer, make_http_server
+from src.utils.audio_classifier import AudioClassifier, ClassifierThresholds
+from src.utils.audio_processor import AudioProcessor
 from src.utils.model_manager import download_all_models
 
 app = typer.Typer(help="Open Game Dubber CLI")
+cache_app = typer.Typer(help="Inspect and trim the caches kept between runs")
+app.add_typer(cache_app, name="cache")
+
+GIB = 1024**3
+
+
+def _stage_cache_dir(output_dir: str, stage_cache: Optional[str]) -> str:
+    return stage_cache or os.path.join(output_dir, ".cache", "stages")
+
+
+def _classifier_thresholds(overrides: Optional[List[str]]) -> ClassifierThresholds:
+    """
+    Builds classifier thresholds from NAME=VALUE strings, e.g. "min_speech_ratio=0.2".
+    """
+    names = {f.name for f in fields(ClassifierThresholds)}
+    values = {}
+    for override in overrides or []:
+        name, _, value = override.partition("=")
+        name = name.strip().replace("-", "_")
+        if name not in names:
+            raise typer.BadParameter(f"Unknown classifier threshold '{name}'. Known: {', '.join(sorted(names))}")
+        try:
+            values[name] = float(value)
+        except ValueError:
+            raise typer.BadParameter(f"Classifier threshold '{name}' needs a number, got '{value}'")
+    return ClassifierThresholds(**values)
 
 
 @app.callback()
@@ -45,16 +81,89 @@ def hello():
     typer.echo("Hello from Open Game Dubber!")
 
 
+def _echo_stats(stats: dict):
+    """
+    Prints the pipeline's end-of-run counters, one line per group.
+    """
+    for group, counters in stats.items():
+        details = ", ".join(f"{name}={value}" for name, value in counters.items())
+        typer.echo(f"{group.replace('_', ' ').capitalize()}: {details}")
+
+
 @app.command()
 def dub_batch(
     input_dir: str = typer.Option("samples", help="Directory containing source WAV files"),
     output_dir: str = typer.Option("output", help="Directory to save dubbed files"),
     target_lang: str = typer.Option("Portuguese", help="Target language for dubbing"),
     limit: int = typer.Option(None, help="Limit the number of files to process"),
+    pipelined: bool = typer.Option(
+        False, help="Overlap separation, STT, translation, TTS and mixing across files instead of one file at a time"
+    ),
+    queue_size: int = typer.Option(
+        4, help="Clips allowed to wait in front of each stage in pipelined mode; batched stages hold a full batch"
+    ),
+    workers: int = typer.Option(1, help="Number of worker processes, each keeping its own models loaded"),
+    translation_cache: str = typer.Option(
+        None, help="SQLite file for cached translations (default: <output-dir>/.cache/translations.sqlite3)"
+    ),
+    ollama_url: List[str] = typer.Option(
+        None, help="Ollama base URL; repeat to spread translation over several hosts (default: local instance)"
+    ),
+    translation_concurrency: int = typer.Option(4, help="Translation requests allowed in flight at once"),
+    dedup: bool = typer.Option(
+        True,
+        help="Translate and synthesize repeated lines in the same voice only once; across different takes "
+        "this needs --speakers or --speaker-map",
+    ),
+    dedup_threshold: float = typer.Option(
+        1.0, help="Transcript similarity (0-1) at which lines count as repeats; 1.0 matches identical lines only"
+    ),
+    stage_cache: str = typer.Option(
+        None, help="Folder for stems, transcripts and dubs kept between runs (default: <output-dir>/.cache/stages)"
+    ),
+    stage_cache_gb: float = typer.Option(20.0, help="Size budget of the stage cache in GiB; 0 turns it off"),
+    classify: bool = typer.Option(
+        True, help="Skip music, ambiance, SFX and silent files before separation, copying them to the output as is"
+    ),
+    classifier_threshold: List[str] = typer.Option(
+        None, help="Override a classifier threshold as NAME=VALUE, e.g. min_speech_ratio=0.2; repeatable"
+    ),
+    dry_vo_bypass: bool = typer.Option(
+        True, help="Send dry voice-over (no music or ambiance bed) straight to STT, skipping separation and denoising"
+    ),
+    dry_vo_threshold: float = typer.Option(
+        AudioProcessor.DRY_VO_THRESHOLD_DB,
+        help="Background level in dB relative to the speech below which a clip counts as dry voice-over",
+    ),
+    persist_voice_prompts: bool = typer.Option(
+        True, help="Keep the TTS model's analysis of each reference voice in <output-dir>/.cache/voice_prompts"
+    ),
+    stt_batch_size: int = typer.Option(16, help="Clips transcribed in one Faster-Whisper batch in pipelined mode"),
+    stt_beam_size: int = typer.Option(5, help="Beam width of the Faster-Whisper decoder"),
+    stt_cpu_threads: int = typer.Option(0, help="CPU threads per Faster-Whisper worker; 0 uses the library default"),
+    stt_num_workers: int = typer.Option(1, help="Faster-Whisper transcriptions allowed to run in parallel"),
+    model_memory_gb: float = typer.Option(
+        0.0,
+        help="RAM budget of the STT and TTS models per process in GiB; least recently used ones are unloaded "
+        "beyond it. 0 means no limit",
+    ),
+    segment_mode: bool = typer.Option(
+        False, help="Translate and synthesize each sentence of multi-sentence clips on its own, at its original time"
+    ),
+    speakers: bool = typer.Option(
+        False, help="Group clips by voice and clone each speaker from one representative clip"
+    ),
+    speaker_map: str = typer.Option(
+        None, help='JSON file of filename or folder glob patterns to speaker names, e.g. {"guards/*": "guard"}'
+    ),
+    speaker_threshold: float = typer.Option(
+        0.75, help="Voice similarity (-1 to 1) at which clips are grouped into the same speaker"
+    ),
 ):
     """
     Batch process all WAV files in a directory.
     """
+    thresholds = _classifier_thresholds(classifier_threshold)
     if not os.path.exists(input_dir):
         typer.echo(f"Error: Input directory {input_dir} does not exist.", err=True)
         raise typer.Exit(1)
@@ -70,13 +179,183 @@ def dub_batch(
     if limit:
         files = files[:limit]
 
+    speaker_plan = None
+    if speakers or speaker_map:
+        try:
+            mapping = load_speaker_map(speaker_map) if speaker_map else None
+        except (OSError, ValueError) as e:
+            typer.echo(f"Error: Could not read speaker map: {e}", err=True)
+            raise typer.Exit(1)
+        typer.echo("Grouping clips by speaker...")
+        speaker_plan = plan_speakers(
+            files,
+            input_dir,
+            mapping,
+            cluster=speakers,
+            threshold=speaker_threshold,
+            classifier=AudioClassifier(thresholds) if classify else None,
+        )
+        plan_path = os.path.join(output_dir, "speakers.json")
+        speaker_plan.save(plan_path)
+        typer.echo(
+            f"{len(speaker_plan.speakers)} clips assigned to {len(speaker_plan.references)} speakers (see {plan_path})"
+        )
+
     typer.echo(f"Starting batch process for {len(files)} files...")
-    pipeline = DubbingPipeline(output_dir, target_lang)
+    pipeline_options = {
+        "translation_cache_path": translation_cache,
+        "ollama_urls": ollama_url or None,
+        "translation_concurrency": translation_concurrency,
+        "dedup_threshold": dedup_threshold if dedup else None,
+        "stage_cache_dir": _stage_cache_dir(output_dir, stage_cache),
+        "stage_cache_bytes": int(stage_cache_gb * GIB),
+        "classify": classify,
+        "classifier_thresholds": thresholds,
+        "dry_vo_threshold_db": dry_vo_threshold if dry_vo_bypass else None,
+        "persist_voice_prompts": persist_voice_prompts,
+        "speaker_plan": speaker_plan,
+        "stt_batch_size": stt_batch_size,
+        "stt_beam_size": stt_beam_size,
+        "stt_cpu_threads": stt_cpu_threads,
+        "stt_num_workers": stt_num_workers,
+        "segment_mode": segment_mode,
+        "model_memory_bytes": int(model_memory_gb * GIB),
+    }
+
+    if workers > 1:
+        if pipelined:
+            typer.echo("Note: --pipelined is ignored with --workers; each worker dubs one file at a time.")
+        worker_stats: dict = {}
+        with tqdm(total=len(files), desc="Dubbing Clips") as progress:
+            run_worker_pool(
+                files,
+                output_dir,
+                target_lang,
+                workers,
+                on_result=lambda path, ok: progress.update(1),
+                pipeline_options=pipeline_options,
+                on_stats=worker_stats.update,
+            )
+        typer.echo(f"Batch processing completed. Results saved in {output_dir}")
+        _echo_stats(worker_stats)
+        return
 
-    for file_path in tqdm(files, desc="Dubbing Clips"):
-        pipeline.process_file(file_path)
+    pipeline = DubbingPipeline(output_dir, target_lang, **pipeline_options)
+
+    try:
+        if pipelined:
+            with tqdm(total=len(files), desc="Dubbing Clips") as progress:
+                pipeline.process_batch(files, queue_size=queue_size, on_result=lambda path, ok: progress.update(1))
+        else:
+            for file_path in tqdm(files, desc="Dubbing Clips"):
+                pipeline.process_file(file_path)
+        stats = pipeline.stats()
+    finally:
+        pipeline.close()
 
     typer.echo(f"Batch processing completed. Results saved in {output_dir}")
+    _echo_stats(stats)
+
+
+@app.command()
+def serve(
+    output_dir: str = typer.Option("output", help="Root folder of the outputs; each target language gets a subfolder"),
+    host: str = typer.Option("127.0.0.1", help="Address to listen on"),
+    port: int = typer.Option(8765, help="TCP port to listen on"),
+    socket_path: str = typer.Option(None, "--socket", help="Listen on this Unix socket instead of a TCP port"),
+    target_lang: str = typer.Option("Portuguese", help="Target language of jobs that do not name one"),
+    warmup: bool = typer.Option(True, help="Load the models at startup instead of with the first job"),
+    stage_cache_gb: float = typer.Option(20.0, help="Size budget of the stage cache in GiB; 0 turns it off"),
+    model_memory_gb: float = typer.Option(
+        0.0, help="RAM budget of the STT and TTS models in GiB; least recently used ones are unloaded beyond it"
+    ),
+):
+    """
+    Runs a local job server that keeps the models loaded between jobs. Submit files with
+    POST /jobs, poll GET /jobs/<id> and download outputs from GET /jobs/<id>/files/<n>.
+    """
+    # Caches live at the root, so languages share stems, transcripts and voice prompts
+    pipeline_options = {
+        "translation_cache_path": os.path.join(output_dir, ".cache", "translations.sqlite3"),
+        "stage_cache_dir": _stage_cache_dir(output_dir, None),
+        "stage_cache_bytes": int(stage_cache_gb * GIB),
+        "voice_prompt_cache_dir": os.path.join(output_dir, ".cache", "voice_prompts"),
+        "model_memory_bytes": int(model_memory_gb * GIB),
+    }
+    os.makedirs(output_dir, exist_ok=True)
+    job_server = JobServer(
+        output_dir,
+        lambda lang, lang_dir: DubbingPipeline(lang_dir, lang, **pipeline_options),
+        default_lang=target_lang,
+    )
+    http_server = make_http_server(job_server, host, port, socket_path)
+    job_server.start(warmup=warmup)
+    typer.echo(f"Serving dubbing jobs on {socket_path or f'http://{host}:{http_server.server_port}'}")
+    try:
+        http_server.serve_forever()
+    except KeyboardInterrupt:
+        typer.echo("Stopping after the file in progress...")
+    finally:
+        http_server.server_close()
+        job_server.stop()
+
+
+@app.command()
+def report(
+    output_dir: str = typer.Option("output", help="Output directory of a batch run"),
+    skipped_only: bool = typer.Option(False, help="Only list the files the classifier skipped"),
+):
+    """
+    Summarizes the manifest of a batch run and lists the files that were skipped and why.
+    """
+    state = StateManager(output_dir)
+    entries = state.entries()
+    if not entries:
+        typer.echo(f"No manifest entries found in {output_dir}")
+        return
+
+    if not skipped_only:
+        counts = Counter(entry.get("status", "unknown") for entry in entries)
+        typer.echo(", ".join(f"{status}={count}" for status, count in sorted(counts.items())))
+
+    measured = [entry["metadata"] for entry in entries if "dry_vo" in (entry.get("metadata") or {})]
+    if measured and not skipped_only:
+        bypassed = sum(1 for metadata in measured if metadata["dry_vo"])
+        typer.echo(f"Dry VO bypass: {bypassed} of {len(measured)} measured files ({bypassed / len(measured):.0%})")
+
+    skipped = state.entries("skipped")
+    labels = Counter(entry.get("metadata", {}).get("classification", {}).get("label", "unknown") for entry in skipped)
+    if labels:
+        typer.echo("Skipped by label: " + ", ".join(f"{label}={count}" for label, count in sorted(labels.items())))
+    for entry in sorted(skipped, key=lambda entry: entry.get("source", {}).get("path", "")):
+        path = entry.get("source", {}).get("path", "?")
+        typer.echo(f"  {path}: {entry.get('reason', '')}")
+
+
+@cache_app.command("prune")
+def cache_prune(
+    output_dir: str = typer.Option("output", help="Output directory whose stage cache should be trimmed"),
+    stage_cache: str = typer.Option(None, help="Stage cache folder (default: <output-dir>/.cache/stages)"),
+    max_gb: float = typer.Option(20.0, help="Keep at most this many GiB, evicting least recently used results"),
+):
+    """
+    Trims the stage cache to a size budget and removes leftovers of interrupted writes.
+    """
+    cache_dir = _stage_cache_dir(output_dir, stage_cache)
+    if not os.path.isdir(cache_dir):
+        typer.echo(f"No stage cache found at {cache_dir}")
+        return
+
+    cache = StageCache(cache_dir, int(max_gb * GIB))
+    try:
+        result = cache.prune()
+        remaining = cache.size()
+    finally:
+        cache.close()
+    typer.echo(
+        f"Removed {result['removed']} entries ({result['freed_bytes'] / GIB:.2f} GiB); "
+        f"{remaining / GIB:.2f} GiB remain in {cache_dir}"
+    )
 
 
 if __name__ == "__main__":
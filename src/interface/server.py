@@ -0,0 +1,397 @@
+import itertools
+import json
+import logging
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import BaseServer, ThreadingMixIn, UnixStreamServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.core.pipeline import DubbingPipeline
+
+logger = logging.getLogger(__name__)
+
+PipelineFactory = Callable[[str, str], DubbingPipeline]
+
+
+@dataclass
+class FileTask:
+    """
+    One file of a job and what became of it.
+    """
+
+    path: str
+    status: str = "queued"
+    output_path: Optional[str] = None
+    error: Optional[str] = None
+    timings: Dict[str, float] = field(default_factory=dict)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "status": self.status,
+            "output": self.output_path,
+            "error": self.error,
+            "timings": {stage: round(seconds, 3) for stage, seconds in self.timings.items()},
+            "seconds": _elapsed(self.started_at, self.finished_at),
+        }
+
+
+@dataclass
+class DubJob:
+    """
+    A submitted group of files dubbed into one language.
+    """
+
+    id: str
+    target_lang: str
+    priority: int
+    files: List[FileTask]
+    submitted_at: float = field(default_factory=time.time)
+
+    @property
+    def status(self) -> str:
+        statuses = {task.status for task in self.files}
+        if statuses == {"queued"}:
+            return "queued"
+        if statuses & {"queued", "running"}:
+            return "running"
+        return "failed" if "failed" in statuses else "completed"
+
+    def to_dict(self) -> Dict[str, Any]:
+        started = [task.started_at for task in self.files if task.started_at]
+        finished = [task.finished_at for task in self.files if task.finished_at]
+        done = self.status in ("completed", "failed")
+        return {
+            "id": self.id,
+            "status": self.status,
+            "target_lang": self.target_lang,
+            "priority": self.priority,
+            "files": [task.to_dict() for task in self.files],
+            "timings": {
+                "queued": _elapsed(self.submitted_at, min(started) if started else None),
+                "running": _elapsed(min(started) if started else None, max(finished) if done else None),
+                "total": _elapsed(self.submitted_at, max(finished) if done else None),
+            },
+        }
+
+
+def _elapsed(start: Optional[float], end: Optional[float]) -> Optional[float]:
+    if start is None:
+        return None
+    return round((end or time.time()) - start, 3)
+
+
+def _language_dir(target_lang: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", target_lang.lower()).strip("_") or "default"
+
+
+class JobServer:
+    """
+    Dubs submitted files one at a time on a single worker thread with long-lived pipelines,
+    so models stay loaded between jobs.
+
+    Files are queued individually by job priority (higher first), then submission order, so an
+    urgent line only waits for the file in progress, not for the rest of a large job.
+    Each target language gets its own pipeline and output folder under `output_dir`. The pipeline
+    names outputs after their source file, so every job also gets a copy of its outputs in
+    jobs/<job id>/ of that folder: jobs sending different files of the same name keep their own dub.
+    """
+
+    def __init__(
+        self,
+        output_dir: str,
+        pipeline_factory: PipelineFactory,
+        default_lang: str = "Portuguese",
+        max_finished_jobs: int = 1000,
+    ):
+        """
+        Args:
+            output_dir: Root of the per-language output folders.
+            pipeline_factory: Builds the pipeline for a target language and output folder.
+            default_lang: Target language of jobs that do not name one.
+            max_finished_jobs: Finished jobs kept for polling; the oldest are forgotten beyond it.
+        """
+        self.output_dir = output_dir
+        self.pipeline_factory = pipeline_factory
+        self.default_lang = default_lang
+        self.max_finished_jobs = max_finished_jobs
+        self.jobs: Dict[str, DubJob] = {}
+        self._pipelines: Dict[str, DubbingPipeline] = {}
+        self._queue: "queue.PriorityQueue[tuple]" = queue.PriorityQueue()
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        # (target language, manifest key) -> the job copy of the latest dub of that content
+        self._outputs: Dict[Tuple[str, str], str] = {}
+
+    def pipeline(self, target_lang: str) -> DubbingPipeline:
+        """
+        The pipeline of a target language, created on first use. Called from the worker thread only.
+        """
+        if target_lang not in self._pipelines:
+            output_dir = os.path.join(self.output_dir, _language_dir(target_lang))
+            os.makedirs(output_dir, exist_ok=True)
+            self._pipelines[target_lang] = self.pipeline_factory(target_lang, output_dir)
+        return self._pipelines[target_lang]
+
+    def start(self, warmup: bool = True):
+        """
+        Starts the worker thread. With `warmup`, the default language's models load before the first job.
+        """
+        self._worker = threading.Thread(target=self._run, args=(warmup,), name="dub-server-worker", daemon=True)
+        self._worker.start()
+
+    def stop(self):
+        """
+        Lets the file in progress finish, then stops the worker and closes the pipelines.
+        """
+        if self._worker:
+            # Sorts before every job, so the worker stops at its next pick
+            self._queue.put((float("-inf"), -1, None, None))
+            self._worker.join()
+            self._worker = None
+        for pipeline in self._pipelines.values():
+            pipeline.close()
+        self._pipelines.clear()
+
+    def submit(self, files: List[str], target_lang: Optional[str] = None, priority: int = 0) -> DubJob:
+        """
+        Queues files for dubbing. Raises ValueError if a file does not exist.
+        """
+        if not files:
+            raise ValueError("No files given")
+        missing = [path for path in files if not os.path.isfile(path)]
+        if missing:
+            raise ValueError(f"Files not found: {', '.join(missing)}")
+
+        job = DubJob(uuid.uuid4().hex[:12], target_lang or self.default_lang, priority, [])
+        job.files = [FileTask(os.path.abspath(path)) for path in files]
+        with self._lock:
+            self.jobs[job.id] = job
+            self._forget_finished_jobs()
+        for task in job.files:
+            self._queue.put((-priority, next(self._order), job, task))
+        logger.info(f"Queued job {job.id}: {len(files)} files to {job.target_lang} (priority {priority})")
+        return job
+
+    def get(self, job_id: str) -> Optional[DubJob]:
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def list_jobs(self) -> List[DubJob]:
+        with self._lock:
+            return list(self.jobs.values())
+
+    def queued_files(self) -> int:
+        return self._queue.qsize()
+
+    def model_stats(self) -> Dict[str, int]:
+        """
+        Model registry counters and memory, once a pipeline exists.
+        """
+        pipelines = list(self._pipelines.values())
+        return pipelines[0].models.stats() if pipelines else {}
+
+    def _forget_finished_jobs(self):
+        """
+        Drops the oldest finished jobs beyond max_finished_jobs. Caller holds the lock.
+        """
+        finished = [job for job in self.jobs.values() if job.status in ("completed", "failed")]
+        for job in finished[: max(len(finished) - self.max_finished_jobs, 0)]:
+            del self.jobs[job.id]
+
+    def _run(self, warmup: bool):
+        if warmup:
+            self._warm_up()
+        while True:
+            _, _, job, task = self._queue.get()
+            if job is None:
+                return
+            self._process(job, task)
+
+    def _warm_up(self):
+        try:
+            pipeline = self.pipeline(self.default_lang)
+            logger.info("Loading models...")
+            pipeline.stt.model
+            pipeline.tts.model
+            logger.info("Models loaded, ready for jobs")
+        except Exception as e:
+            logger.warning(f"Warm-up failed, models will load with the first job: {e}")
+
+    def _process(self, job: DubJob, task: FileTask):
+        task.status = "running"
+        task.started_at = time.time()
+        try:
+            pipeline = self.pipeline(job.target_lang)
+            key = (job.target_lang, pipeline.state.key_for(task.path))
+            clip = pipeline.process_clip(task.path)
+            output_path = None
+            if clip is None:
+                # Dubbed earlier with the same settings: prefer this server's copy, which no other file overwrote
+                output_path = self._outputs.get(key)
+                if not (output_path and os.path.exists(output_path)):
+                    output_path = pipeline.state.recorded_output(task.path)
+                if output_path is None:
+                    logger.info(f"Output of {os.path.basename(task.path)} is gone, dubbing it again")
+                    clip = pipeline.process_clip(task.path, force=True)
+                else:
+                    task.status = "completed"
+            if clip is not None:
+                task.timings = dict(clip.timings)
+                task.error = clip.error
+                task.status = "failed" if clip.error else ("skipped" if clip.skip_reason else "completed")
+                output_path = None if clip.error else clip.output_path
+            if output_path and os.path.exists(output_path):
+                task.output_path = self._keep_output(pipeline, job, task, output_path)
+                self._outputs[key] = task.output_path
+        except Exception as e:
+            logger.error(f"Job {job.id} failed on {os.path.basename(task.path)}: {e}")
+            task.status = "failed"
+            task.error = str(e)
+        finally:
+            task.finished_at = time.time()
+        seconds = _elapsed(task.started_at, task.finished_at)
+        logger.info(f"Job {job.id}: {os.path.basename(task.path)} {task.status} in {seconds}s")
+
+    @staticmethod
+    def _keep_output(pipeline: DubbingPipeline, job: DubJob, task: FileTask, output_path: str) -> str:
+        """
+        Copies a file's output into the job's own folder, numbering names the job already used.
+        """
+        job_dir = os.path.join(pipeline.output_dir, "jobs", job.id)
+        os.makedirs(job_dir, exist_ok=True)
+        stem, ext = os.path.splitext(os.path.basename(task.path))
+        path = os.path.join(job_dir, stem + ext)
+        number = 1
+        while os.path.exists(path):
+            path = os.path.join(job_dir, f"{stem}_{number}{ext}")
+            number += 1
+        shutil.copyfile(output_path, path)
+        return path
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    JSON API of the job server:
+
+        POST /jobs                      {"files": [...], "target_lang": "...", "priority": 0} -> job
+        GET  /jobs                      -> all jobs
+        GET  /jobs/<id>                 -> job status, per-file results and timings
+        GET  /jobs/<id>/files/<n>       -> dubbed WAV of the job's n-th file
+        GET  /health                    -> queue length and model memory
+    """
+
+    server_version = "OpenGameDubber"
+    job_server: JobServer = None
+
+    def address_string(self) -> str:
+        # Unix socket clients have no address
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "local"
+
+    def log_message(self, format: str, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+    def _send_json(self, status: int, body: Any):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, status: int, message: str):
+        self._send_json(status, {"error": message})
+
+    def do_GET(self):
+        parts = [part for part in self.path.split("?")[0].split("/") if part]
+        server = self.job_server
+        if parts == ["health"]:
+            self._send_json(
+                200, {"status": "ok", "queued_files": server.queued_files(), "models": server.model_stats()}
+            )
+        elif parts == ["jobs"]:
+            self._send_json(200, [job.to_dict() for job in server.list_jobs()])
+        elif len(parts) >= 2 and parts[0] == "jobs":
+            job = server.get(parts[1])
+            if job is None:
+                self._send_error(404, f"Unknown job {parts[1]}")
+            elif len(parts) == 2:
+                self._send_json(200, job.to_dict())
+            elif len(parts) == 4 and parts[2] == "files" and parts[3].isdigit():
+                self._send_output(job, int(parts[3]))
+            else:
+                self._send_error(404, "Not found")
+        else:
+            self._send_error(404, "Not found")
+
+    def _send_output(self, job: DubJob, index: int):
+        if index >= len(job.files):
+            self._send_error(404, f"Job {job.id} has {len(job.files)} files")
+            return
+        task = job.files[index]
+        if task.status not in ("completed", "skipped") or not task.output_path or not os.path.exists(task.output_path):
+            self._send_error(409, f"Output of {os.path.basename(task.path)} is not ready ({task.status})")
+            return
+        with open(task.output_path, "rb") as f:
+            data = f.read()
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/wav")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Content-Disposition", f'attachment; filename="{os.path.basename(task.output_path)}"')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        if self.path.split("?")[0].rstrip("/") != "/jobs":
+            self._send_error(404, "Not found")
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            files = body.get("files") or ([body["file"]] if body.get("file") else [])
+            if not isinstance(files, list) or not all(isinstance(path, str) for path in files):
+                raise ValueError("'files' must be a list of paths")
+            job = self.job_server.submit(files, body.get("target_lang"), int(body.get("priority", 0)))
+        except (ValueError, TypeError, AttributeError) as e:
+            self._send_error(400, str(e))
+            return
+        self._send_json(202, job.to_dict())
+
+
+class _UnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        super().server_bind()
+        # BaseHTTPRequestHandler expects these
+        self.server_name = "localhost"
+        self.server_port = 0
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+def make_http_server(
+    job_server: JobServer, host: str = "127.0.0.1", port: int = 8765, socket_path: Optional[str] = None
+) -> BaseServer:
+    """
+    HTTP server for the job server's API, on a TCP port or, with `socket_path`, a Unix socket.
+    """
+    handler = type("JobHandler", (_Handler,), {"job_server": job_server})
+    if socket_path:
+        return _UnixHTTPServer(socket_path, handler)
+    return ThreadingHTTPServer((host, port), handler)
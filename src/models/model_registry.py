@@ -0,0 +1,259 @@
+import gc
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+MIB = 1024**2
+
+
+def resident_bytes() -> Optional[int]:
+    """
+    Resident set size of this process, or None where /proc is not available.
+    """
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def parameter_bytes(model: Any) -> int:
+    """
+    Bytes of the torch parameters and buffers of a model, or of the module it wraps as `.model`.
+    """
+    for module in (model, getattr(model, "model", None)):
+        if hasattr(module, "parameters") and hasattr(module, "buffers"):
+            try:
+                tensors = [*module.parameters(), *module.buffers()]
+                return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+            except Exception:
+                continue
+    return 0
+
+
+@dataclass
+class _Entry:
+    model: Any
+    size_bytes: int
+    unload: Optional[Callable[[Any], None]]
+
+
+class ModelRegistry:
+    """
+    Process-wide home of loaded models, so pipelines asking for the same model share one instance.
+
+    Models are looked up by a key naming the model and everything that changes the loaded instance
+    (device, precision, ...). Each model's resident size is measured as it loads. With a budget set,
+    the least recently used models are unloaded until the rest fit, before a model whose size is
+    known from an earlier load is loaded again, and after any load. Models leased with lease()
+    are never unloaded while in use; when only leased models are left over the budget, it is
+    exceeded and a warning says the budget is too small.
+
+    Callers must fetch the model from the registry each time they use it rather than keep it,
+    or an unloaded model cannot be freed.
+    """
+
+    def __init__(self, budget_bytes: Optional[int] = None):
+        """
+        Args:
+            budget_bytes: Memory the loaded models may take together; None or 0 means no limit.
+        """
+        self.budget_bytes = budget_bytes or None
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        # Sizes measured at earlier loads, kept after eviction to make room before a reload
+        self._known_sizes: Dict[str, int] = {}
+        # Key -> number of callers using that model right now
+        self._leases: Counter = Counter()
+        self._budget_warned = False
+        self._lock = threading.Lock()
+        # Loads run one at a time: two at once would double the peak and spoil each other's measurement
+        self._load_lock = threading.Lock()
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    @contextmanager
+    def lease(self, key: str) -> Iterator[None]:
+        """
+        Keeps the model under `key` from being unloaded for the duration of the block, including when
+        it is only loaded inside it. Wrap every use of a model that others may load models next to.
+        """
+        with self._lock:
+            self._leases[key] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._leases[key] -= 1
+                if not self._leases[key]:
+                    del self._leases[key]
+
+    def get(self, key: str, loader: Callable[[], Any], unload: Optional[Callable[[Any], None]] = None) -> Any:
+        """
+        Returns the model loaded under `key`, calling `loader` to load it if it is not resident.
+        `unload` is called with the model when it is evicted, e.g. to release device memory.
+        Errors of the loader propagate and nothing is registered.
+        """
+        model = self._lookup(key)
+        if model is not None:
+            return model
+
+        with self._load_lock:
+            model = self._lookup(key)
+            if model is not None:
+                return model
+            with self._lock:
+                if key in self._known_sizes and sum(self._known_sizes.values()) > (self.budget_bytes or 0) > 0:
+                    self._warn_budget(
+                        f"Reloading {key}: the models used so far take {sum(self._known_sizes.values()) / MIB:.0f} MiB "
+                        "together, so they are unloaded and reloaded as clips alternate between them"
+                    )
+                self._make_room(self._known_sizes.get(key, 0))
+
+            before = resident_bytes()
+            start = time.perf_counter()
+            model = loader()
+            after = resident_bytes()
+            # Growth of the process is what the model costs in RAM, including what lives outside torch
+            size = after - before if before is not None and after is not None else parameter_bytes(model)
+            self.put(key, model, max(size, 0), unload)
+            logger.info(f"Loaded {key} in {time.perf_counter() - start:.1f}s ({max(size, 0) / MIB:.0f} MiB resident)")
+        return model
+
+    def put(self, key: str, model: Any, size_bytes: int = 0, unload: Optional[Callable[[Any], None]] = None):
+        """
+        Registers a model loaded elsewhere, replacing any model under the same key.
+        """
+        with self._lock:
+            self._entries[key] = _Entry(model, size_bytes, unload)
+            self._entries.move_to_end(key)
+            self._known_sizes[key] = size_bytes
+            self.loads += 1
+            self._make_room(0, keep=key)
+
+    def _lookup(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.model
+
+    def _make_room(self, needed: int, keep: Optional[str] = None):
+        """
+        Evicts least recently used models until `needed` more bytes fit in the budget. Caller holds the lock.
+        """
+        if not self.budget_bytes:
+            return
+        evicted = False
+        while self._total_bytes() + needed > self.budget_bytes:
+            victim = next((key for key in self._entries if key != keep and key not in self._leases), None)
+            if victim is None:
+                in_use = ", ".join(self._entries) or "none"
+                self._warn_budget(f"Models in use ({in_use}) do not fit and cannot be unloaded")
+                break
+            self._evict(victim)
+            evicted = True
+        if evicted:
+            gc.collect()
+            # Only a process that has imported torch can hold CUDA memory
+            torch = sys.modules.get("torch")
+            if torch is not None and torch.cuda.is_available():
+                torch.cuda.empty_cache()
+
+    def _warn_budget(self, reason: str):
+        """
+        Warns once that the budget is too small for the models a clip needs. Caller holds the lock.
+        """
+        if self._budget_warned:
+            return
+        self._budget_warned = True
+        logger.warning(
+            f"Model memory budget of {self.budget_bytes / MIB:.0f} MiB is too small: {reason}. "
+            "Raise it to hold the STT and TTS models together."
+        )
+
+    def _evict(self, key: str):
+        entry = self._entries.pop(key)
+        self.evictions += 1
+        logger.info(f"Unloading {key} ({entry.size_bytes / MIB:.0f} MiB) to stay within the model memory budget")
+        if entry.unload:
+            try:
+                entry.unload(entry.model)
+            except Exception as e:
+                logger.warning(f"Failed to unload {key}: {e}")
+
+    def _total_bytes(self) -> int:
+        return sum(entry.size_bytes for entry in self._entries.values())
+
+    def set_budget(self, budget_bytes: Optional[int]):
+        """
+        Changes the budget, unloading models right away if they no longer fit.
+        """
+        with self._lock:
+            self.budget_bytes = budget_bytes or None
+            self._make_room(0)
+
+    def evict(self, key: str) -> bool:
+        """
+        Unloads a model now. Returns False if it was not loaded or is leased.
+        """
+        with self._lock:
+            if key not in self._entries or key in self._leases:
+                return False
+            self._evict(key)
+        gc.collect()
+        return True
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._evict(key)
+        gc.collect()
+
+    def resident(self) -> Dict[str, int]:
+        """
+        Measured size in bytes of each loaded model, least recently used first.
+        """
+        with self._lock:
+            return {key: entry.size_bytes for key, entry in self._entries.items()}
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "loaded": len(self._entries),
+                "loads": self.loads,
+                "hits": self.hits,
+                "evictions": self.evictions,
+                "resident_mb": round(self._total_bytes() / MIB),
+                "budget_mb": round(self.budget_bytes / MIB) if self.budget_bytes else 0,
+            }
+
+
+_shared_registry: Optional[ModelRegistry] = None
+_shared_lock = threading.Lock()
+
+
+def shared_registry() -> ModelRegistry:
+    """
+    The registry shared by every pipeline of this process.
+    """
+    global _shared_registry
+    with _shared_lock:
+        if _shared_registry is None:
+            _shared_registry = ModelRegistry()
+        return _shared_registry
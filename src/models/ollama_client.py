@@ -0,0 +1,151 @@
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+class OllamaUnavailableError(RuntimeError):
+    """
+    Raised when no Ollama endpoint could answer a request.
+    """
+
+
+class OllamaEndpoint:
+    """
+    One Ollama host with its own keep-alive connection pool and health record.
+    """
+
+    def __init__(self, base_url: str, pool_size: int):
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+
+    def is_healthy(self, now: float) -> bool:
+        return now >= self.unhealthy_until
+
+    def stats(self) -> Dict[str, Union[str, int, bool]]:
+        return {
+            "base_url": self.base_url,
+            "requests": self.requests,
+            "failures": self.failures,
+            "healthy": self.is_healthy(time.monotonic()),
+        }
+
+
+class OllamaClient:
+    """
+    Pooled HTTP client for one or more Ollama hosts.
+
+    Connections are reused through a `requests.Session` per host, at most `max_concurrency`
+    requests are in flight across all hosts, and each request goes to the healthy host with the
+    fewest requests in flight. A host that errors or times out sits out for `failure_cooldown`
+    seconds (doubling while it keeps failing) and the request is retried on another host, so one
+    hung machine cannot stall a batch.
+    """
+
+    def __init__(
+        self,
+        base_urls: Union[str, List[str]] = "http://localhost:11434",
+        max_concurrency: int = 4,
+        timeout: float = 120.0,
+        connect_timeout: float = 5.0,
+        failure_cooldown: float = 30.0,
+    ):
+        if isinstance(base_urls, str):
+            base_urls = [base_urls]
+        if not base_urls:
+            raise ValueError("At least one Ollama base URL is required")
+
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.failure_cooldown = failure_cooldown
+        self.endpoints = [OllamaEndpoint(url, self.max_concurrency) for url in base_urls]
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._lock = threading.Lock()
+
+    def _acquire_endpoint(self, exclude: List[OllamaEndpoint]) -> Optional[OllamaEndpoint]:
+        with self._lock:
+            now = time.monotonic()
+            candidates = [e for e in self.endpoints if e not in exclude]
+            if not candidates:
+                return None
+            healthy = [e for e in candidates if e.is_healthy(now)]
+            # When every host is cooling down, try the one that recovers first rather than giving up
+            pool = healthy or sorted(candidates, key=lambda e: e.unhealthy_until)[:1]
+            endpoint = min(pool, key=lambda e: e.in_flight)
+            endpoint.in_flight += 1
+            endpoint.requests += 1
+            return endpoint
+
+    def _release_endpoint(self, endpoint: OllamaEndpoint, ok: bool):
+        with self._lock:
+            endpoint.in_flight -= 1
+            if ok:
+                endpoint.consecutive_failures = 0
+                endpoint.unhealthy_until = 0.0
+            else:
+                endpoint.failures += 1
+                endpoint.consecutive_failures += 1
+                cooldown = self.failure_cooldown * 2 ** (endpoint.consecutive_failures - 1)
+                endpoint.unhealthy_until = time.monotonic() + min(cooldown, 600.0)
+
+    def post_json(self, path: str, payload: dict) -> Optional[dict]:
+        """
+        POSTs a JSON payload and returns the decoded JSON answer.
+        Returns None when every host that answered reported 404 (e.g. the model is not pulled).
+        Raises OllamaUnavailableError when no host could answer.
+        """
+        tried: List[OllamaEndpoint] = []
+        not_found = False
+        last_error: Optional[Exception] = None
+
+        with self._slots:
+            while True:
+                endpoint = self._acquire_endpoint(tried)
+                if endpoint is None:
+                    break
+                tried.append(endpoint)
+                ok = False
+                try:
+                    response = endpoint.session.post(
+                        f"{endpoint.base_url}{path}", json=payload, timeout=(self.connect_timeout, self.timeout)
+                    )
+                    if response.status_code == 404:
+                        # The host is up, it just lacks the model; no reason to cool it down
+                        ok = True
+                        not_found = True
+                        logger.warning(f"{endpoint.base_url}{path} returned 404")
+                        continue
+                    response.raise_for_status()
+                    result = response.json()
+                    ok = True
+                    return result
+                except (requests.RequestException, ValueError) as e:
+                    last_error = e
+                    logger.warning(f"Ollama request to {endpoint.base_url} failed: {e}")
+                finally:
+                    self._release_endpoint(endpoint, ok)
+
+        if not_found:
+            return None
+        raise OllamaUnavailableError(f"No Ollama endpoint answered: {last_error}")
+
+    def stats(self) -> List[Dict[str, Union[str, int, bool]]]:
+        return [endpoint.stats() for endpoint in self.endpoints]
+
+    def close(self):
+        for endpoint in self.endpoints:
+            endpoint.session.close()
@@ -1,14 +1,38 @@
 import os
-from typing import List
+from bisect import bisect_right
+from typing import List, Optional, Union
 
-# We use a try-except block to allow linting/testing without heavy dependencies if needed,
-# but in production this should be a hard dependency.
-try:
-    import torch
-    from faster_whisper import WhisperModel
-except ImportError:
-    torch = None
-    WhisperModel = None
+import numpy as np
+
+from src.models.model_registry import ModelRegistry, shared_registry
+from src.utils.audio_io import AudioBuffer
+from src.utils.lazy_import import cuda_available, optional_import
+
+# faster-whisper is bound by _import_faster_whisper() when a transcriber first needs it
+WhisperModel = None
+BatchedInferencePipeline = None
+VadOptions = None
+get_speech_timestamps = None
+
+# faster-whisper takes arrays as 16 kHz mono float32
+WHISPER_SAMPLE_RATE = 16000
+# Whisper's encoder window; clips up to this long fit in one batch item
+WHISPER_WINDOW_SECONDS = 30.0
+
+
+def _import_faster_whisper():
+    """
+    Binds the faster-whisper names still unset. Names already set, e.g. patched in tests, are kept.
+    """
+    global WhisperModel, BatchedInferencePipeline, VadOptions, get_speech_timestamps
+    faster_whisper = optional_import("faster_whisper")
+    if faster_whisper is not None:
+        WhisperModel = WhisperModel or faster_whisper.WhisperModel
+        BatchedInferencePipeline = BatchedInferencePipeline or faster_whisper.BatchedInferencePipeline
+    vad = optional_import("faster_whisper.vad")
+    if vad is not None:
+        VadOptions = VadOptions or vad.VadOptions
+        get_speech_timestamps = get_speech_timestamps or vad.get_speech_timestamps
 
 
 class FasterWhisperTranscriber:
@@ -19,55 +43,183 @@ class FasterWhisperTranscriber:
     def __init__(
         self,
         model_size: str = "large-v3-turbo",
-        device: str = "cuda" if torch and torch.cuda.is_available() else "cpu",
-        compute_type: str = "float16" if torch and torch.cuda.is_available() else "int8",
+        device: Optional[str] = None,
+        compute_type: Optional[str] = None,
+        beam_size: int = 5,
+        batch_size: int = 16,
+        cpu_threads: int = 0,
+        num_workers: int = 1,
+        registry: Optional[ModelRegistry] = None,
     ):
         """
         Initialize the transcriber.
 
         Args:
             model_size (str): The size of the whisper model (e.g., "large-v3", "medium").
-            device (str): Device to run on ("cuda" or "cpu").
-            compute_type (str): Quantization type ("float16", "int8_float16", "int8").
+            device (str): Device to run on ("cuda" or "cpu"; default: cuda when torch sees a GPU).
+            compute_type (str): Quantization type ("float16", "int8_float16", "int8"; default: float16 on cuda).
+            beam_size (int): Beam width of the decoder.
+            batch_size (int): Clips encoded together by transcribe_batch.
+            cpu_threads (int): CTranslate2 threads per worker on CPU (0 uses the library default).
+            num_workers (int): Transcriptions the model may run in parallel from different threads.
+            registry (ModelRegistry): Where the model is loaded and shared (default: the process-wide registry).
         """
         self.model_size = model_size
-        self.device = device
-        self.compute_type = compute_type
-        self._model = None
+        # Resolved on first use, so building a transcriber does not import torch
+        self._device = device
+        self._compute_type = compute_type
+        self.beam_size = beam_size
+        self.batch_size = batch_size
+        self.cpu_threads = cpu_threads
+        self.num_workers = num_workers
+        self.registry = registry or shared_registry()
+
+    @property
+    def device(self) -> str:
+        if self._device is None:
+            self._device = "cuda" if cuda_available() else "cpu"
+        return self._device
+
+    @property
+    def compute_type(self) -> str:
+        return self._compute_type or ("float16" if self.device == "cuda" else "int8")
+
+    @property
+    def model_key(self) -> str:
+        """
+        Registry key of the model; transcribers with the same settings share one instance.
+        """
+        threads = f"{self.cpu_threads}x{self.num_workers}"
+        return f"faster-whisper:{self.model_size}@{self.device}/{self.compute_type}/{threads}"
 
     @property
     def model(self):
         """
-        Lazy load the model.
+        The loaded model, loaded through the registry on first use or after it was evicted.
         """
-        if self._model is None:
-            if WhisperModel is None:
-                raise ImportError("faster_whisper is not installed.")
+        return self.registry.get(self.model_key, self._load_model)
+
+    def _load_model(self):
+        _import_faster_whisper()
+        if WhisperModel is None:
+            raise ImportError("faster_whisper is not installed.")
 
-            # We delay import or model loading until needed
-            print(f"Loading Faster-Whisper model: {self.model_size} on {self.device}...")
-            self._model = WhisperModel(self.model_size, device=self.device, compute_type=self.compute_type)
-        return self._model
+        print(f"Loading Faster-Whisper model: {self.model_size} on {self.device}...")
+        return WhisperModel(
+            self.model_size,
+            device=self.device,
+            compute_type=self.compute_type,
+            cpu_threads=self.cpu_threads,
+            num_workers=self.num_workers,
+        )
 
-    def transcribe(self, audio_path: str, language: str = "en") -> List[dict]:
+    @property
+    def batched(self):
+        """
+        Batched inference pipeline over the loaded model. It is cheap to build, and not keeping it
+        lets the model be freed when the registry evicts it.
         """
-        Transcribe an audio file.
+        if BatchedInferencePipeline is None:
+            _import_faster_whisper()
+        if BatchedInferencePipeline is None:
+            raise ImportError("faster_whisper is not installed.")
+        return BatchedInferencePipeline(self.model)
+
+    def transcribe(self, audio: Union[str, AudioBuffer], language: str = "en") -> List[dict]:
+        """
+        Transcribe an audio file or an in-memory buffer.
 
         Args:
-            audio_path (str): Path to the WAV file.
+            audio (str | AudioBuffer): Path to the WAV file, or decoded audio. Buffers are handed to the
+                model as 16 kHz mono samples, skipping faster-whisper's own decoding.
             language (str): Language code (default "en").
 
         Returns:
             List[dict]: A list of segments with 'start', 'end', and 'text'.
         """
-        if not os.path.exists(audio_path):
-            raise FileNotFoundError(f"Audio file not found: {audio_path}")
+        if isinstance(audio, AudioBuffer):
+            audio = audio.to_mono().resample(WHISPER_SAMPLE_RATE).samples[:, 0]
+        elif not os.path.exists(audio):
+            raise FileNotFoundError(f"Audio file not found: {audio}")
+
+        with self.registry.lease(self.model_key):
+            segments, info = self.model.transcribe(audio, beam_size=self.beam_size, language=language, vad_filter=True)
+
+            result = []
+            # segments is a generator, so we iterate
+            for segment in segments:
+                result.append({"start": segment.start, "end": segment.end, "text": segment.text.strip()})
+
+            return result
+
+    def transcribe_batch(self, audios: List[Union[str, AudioBuffer]], language: str = "en") -> List[List[dict]]:
+        """
+        Transcribe many clips, packing up to `batch_size` of them into each encoder call.
 
-        segments, info = self.model.transcribe(audio_path, beam_size=5, language=language, vad_filter=True)
+        Every clip up to 30 s is trimmed to its speech with the same VAD as transcribe() and becomes
+        one item of faster-whisper's batched pipeline. Longer clips are transcribed one by one.
+
+        Args:
+            audios (List[str | AudioBuffer]): WAV paths or decoded audio.
+            language (str): Language code (default "en").
+
+        Returns:
+            List[List[dict]]: The segments of each input, in input order, as transcribe() returns them.
+        """
+        if get_speech_timestamps is None:
+            _import_faster_whisper()
+        results: List[List[dict]] = [[] for _ in audios]
+        clips, clip_timestamps, owners, offsets = [], [], [], []
+        position = 0
+        for i, audio in enumerate(audios):
+            if not isinstance(audio, AudioBuffer):
+                if not os.path.exists(audio):
+                    raise FileNotFoundError(f"Audio file not found: {audio}")
+                audio = AudioBuffer.read(audio, WHISPER_SAMPLE_RATE, 1)
+            if audio.duration > WHISPER_WINDOW_SECONDS:
+                results[i] = self.transcribe(audio, language=language)
+                continue
+
+            samples = audio.to_mono().resample(WHISPER_SAMPLE_RATE).samples[:, 0]
+            if get_speech_timestamps is None:
+                raise ImportError("faster_whisper is not installed.")
+            speech = get_speech_timestamps(samples, VadOptions())
+            if not speech:
+                continue
+            # Clips sit back to back in one array; each batch item covers the clip's speech
+            clips.append(samples)
+            clip_timestamps.append(
+                {
+                    "start": (position + speech[0]["start"]) / WHISPER_SAMPLE_RATE,
+                    "end": (position + speech[-1]["end"]) / WHISPER_SAMPLE_RATE,
+                }
+            )
+            owners.append(i)
+            offsets.append(position / WHISPER_SAMPLE_RATE)
+            position += samples.shape[0]
 
-        result = []
-        # segments is a generator, so we iterate
-        for segment in segments:
-            result.append({"start": segment.start, "end": segment.end, "text": segment.text.strip()})
+        if not clips:
+            return results
 
-        return result
+        with self.registry.lease(self.model_key):
+            segments, info = self.batched.transcribe(
+                np.concatenate(clips),
+                language=language,
+                beam_size=self.beam_size,
+                batch_size=self.batch_size,
+                clip_timestamps=clip_timestamps,
+                vad_filter=False,
+            )
+            starts = [clip["start"] for clip in clip_timestamps]
+            for segment in segments:
+                # Timestamps come back on the joined array; rounding may put a start just before its clip
+                clip = max(bisect_right(starts, segment.start + 1e-3) - 1, 0)
+                offset = offsets[clip]
+                results[owners[clip]].append(
+                    {
+                        "start": round(segment.start - offset, 3),
+                        "end": round(segment.end - offset, 3),
+                        "text": segment.text.strip(),
+                    }
+                )
+            return results
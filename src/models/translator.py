@@ -1,32 +1,113 @@
+import hashlib
 import json
 import logging
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Union
 
 import requests
 
+from src.models.ollama_client import OllamaClient
+from src.utils.translation_cache import TranslationCache
+
 logger = logging.getLogger(__name__)
 
+TRANSLATION_INSTRUCTIONS = """You are translating game dialogue from English to {target_lang}.
+        Maintain the character's tone, emotion, and any specific gaming terminology."""
+
+RESPONSE_FIELDS = """1. "text": The translated dialogue (ONLY the translation, no explanations)
+        2. "tts_instruction": A brief instruction for voice synthesis that specifies the accent/dialect variant
+           (e.g., for "Brazilian Portuguese" use "Brazilian Portuguese accent and pronunciation",
+            for "European Portuguese" use "European Portuguese accent and pronunciation",
+            for "American English" use "American English accent", etc.)
+        3. "target_language": The base language name in English (lowercase) for TTS compatibility.
+           (e.g., 'portuguese' for 'Brazilian Portuguese', 'english' for 'English (US)',
+            'spanish' for 'Mexican Spanish')."""
+
+
+LINE_PROMPT = """
+        {instructions}
+
+        Respond in JSON format with three fields:
+        {fields}
+
+        {context}
+
+        Text to translate:
+        ###
+        {text}
+        ###
+
+        Respond with valid JSON only:
+        """
+
+BATCH_PROMPT = """
+        {instructions}
+
+        You will receive a JSON array of numbered lines. Translate every line on its own.
+        Respond with a JSON object {{"translations": [...]}} holding one entry per input line,
+        in the same order, each with four fields:
+        0. "id": The id of the line, unchanged
+        {fields}
+
+        {context}
+
+        Lines to translate:
+        ###
+        {lines}
+        ###
+
+        Respond with valid JSON only:
+        """
+
+# Identifies the prompt wording in cache keys, so editing any of the templates invalidates cached results
+PROMPT_VERSION = hashlib.sha256(
+    "\x1f".join([TRANSLATION_INSTRUCTIONS, RESPONSE_FIELDS, LINE_PROMPT, BATCH_PROMPT]).encode("utf-8")
+).hexdigest()[:16]
+
 
 class OllamaTranslator:
     """
     Translates text using local Ollama instance.
+    Several instances can be given as a list of base URLs; requests are spread across them.
     """
 
-    def __init__(self, model: str = "llama3.1", base_url: str = "http://localhost:11434"):
+    def __init__(
+        self,
+        model: str = "llama3.1",
+        base_url: Union[str, List[str]] = "http://localhost:11434",
+        cache: Optional[TranslationCache] = None,
+        max_concurrency: int = 4,
+    ):
         self.model = model
-        self.base_url = base_url
-        self.api_url = f"{base_url}/api/generate"
-        self.pull_url = f"{base_url}/api/pull"
+        self.cache = cache
+        self.base_urls = [base_url] if isinstance(base_url, str) else list(base_url)
+        self.base_url = self.base_urls[0]
+        self.api_url = f"{self.base_url}/api/generate"
+        self.pull_url = f"{self.base_url}/api/pull"
+        self.client = OllamaClient(self.base_urls, max_concurrency=max_concurrency)
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """
+        Threads used to keep up to `max_concurrency` translation requests in flight.
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.client.max_concurrency, thread_name_prefix="ollama")
+        return self._executor
 
     def pull_model(self) -> bool:
         """
-        Pull the required model via Ollama API with streaming progress.
+        Pull the required model via Ollama API with streaming progress, on every configured host.
         """
-        logger.info(f"Pulling model '{self.model}' via Ollama API...")
+        return all([self._pull_from(base_url) for base_url in self.base_urls])
+
+    def _pull_from(self, base_url: str) -> bool:
+        logger.info(f"Pulling model '{self.model}' via Ollama API at {base_url}...")
         try:
             payload = {"model": self.model, "stream": True}
             # Large models can take substantial time to download; use a long timeout (1 hour) for the streaming pull
-            response = requests.post(self.pull_url, json=payload, stream=True, timeout=3600)
+            response = requests.post(f"{base_url}/api/pull", json=payload, stream=True, timeout=3600)
             response.raise_for_status()
 
             for line in response.iter_lines():
@@ -48,6 +129,51 @@ class OllamaTranslator:
             logger.error(f"Failed to pull model '{self.model}' via API: {e}")
             return False
 
+    def _generate(self, prompt: str) -> Optional[str]:
+        """
+        Sends a prompt to the least busy healthy Ollama host and returns the raw response text.
+        Returns None when the model is missing; failures on every host raise.
+        """
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": False,
+            "format": "json",
+            "options": {"temperature": 0.3},
+        }
+
+        result = self.client.post_json("/api/generate", payload)
+
+        if result is None:
+            logger.error(f"Ollama model '{self.model}' not found. Please run 'ollama pull {self.model}'")
+            return None
+
+        return result.get("response", "").strip()
+
+    @staticmethod
+    def _parse_fields(parsed: dict) -> dict:
+        """
+        Extracts and cleans the translation fields from one parsed JSON object.
+        """
+        return {
+            "text": str(parsed.get("text", "")).strip().strip('"'),
+            "tts_instruction": str(parsed.get("tts_instruction", "")).strip().strip('"'),
+            "target_language": str(parsed.get("target_language", "")).strip().strip('"').lower(),
+        }
+
+    def _cache_key(self, text: str, target_lang: str, context: Optional[str]) -> str:
+        return TranslationCache.make_key(text, target_lang, self.model, PROMPT_VERSION, context)
+
+    def _cached(self, text: str, target_lang: str, context: Optional[str]) -> Optional[dict]:
+        if self.cache is None:
+            return None
+        return self.cache.get(self._cache_key(text, target_lang, context))
+
+    def _remember(self, text: str, target_lang: str, context: Optional[str], result: dict):
+        """Stores a successful translation. Fallbacks to the source text are never cached."""
+        if self.cache is not None:
+            self.cache.put(self._cache_key(text, target_lang, context), result)
+
     def translate(self, text: str, target_lang: str, context: Optional[str] = None) -> dict:
         """
         Translate text to target language with optional context.
@@ -59,74 +185,51 @@ class OllamaTranslator:
         if not text.strip():
             return {"text": "", "tts_instruction": "", "target_language": ""}
 
-        prompt = f"""
-        You are translating game dialogue from English to {target_lang}.
-        Maintain the character's tone, emotion, and any specific gaming terminology.
+        cached = self._cached(text, target_lang, context)
+        if cached is not None:
+            logger.info(f"Translation cache hit: {text[:50]}...")
+            return cached
 
-        Respond in JSON format with two fields:
-        1. "text": The translated dialogue (ONLY the translation, no explanations)
-        2. "tts_instruction": A brief instruction for voice synthesis that specifies the accent/dialect variant
-           (e.g., for "Brazilian Portuguese" use "Brazilian Portuguese accent and pronunciation",
-            for "European Portuguese" use "European Portuguese accent and pronunciation",
-            for "American English" use "American English accent", etc.)
-         3. "target_language": The base language name in English (lowercase) for TTS compatibility.
-            (e.g., 'portuguese' for 'Brazilian Portuguese', 'english' for 'English (US)',
-             'spanish' for 'Mexican Spanish').
+        return self._translate_one(text, target_lang, context)
 
-        {f"Context: {context}" if context else ""}
-
-        Text to translate:
-        ###
-        {text}
-        ###
-
-        Respond with valid JSON only:
+    def _translate_one(self, text: str, target_lang: str, context: Optional[str]) -> dict:
         """
+        Translates one line with its own request, caching the result when it succeeds.
+        """
+        prompt = LINE_PROMPT.format(
+            instructions=TRANSLATION_INSTRUCTIONS.format(target_lang=target_lang),
+            fields=RESPONSE_FIELDS,
+            context=f"Context: {context}" if context else "",
+            text=text,
+        )
 
         logger.info(f"Translating text: {text[:50]}...")
 
         try:
-            payload = {
-                "model": self.model,
-                "prompt": prompt,
-                "stream": False,
-                "format": "json",
-                "options": {"temperature": 0.3},
-            }
-
-            response = requests.post(self.api_url, json=payload, timeout=120)
-
-            if response.status_code == 404:
-                logger.error(f"Ollama model '{self.model}' not found. Please run 'ollama pull {self.model}'")
+            response_text = self._generate(prompt)
+            if response_text is None:
                 return {"text": text, "tts_instruction": "", "target_language": ""}
 
-            response.raise_for_status()
-
-            result = response.json()
-            response_text = result.get("response", "").strip()
-
             if not response_text:
                 logger.warning("Ollama returned empty response. Using original text.")
                 return {"text": text, "tts_instruction": "", "target_language": ""}
 
             try:
-                parsed = json.loads(response_text)
-                translated_text = parsed.get("text", "").strip().strip('"')
-                tts_instruction = parsed.get("tts_instruction", "").strip().strip('"')
-                target_language = parsed.get("target_language", "").strip().strip('"').lower()
+                result = self._parse_fields(json.loads(response_text))
 
-                if not translated_text:
+                if not result["text"]:
                     logger.warning("Ollama returned empty translation. Using original text.")
-                    return {"text": text, "tts_instruction": tts_instruction, "target_language": target_language}
+                    return {**result, "text": text}
 
-                logger.info(f"Translation successful: {translated_text[:50]}...")
-                if tts_instruction:
-                    logger.info(f"TTS instruction: {tts_instruction}")
+                logger.info(f"Translation successful: {result['text'][:50]}...")
+                if result["tts_instruction"]:
+                    logger.info(f"TTS instruction: {result['tts_instruction']}")
                 else:
                     logger.warning("No TTS instruction generated by LLM")
 
-                return {"text": translated_text, "tts_instruction": tts_instruction, "target_language": target_language}
-            except json.JSONDecodeError as e:
+                self._remember(text, target_lang, context, result)
+                return result
+            except (json.JSONDecodeError, AttributeError) as e:
                 logger.warning(f"Failed to parse JSON response: {e}")
                 logger.warning(f"Raw response: {response_text[:200]}...")
                 # Fallback: treat the entire response as translated text
@@ -136,6 +239,91 @@ class OllamaTranslator:
             logger.error(f"Ollama translation failed: {e}")
             return {"text": text, "tts_instruction": "", "target_language": ""}
 
+    def translate_batch(
+        self, texts: List[str], target_lang: str, context: Optional[str] = None, batch_size: int = 20
+    ) -> List[dict]:
+        """
+        Translates many lines with one request per `batch_size` lines, so the instruction block is
+        sent and evaluated once per group instead of once per line. Groups are sent concurrently.
+
+        Results are matched back to the inputs by id. Lines the model drops, leaves empty or
+        garbles (or a whole malformed response) fall back to one request per line.
+        Lines found in the cache are not sent at all.
+
+        Returns:
+            List[dict]: One {"text", "tts_instruction", "target_language"} dict per input, in order.
+        """
+        results: List[Optional[dict]] = [None] * len(texts)
+        pending = []
+        for index, text in enumerate(texts):
+            if not text.strip():
+                results[index] = {"text": "", "tts_instruction": "", "target_language": ""}
+                continue
+            cached = self._cached(text, target_lang, context)
+            if cached is not None:
+                results[index] = cached
+            else:
+                pending.append(index)
+
+        size = max(1, batch_size)
+        chunks = [pending[start : start + size] for start in range(0, len(pending), size)]
+        chunks = [chunk for chunk in chunks if len(chunk) > 1]
+        # Chunks are independent requests, so they run concurrently across the Ollama hosts
+        answers = self.executor.map(
+            lambda chunk: self._translate_chunk([texts[i] for i in chunk], target_lang, context), chunks
+        )
+        for chunk, answer in zip(chunks, answers):
+            for index, result in answer.items():
+                results[chunk[index]] = result
+                self._remember(texts[chunk[index]], target_lang, context, result)
+
+        missing = [index for index in pending if results[index] is None]
+        fallbacks = self.executor.map(lambda index: self._translate_one(texts[index], target_lang, context), missing)
+        for index, result in zip(missing, fallbacks):
+            results[index] = result
+        return results
+
+    def _translate_chunk(self, texts: List[str], target_lang: str, context: Optional[str]) -> Dict[int, dict]:
+        """
+        Translates one group of lines in a single request.
+        Returns the usable results keyed by position in `texts`; missing keys need a retry.
+        """
+        lines = json.dumps([{"id": i, "text": text} for i, text in enumerate(texts)], ensure_ascii=False, indent=1)
+        prompt = BATCH_PROMPT.format(
+            instructions=TRANSLATION_INSTRUCTIONS.format(target_lang=target_lang),
+            fields=RESPONSE_FIELDS,
+            context=f"Context: {context}" if context else "",
+            lines=lines,
+        )
+
+        logger.info(f"Translating batch of {len(texts)} lines...")
+        try:
+            response_text = self._generate(prompt)
+            parsed = json.loads(response_text) if response_text else None
+        except Exception as e:
+            logger.warning(f"Batch translation failed, translating lines individually: {e}")
+            return {}
+
+        entries = parsed.get("translations") if isinstance(parsed, dict) else parsed
+        if not isinstance(entries, list):
+            logger.warning("Batch translation response is not a list, translating lines individually")
+            return {}
+
+        results = {}
+        for position, entry in enumerate(entries):
+            if not isinstance(entry, dict):
+                continue
+            index = entry.get("id", position)
+            if not isinstance(index, int) or not 0 <= index < len(texts) or index in results:
+                continue
+            result = self._parse_fields(entry)
+            if result["text"]:
+                results[index] = result
+
+        if len(results) < len(texts):
+            logger.warning(f"Batch translation returned {len(results)}/{len(texts)} usable lines")
+        return results
+
 
 if __name__ == "__main__":
     # Basic test (requires Ollama running)
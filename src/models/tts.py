@@ -1,60 +1,356 @@
 import logging
 import os
-from typing import Optional
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Union
 
 import soundfile as sf
 
-try:
-    import torch
-    import torchaudio
-    from qwen_tts import Qwen3TTSModel
-except ImportError:
-    torch = None
-    torchaudio = None
-    Qwen3TTSModel = None
+from src.models.model_registry import ModelRegistry, shared_registry
+from src.models.voice_prompt_cache import VoicePromptCache
+from src.utils.audio_io import AudioBuffer
+from src.utils.lazy_import import cuda_available, optional_import
+
+# torch and qwen-tts are bound by _import_qwen_tts() when the model is first needed
+torch = None
+Qwen3TTSModel = None
+VoiceClonePromptItem = None
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class TTSRequest:
+    """
+    One line to synthesize in a batch. `output_path` is only needed by generate_dub_batch.
+    """
+
+    text: str
+    ref_audio: Union[str, AudioBuffer]
+    language: str = "Portuguese"
+    ref_text: Optional[str] = None
+    instruct: Optional[str] = None
+    output_path: Optional[str] = None
+
+
+def _import_qwen_tts():
+    """
+    Binds the torch and qwen-tts names still unset. Names already set, e.g. patched in tests, are kept.
+    """
+    global torch, Qwen3TTSModel, VoiceClonePromptItem
+    torch = torch or optional_import("torch")
+    qwen_tts = optional_import("qwen_tts")
+    if qwen_tts is not None:
+        Qwen3TTSModel = Qwen3TTSModel or qwen_tts.Qwen3TTSModel
+        VoiceClonePromptItem = VoiceClonePromptItem or getattr(qwen_tts, "VoiceClonePromptItem", None)
+
+
+def _is_out_of_memory(error: Exception) -> bool:
+    if isinstance(error, MemoryError):
+        return True
+    oom_error = getattr(getattr(torch, "cuda", None), "OutOfMemoryError", None)
+    if isinstance(oom_error, type) and isinstance(error, oom_error):
+        return True
+    return "out of memory" in str(error).lower()
+
+
 class TTSWrapper:
     """
     Handles dubbing synthesis using zero-shot voice cloning with Qwen3-TTS.
     """
 
-    def __init__(self, model_id: str = "Qwen/Qwen3-TTS-12Hz-1.7B-Base"):
+    # Longest text of a batch may be this many times the shortest; padding to it is wasted work
+    BUCKET_LENGTH_RATIO = 1.5
+
+    def __init__(
+        self,
+        model_id: str = "Qwen/Qwen3-TTS-12Hz-1.7B-Base",
+        max_batch_size: int = 8,
+        voice_cache: Optional[VoicePromptCache] = None,
+        registry: Optional[ModelRegistry] = None,
+    ):
         self.model_id = model_id
-        self.device = "cuda" if torch and torch.cuda.is_available() else "cpu"
-        self._model = None
+        # Lowered for the rest of the run whenever a batch runs out of memory
+        self.max_batch_size = max_batch_size
+        self._device: Optional[str] = None
+        # Reference speech codes and speaker embeddings, so each voice is analysed once
+        self.voice_cache = voice_cache if voice_cache is not None else VoicePromptCache()
+        # Shared with other wrappers of the same model; the model is fetched from it on every use
+        self.registry = registry or shared_registry()
         self._model_load_failed = False
 
+    @property
+    def device(self) -> str:
+        """
+        "cuda" when torch sees a GPU, else "cpu". Resolved on first use, so building the wrapper does not import torch.
+        """
+        if self._device is None:
+            self._device = "cuda" if cuda_available() else "cpu"
+        return self._device
+
+    @property
+    def model_key(self) -> str:
+        return f"qwen3-tts:{self.model_id}@{self.device}"
+
     @property
     def model(self):
         """
-        Lazy load the Qwen3TTS model.
+        The Qwen3TTS model, loaded through the registry on first use or after it was evicted.
+        None if it cannot be loaded.
         """
-        if self._model is None and not self._model_load_failed:
-            if not Qwen3TTSModel:
-                logger.error("qwen-tts library not installed or import failed.")
-                self._model_load_failed = True
-                return None
+        if self._model_load_failed:
+            return None
+        _import_qwen_tts()
+        if self.voice_cache.prompt_factory is None:
+            self.voice_cache.prompt_factory = VoiceClonePromptItem
+        if self.voice_cache.map_location is None:
+            self.voice_cache.map_location = self.device
+        if not Qwen3TTSModel:
+            logger.error("qwen-tts library not installed or import failed.")
+            self._model_load_failed = True
+            return None
+        try:
+            return self.registry.get(self.model_key, self._load_model)
+        except Exception as e:
+            logger.error(f"Failed to load TTS model: {e}")
+            self._model_load_failed = True
+            return None
+
+    def _load_model(self):
+        logger.info(f"Loading Qwen3 TTS model: {self.model_id} on {self.device}...")
+        # Qwen3-TTS recommends bfloat16 for CUDA if supported
+        if self.device == "cuda":
+            dtype = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+        else:
+            dtype = torch.float32
+
+        return Qwen3TTSModel.from_pretrained(
+            self.model_id,
+            device_map=self.device,
+            dtype=dtype,
+        )
+
+    def _clone(
+        self,
+        text: str,
+        ref_audio: Union[str, AudioBuffer],
+        language: str,
+        ref_text: Optional[str],
+        instruct: Optional[str],
+    ) -> Optional[tuple]:
+        """
+        Runs zero-shot voice cloning and returns (waveform, sample_rate), or None on failure.
+        """
+        if not text.strip():
+            return None
 
-            logger.info(f"Loading Qwen3 TTS model: {self.model_id} on {self.device}...")
+        reference = self._reference(ref_audio)
+        if reference is None:
+            return None
+        ref_input, ref_label = reference
+
+        logger.info(f"Generating dub for: {text[:30]}... using reference: {ref_label}")
+
+        with self.registry.lease(self.model_key):
             try:
-                # Qwen3-TTS recommends bfloat16 for CUDA if supported
-                if self.device == "cuda":
-                    dtype = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+                model = self.model
+                if model is None:
+                    return None
+
+                # Qwen3TTSModel has a specific method for zero-shot cloning
+                # If ref_text is None, it uses x-vector-only mode.
+                # The instruct parameter should be provided by the LLM translator for accent/dialect guidance
+                prompt = self._voice_prompt(model, ref_audio, ref_input, ref_text)
+                if prompt is not None:
+                    wavs, sr = model.generate_voice_clone(
+                        text=text, language=language, voice_clone_prompt=[prompt], instruct=instruct
+                    )
                 else:
-                    dtype = torch.float32
+                    wavs, sr = model.generate_voice_clone(
+                        text=text,
+                        language=language,
+                        ref_audio=ref_input,
+                        ref_text=ref_text,
+                        instruct=instruct,
+                        x_vector_only_mode=(ref_text is None),
+                    )
+
+                # wavs is typically a list of waveforms (one per text/audio pair)
+                if len(wavs) > 0:
+                    return wavs[0], sr
+                logger.error("TTS model returned no audio.")
+                return None
+
+            except Exception as e:
+                logger.error(f"TTS synthesis failed: {e}")
+                return None
+
+    def _reference(self, ref_audio: Union[str, AudioBuffer]) -> Optional[Tuple[object, str]]:
+        """
+        Converts a reference to the form qwen-tts takes, with a label for the logs. None if the file is missing.
+        """
+        if isinstance(ref_audio, AudioBuffer):
+            # qwen-tts takes an in-memory reference as a (samples, sample_rate) pair
+            samples = (ref_audio.to_mono().samples[:, 0], ref_audio.sample_rate)
+            return samples, f"{ref_audio.duration:.1f}s in-memory reference"
+        if not os.path.exists(ref_audio):
+            logger.error(f"Reference audio not found: {ref_audio}")
+            return None
+        return ref_audio, ref_audio
+
+    def _voice_prompt(self, model, ref_audio: Union[str, AudioBuffer], ref_input, ref_text: Optional[str]):
+        """
+        Returns the model's clone prompt for a reference, computing it only the first time the voice is seen.
+        None when the installed qwen-tts cannot build prompts; the reference is then passed as is.
+        """
+        if not hasattr(model, "create_voice_clone_prompt"):
+            return None
+        try:
+            key = VoicePromptCache.make_key(ref_audio, ref_text, self.model_id)
+        except OSError:
+            # An unreadable reference cannot be looked up; the model reports the real problem below
+            key = None
+        prompt = self.voice_cache.get(key) if key else None
+        if prompt is None:
+            prompt = model.create_voice_clone_prompt(
+                ref_audio=ref_input, ref_text=ref_text, x_vector_only_mode=(ref_text is None)
+            )[0]
+            if key:
+                self.voice_cache.put(key, prompt)
+        return prompt
+
+    def _buckets(self, requests: List[TTSRequest], indices: List[int]) -> List[List[int]]:
+        """
+        Groups requests into batches of similar text length. Requests in one model call also need
+        the same instruction and cloning mode, which the model takes once per call.
+        """
+        groups: Dict[tuple, List[int]] = {}
+        for index in sorted(indices, key=lambda i: len(requests[i].text)):
+            request = requests[index]
+            groups.setdefault((request.instruct or "", request.ref_text is None), []).append(index)
+
+        buckets = []
+        for group in groups.values():
+            bucket: List[int] = []
+            for index in group:
+                shortest = len(requests[bucket[0]].text) if bucket else 0
+                if bucket and (
+                    len(bucket) >= self.max_batch_size
+                    or len(requests[index].text) > max(shortest, 1) * self.BUCKET_LENGTH_RATIO
+                ):
+                    buckets.append(bucket)
+                    bucket = []
+                bucket.append(index)
+            if bucket:
+                buckets.append(bucket)
+        return buckets
+
+    def _clone_batch(self, items: List[Tuple[TTSRequest, object]]) -> List[Optional[tuple]]:
+        """
+        Synthesizes (request, prepared reference) items in one model call. A batch that runs out of
+        memory is retried in halves, and later batches are kept below the size that failed.
+        Any other failure is retried item by item, so one bad line does not sink its neighbours.
+        """
+        with self.registry.lease(self.model_key):
+            model = self.model
+            if model is None:
+                return [None] * len(items)
 
-                self._model = Qwen3TTSModel.from_pretrained(
-                    self.model_id,
-                    device_map=self.device,
-                    dtype=dtype,
+            requests = [request for request, _ in items]
+            try:
+                prompts = [
+                    self._voice_prompt(model, request.ref_audio, ref, request.ref_text) for request, ref in items
+                ]
+                inputs = (
+                    {"voice_clone_prompt": prompts}
+                    if None not in prompts
+                    else {
+                        "ref_audio": [ref for _, ref in items],
+                        "ref_text": [request.ref_text for request in requests],
+                        "x_vector_only_mode": requests[0].ref_text is None,
+                    }
+                )
+                wavs, sr = model.generate_voice_clone(
+                    text=[request.text for request in requests],
+                    language=[request.language for request in requests],
+                    instruct=requests[0].instruct,
+                    **inputs,
                 )
+                if len(wavs) != len(items):
+                    raise RuntimeError(f"TTS model returned {len(wavs)} waveforms for {len(items)} lines")
+                return [(wav, sr) for wav in wavs]
             except Exception as e:
-                logger.error(f"Failed to load TTS model: {e}")
-                self._model_load_failed = True
-        return self._model
+                if len(items) == 1:
+                    logger.error(f"TTS synthesis failed: {e}")
+                    return [None]
+                if _is_out_of_memory(e):
+                    self.max_batch_size = min(self.max_batch_size, (len(items) + 1) // 2)
+                    logger.warning(
+                        f"TTS batch of {len(items)} ran out of memory, retrying in batches of {self.max_batch_size}"
+                    )
+                    if torch is not None and self.device == "cuda":
+                        torch.cuda.empty_cache()
+                    results = []
+                    while items:
+                        chunk, items = items[: self.max_batch_size], items[self.max_batch_size :]
+                        results += self._clone_batch(chunk)
+                    return results
+                logger.warning(f"TTS batch of {len(items)} failed ({e}), retrying its lines one by one")
+                return [result for item in items for result in self._clone_batch([item])]
+
+    def synthesize_batch(self, requests: List[TTSRequest]) -> List[Optional[AudioBuffer]]:
+        """
+        Synthesizes many lines with as few model calls as possible, in batches of up to `max_batch_size`
+        lines of similar length. Returns one dub per request, None where it failed.
+        """
+        results: List[Optional[AudioBuffer]] = [None] * len(requests)
+        references = {}
+        for index, request in enumerate(requests):
+            if request.text.strip():
+                reference = self._reference(request.ref_audio)
+                if reference is not None:
+                    references[index] = reference[0]
+
+        buckets = self._buckets(requests, list(references))
+        if buckets:
+            logger.info(f"Synthesizing {len(references)} lines in {len(buckets)} batches")
+        for bucket in buckets:
+            # After an out-of-memory split the rest of the bucket runs in chunks of the new limit
+            while bucket:
+                chunk, bucket = bucket[: self.max_batch_size], bucket[self.max_batch_size :]
+                outputs = self._clone_batch([(requests[i], references[i]) for i in chunk])
+                for index, result in zip(chunk, outputs):
+                    results[index] = AudioBuffer(*result) if result else None
+        return results
+
+    def generate_dub_batch(self, requests: List[TTSRequest]) -> List[Optional[str]]:
+        """
+        Batched generate_dub: synthesizes every request and writes each dub to its own `output_path`.
+        Returns the written paths, None where synthesis failed.
+        """
+        written = []
+        for request, dub in zip(requests, self.synthesize_batch(requests)):
+            if dub is None:
+                written.append(None)
+                continue
+            sf.write(request.output_path, dub.samples, dub.sample_rate)
+            written.append(request.output_path)
+        logger.info(f"Synthesized {sum(1 for path in written if path)} of {len(requests)} dubs")
+        return written
+
+    def synthesize(
+        self,
+        text: str,
+        ref_audio: Union[str, AudioBuffer],
+        language: str = "Portuguese",
+        ref_text: Optional[str] = None,
+        instruct: Optional[str] = None,
+    ) -> Optional[AudioBuffer]:
+        """
+        Like generate_dub, but returns the dub in memory instead of writing it.
+        `ref_audio` may be a path or an already decoded buffer.
+        """
+        result = self._clone(text, ref_audio, language, ref_text, instruct)
+        return AudioBuffer(*result) if result else None
 
     def generate_dub(
         self,
@@ -78,46 +374,13 @@ class TTSWrapper:
             instruct: Optional instruction to guide voice characteristics
                      (e.g., "Brazilian Portuguese accent and pronunciation").
         """
-        if not text.strip():
-            return None
-
-        if not os.path.exists(ref_audio_path):
-            logger.error(f"Reference audio not found: {ref_audio_path}")
+        result = self._clone(text, ref_audio_path, language, ref_text, instruct)
+        if result is None:
             return None
 
-        logger.info(f"Generating dub for: {text[:30]}... using reference: {ref_audio_path}")
-
-        try:
-            model = self.model
-            if model is None:
-                return None
-
-            # Qwen3TTSModel has a specific method for zero-shot cloning
-            # ref_audio can be a path. If ref_text is None, it uses x-vector-only mode.
-            # The instruct parameter should be provided by the LLM translator for accent/dialect guidance
-
-            wavs, sr = model.generate_voice_clone(
-                text=text,
-                language=language,
-                ref_audio=ref_audio_path,
-                ref_text=ref_text,
-                instruct=instruct,
-                x_vector_only_mode=(ref_text is None),
-            )
-
-            # wavs is typically a list of waveforms (one per text/audio pair)
-            # We take the first one and save it.
-            if len(wavs) > 0:
-                sf.write(output_path, wavs[0], sr)
-                logger.info(f"Successfully synthesized audio to {output_path}")
-                return output_path
-            else:
-                logger.error("TTS model returned no audio.")
-                return None
-
-        except Exception as e:
-            logger.error(f"TTS synthesis failed: {e}")
-            return None
+        sf.write(output_path, *result)
+        logger.info(f"Successfully synthesized audio to {output_path}")
+        return output_path
 
 
 if __name__ == "__main__":
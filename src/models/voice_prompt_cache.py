@@ -0,0 +1,164 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import fields, is_dataclass
+from typing import Any, Callable, Dict, Optional, Union
+
+from src.utils.audio_io import AudioBuffer
+from src.utils.hashing import hash_file
+from src.utils.lazy_import import optional_import
+
+# Bound on the first disk read or write of a prompt; prompts only exist once the TTS model has loaded torch
+torch = None
+
+logger = logging.getLogger(__name__)
+
+
+def _import_torch():
+    global torch
+    torch = torch or optional_import("torch")
+
+
+def reference_hash(ref_audio: Union[str, AudioBuffer]) -> str:
+    """
+    Hash of a reference clip's audio, whether it is a file or already decoded.
+    """
+    if isinstance(ref_audio, AudioBuffer):
+        digest = hashlib.blake2b(ref_audio.samples.tobytes(), digest_size=16)
+        digest.update(str(ref_audio.sample_rate).encode("ascii"))
+        return digest.hexdigest()
+    return hash_file(ref_audio)
+
+
+class VoicePromptCache:
+    """
+    Cache of voice-clone prompts (reference speech codes and speaker embedding) computed by the TTS model.
+
+    Entries are keyed by a hash of the reference audio, its transcript and the model ID, so a voice
+    is only analysed once however many lines it speaks. The `max_entries` most recently used prompts
+    are kept in memory. With `cache_dir` set, prompts are also saved there as torch files and survive
+    restarts; the oldest files are removed once more than `max_disk_entries` accumulate.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        cache_dir: Optional[str] = None,
+        max_disk_entries: int = 10_000,
+        prompt_factory: Optional[Callable[..., Any]] = None,
+        map_location: Optional[str] = None,
+    ):
+        """
+        Args:
+            max_entries: Prompts kept in memory.
+            cache_dir: Folder to persist prompts in; None keeps them in memory only.
+            max_disk_entries: Prompt files kept in `cache_dir`.
+            prompt_factory: Rebuilds a prompt from its saved fields (e.g. VoiceClonePromptItem).
+                Without it, prompts are not read from disk.
+            map_location: Device that loaded tensors are moved to.
+        """
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.max_disk_entries = max_disk_entries
+        self.prompt_factory = prompt_factory
+        self.map_location = map_location
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(ref_audio: Union[str, AudioBuffer], ref_text: Optional[str], model_id: str) -> str:
+        parts = [reference_hash(ref_audio), ref_text or "", model_id]
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.pt")
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            prompt = self._entries.get(key)
+            if prompt is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return prompt
+
+        prompt = self._load(key)
+        with self._lock:
+            if prompt is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, prompt)
+        return prompt
+
+    def put(self, key: str, prompt: Any):
+        with self._lock:
+            self._remember(key, prompt)
+        self._save(key, prompt)
+
+    def _remember(self, key: str, prompt: Any):
+        """
+        Adds a prompt to the in-memory LRU. Caller holds the lock.
+        """
+        self._entries[key] = prompt
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _load(self, key: str) -> Optional[Any]:
+        _import_torch()
+        if not (self.cache_dir and self.prompt_factory and torch is not None):
+            return None
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            data = torch.load(path, map_location=self.map_location, weights_only=True)
+            return self.prompt_factory(**data)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable voice prompt {path}: {e}")
+            return None
+
+    def _save(self, key: str, prompt: Any):
+        _import_torch()
+        if not (self.cache_dir and torch is not None and is_dataclass(prompt)):
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.tmp"
+        try:
+            torch.save({f.name: getattr(prompt, f.name) for f in fields(prompt)}, tmp_path)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Failed to save voice prompt {path}: {e}")
+            return
+
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self._trim_disk()
+
+    def _trim_disk(self):
+        """
+        Removes the oldest prompt files beyond `max_disk_entries`.
+        """
+        try:
+            files = [entry for entry in os.scandir(self.cache_dir) if entry.name.endswith(".pt")]
+        except OSError:
+            return
+        if len(files) <= self.max_disk_entries:
+            return
+        files.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in files[: len(files) - self.max_disk_entries]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
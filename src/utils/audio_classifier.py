@@ -0,0 +1,179 @@
+import logging
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Iterator
+
+import numpy as np
+
+from src.utils.audio_io import AudioBuffer, audio_duration, frame_levels_db, iter_blocks
+
+logger = logging.getLogger(__name__)
+
+# Analysis runs on 16 kHz mono in 20 ms frames, i.e. a 50 Hz energy envelope
+ANALYSIS_RATE = 16000
+FRAME_SIZE = 320
+ENVELOPE_RATE = ANALYSIS_RATE / FRAME_SIZE
+
+LABELS = ("voice", "music", "ambiance", "sfx", "silence")
+
+
+@dataclass
+class ClassifierThresholds:
+    """
+    Decision thresholds of AudioClassifier. The defaults lean towards "voice" when in doubt,
+    since skipping a line is worse than dubbing a music cue for nothing.
+    """
+
+    # Share of frames that must look like speech (loud enough, energy in the voice band, not noise-like)
+    min_speech_ratio: float = 0.1
+    # Share of envelope fluctuation at syllable rate (2-8 Hz) that speech needs
+    min_modulation: float = 0.3
+    # Envelope standard deviation over its mean; sustained music and drones stay well below this
+    min_envelope_depth: float = 0.4
+    # Share of a frame's energy that must fall in 80-4000 Hz for it to count as speech-like
+    min_voice_band: float = 0.6
+    # Spectral flatness above which a frame is treated as noise
+    max_flatness: float = 0.3
+    # Clips quieter than this (dBFS at their loudest) or active less than min_activity are silence
+    silence_db: float = -60.0
+    min_activity: float = 0.02
+    # Non-voice clips up to this long are SFX rather than music or ambiance
+    sfx_max_seconds: float = 6.0
+    # Longer files are analysed in windows of this length, until one of them holds speech
+    max_seconds: float = 30.0
+
+
+@dataclass
+class Classification:
+    label: str
+    features: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def is_voice(self) -> bool:
+        return self.label == "voice"
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class AudioClassifier:
+    """
+    Cheap CPU classifier telling voice clips from music, ambiance, SFX and silence before any model runs.
+
+    It looks at a few frame features of a file: loudness, the share of energy in the voice band,
+    spectral flatness, and how strongly the loudness envelope moves at syllable rate.
+    Speech is loud in the voice band, tonal rather than noisy, and rises and falls a few times a second.
+    Files longer than `max_seconds` are classified window by window, so dialogue after a long
+    music intro still counts.
+    """
+
+    def __init__(self, thresholds: ClassifierThresholds = None):
+        self.thresholds = thresholds or ClassifierThresholds()
+
+    def features(self, audio: AudioBuffer) -> Dict[str, float]:
+        samples = audio.to_mono().resample(ANALYSIS_RATE).samples[:, 0]
+        count = samples.shape[0] // FRAME_SIZE
+        if count == 0:
+            names = ("activity", "speech_ratio", "modulation", "envelope_depth", "flatness")
+            return {"peak_db": -200.0, **dict.fromkeys(names, 0.0)}
+
+        frames = samples[: count * FRAME_SIZE].reshape(count, FRAME_SIZE)
+        level_db = frame_levels_db(samples, FRAME_SIZE)
+        rms = 10 ** (level_db / 20)
+        peak_db = float(np.percentile(level_db, 95))
+        active = level_db > max(peak_db - 35.0, self.thresholds.silence_db)
+
+        spectrum = np.abs(np.fft.rfft(frames * np.hanning(FRAME_SIZE), axis=1)) ** 2 + 1e-12
+        freqs = np.fft.rfftfreq(FRAME_SIZE, 1 / ANALYSIS_RATE)
+        voice_band = spectrum[:, (freqs >= 80) & (freqs <= 4000)].sum(axis=1) / spectrum.sum(axis=1)
+        flatness = np.exp(np.mean(np.log(spectrum), axis=1)) / np.mean(spectrum, axis=1)
+
+        speech_like = (
+            active & (voice_band >= self.thresholds.min_voice_band) & (flatness <= self.thresholds.max_flatness)
+        )
+
+        envelope = rms - rms.mean()
+        envelope_spectrum = np.abs(np.fft.rfft(envelope)) ** 2
+        envelope_freqs = np.fft.rfftfreq(count, 1 / ENVELOPE_RATE)
+        moving = envelope_spectrum[envelope_freqs >= 0.5].sum()
+        syllabic = envelope_spectrum[(envelope_freqs >= 2) & (envelope_freqs <= 8)].sum()
+
+        return {
+            "peak_db": peak_db,
+            "activity": float(active.mean()),
+            "speech_ratio": float(speech_like.mean()),
+            "modulation": float(syllabic / moving) if moving > 0 else 0.0,
+            "envelope_depth": float(rms.std() / rms.mean()) if rms.mean() > 0 else 0.0,
+            "flatness": float(flatness[active].mean()) if active.any() else 0.0,
+        }
+
+    def classify_audio(self, audio: AudioBuffer, duration: float = None) -> Classification:
+        t = self.thresholds
+        features = self.features(audio)
+        duration = audio.duration if duration is None else duration
+        features["duration"] = round(duration, 3)
+
+        if features["peak_db"] < t.silence_db or features["activity"] < t.min_activity:
+            label = "silence"
+        elif (
+            features["speech_ratio"] >= t.min_speech_ratio
+            and features["modulation"] >= t.min_modulation
+            and features["envelope_depth"] >= t.min_envelope_depth
+        ):
+            label = "voice"
+        elif duration <= t.sfx_max_seconds:
+            label = "sfx"
+        elif features["flatness"] > t.max_flatness:
+            label = "ambiance"
+        else:
+            label = "music"
+
+        return Classification(label, {name: round(value, 4) for name, value in features.items()})
+
+    def _windows(self, audio_path: str) -> Iterator[AudioBuffer]:
+        """
+        Consecutive `max_seconds` windows of a file at the analysis rate. A short remainder is analysed
+        together with the end of the window before it rather than on its own.
+        """
+        limit = max(1, int(self.thresholds.max_seconds * ANALYSIS_RATE))
+        pending, frames = [], 0
+        previous = None
+        source = iter_blocks(audio_path, ANALYSIS_RATE, 1)
+        try:
+            for block in source:
+                pending.append(block[:, 0])
+                frames += block.shape[0]
+                while frames >= limit:
+                    samples = np.concatenate(pending)
+                    previous, rest = samples[:limit], samples[limit:]
+                    pending, frames = [rest], rest.shape[0]
+                    yield AudioBuffer(previous, ANALYSIS_RATE)
+        finally:
+            source.close()
+
+        if frames == 0:
+            if previous is None:
+                yield AudioBuffer(np.zeros(0, dtype=np.float32), ANALYSIS_RATE)
+            return
+        rest = np.concatenate(pending)
+        if previous is not None and frames < limit // 2:
+            rest = np.concatenate([previous, rest])[-limit:]
+        yield AudioBuffer(rest, ANALYSIS_RATE)
+
+    def classify(self, audio_path: str) -> Classification:
+        """
+        Classifies a file. Long files are voice as soon as one `max_seconds` window is; otherwise they get
+        the label of their first window that is not silence. `windows` counts the windows analysed.
+        """
+        duration = audio_duration(audio_path)
+        result = None
+        windows = 0
+        for window in self._windows(audio_path):
+            windows += 1
+            classification = self.classify_audio(window, duration)
+            if classification.is_voice:
+                result = classification
+                break
+            if result is None or (result.label == "silence" and classification.label != "silence"):
+                result = classification
+        result.features["windows"] = windows
+        return result
@@ -0,0 +1,329 @@
+import logging
+from dataclasses import dataclass
+from functools import lru_cache
+from math import gcd
+from typing import Iterable, Iterator, Optional, Tuple, Union
+
+import numpy as np
+import soundfile as sf
+
+logger = logging.getLogger(__name__)
+
+# Frames read per block by the streaming helpers. Peak memory depends on this, not on track length.
+BLOCK_FRAMES = 65536
+
+
+# 5.1 in WAV channel order (FL, FR, C, LFE, SL, SR) folded to stereo as in ITU-R BS.775, LFE dropped
+_SURROUND_TO_STEREO = np.array(
+    [[1.0, 0.0], [0.0, 1.0], [0.7071, 0.7071], [0.0, 0.0], [0.7071, 0.0], [0.0, 0.7071]], dtype=np.float32
+) / np.float32(1.0 + 0.7071 + 0.7071)
+
+
+@lru_cache(maxsize=None)
+def channel_matrix(channels_in: int, channels_out: int) -> np.ndarray:
+    """
+    (channels_in, channels_out) mixing matrix: mono is copied to every channel, 5.1 folds down to stereo,
+    and any other layout is averaged to mono first. Multiply a (frames, channels_in) block by it.
+    """
+    if channels_in == channels_out:
+        matrix = np.eye(channels_in, dtype=np.float32)
+    elif channels_in == 6 and channels_out == 2:
+        matrix = _SURROUND_TO_STEREO
+    else:
+        matrix = np.full((channels_in, channels_out), 1.0 / channels_in, dtype=np.float32)
+    matrix.flags.writeable = False
+    return matrix
+
+
+def match_channels(data: np.ndarray, channels: int) -> np.ndarray:
+    """
+    Levels a (frames, channels) block to `channels` with channel_matrix().
+    """
+    if data.shape[1] == channels:
+        return data
+    if data.shape[1] == 1:
+        # Copying mono needs no arithmetic, just a view
+        return np.broadcast_to(data, (data.shape[0], channels))
+    return data @ channel_matrix(data.shape[1], channels)
+
+
+@lru_cache(maxsize=32)
+def resampler_kernels(sr_in: int, sr_out: int) -> np.ndarray:
+    """
+    Polyphase filter bank for a rate pair, built once per process and shared by every resampler.
+    """
+    divisor = gcd(sr_in, sr_out)
+    kernels = _sinc_kernels(sr_out // divisor, sr_in // divisor)
+    kernels.flags.writeable = False
+    return kernels
+
+
+def _sinc_kernels(up: int, down: int, zero_crossings: int = 16, rolloff: float = 0.945) -> np.ndarray:
+    """
+    Windowed-sinc polyphase filter bank for resampling by up/down.
+    Row p holds the taps for output samples that fall p/up of the way between two input samples.
+    """
+    cutoff = min(1.0, up / down) * rolloff
+    half_width = int(np.ceil(zero_crossings / cutoff))
+    taps = np.arange(-half_width + 1, half_width + 1, dtype=np.float64)
+    phases = np.arange(up, dtype=np.float64)[:, None] / up
+    t = taps[None, :] - phases
+    window = np.where(np.abs(t) < half_width, 0.5 + 0.5 * np.cos(np.pi * t / half_width), 0.0)
+    kernels = cutoff * np.sinc(cutoff * t) * window
+    # Unity gain at DC for every phase
+    kernels /= kernels.sum(axis=1, keepdims=True)
+    return kernels.astype(np.float32)
+
+
+class StreamingResampler:
+    """
+    Resamples audio block by block with a polyphase windowed-sinc filter.
+
+    The tail of each input block is carried over to the next call, so feeding a track in pieces
+    gives the same samples as resampling it in one go while only a block is held in memory.
+    Call flush() after the last block to get the remaining output.
+    """
+
+    def __init__(self, sr_in: int, sr_out: int, channels: int):
+        divisor = gcd(sr_in, sr_out)
+        self.up = sr_out // divisor
+        self.down = sr_in // divisor
+        self.channels = channels
+        self.kernels = resampler_kernels(sr_in, sr_out) if self.up != self.down else None
+        self.half_width = self.kernels.shape[1] // 2 if self.kernels is not None else 0
+        # Input samples still needed, starting at absolute input index `_buffer_start`.
+        # The zeros stand in for the signal before the first sample.
+        self._buffer = np.zeros((self.half_width, channels), dtype=np.float32)
+        self._buffer_start = -self.half_width
+        self._frames_in = 0
+        self._frames_out = 0
+
+    def _emit(self, end: int) -> np.ndarray:
+        """
+        Produces output samples up to (excluding) index `end` from the buffered input.
+        """
+        if end <= self._frames_out:
+            return np.zeros((0, self.channels), dtype=np.float32)
+
+        n = np.arange(self._frames_out, end, dtype=np.int64)
+        base = n * self.down // self.up
+        phase = n * self.down % self.up
+        taps = np.arange(-self.half_width + 1, self.half_width + 1, dtype=np.int64)
+        index = base[:, None] + taps[None, :] - self._buffer_start
+        output = np.einsum("ntc,nt->nc", self._buffer[index], self.kernels[phase])
+
+        self._frames_out = end
+        # Drop input that no later output sample reaches
+        keep_from = (end * self.down // self.up) - self.half_width + 1 - self._buffer_start
+        if keep_from > 0:
+            self._buffer = self._buffer[keep_from:]
+            self._buffer_start += keep_from
+        return output
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        """
+        Feeds a (frames, channels) float32 block and returns the output samples that are now complete.
+        """
+        if self.kernels is None:
+            return block
+        self._buffer = np.concatenate([self._buffer, block.astype(np.float32, copy=False)])
+        self._frames_in += block.shape[0]
+        # Output n is complete once the input reaches floor(n * down / up) + half_width
+        ready = self._frames_in - self.half_width
+        end = -(-ready * self.up // self.down) if ready > 0 else 0
+        return self._emit(end)
+
+    def flush(self) -> np.ndarray:
+        """
+        Returns the last output samples, treating the signal after the final block as silence.
+        """
+        if self.kernels is None:
+            return np.zeros((0, self.channels), dtype=np.float32)
+        padding = np.zeros((self.half_width, self.channels), dtype=np.float32)
+        self._buffer = np.concatenate([self._buffer, padding])
+        return self._emit(-(-self._frames_in * self.up // self.down))
+
+
+@dataclass
+class AudioBuffer:
+    """
+    Decoded audio held in memory, so stages can hand it to each other without a WAV round-trip.
+    Samples are float32 shaped (frames, channels); 1-D input is taken as mono.
+    """
+
+    samples: np.ndarray
+    sample_rate: int
+
+    def __post_init__(self):
+        samples = np.asarray(self.samples, dtype=np.float32)
+        self.samples = samples[:, None] if samples.ndim == 1 else samples
+
+    @classmethod
+    def read(
+        cls,
+        path: str,
+        sample_rate: Optional[int] = None,
+        channels: Optional[int] = None,
+        max_seconds: Optional[float] = None,
+    ) -> "AudioBuffer":
+        """
+        Decodes a file straight to float32, optionally converting it to `sample_rate` and `channels`
+        on the way and stopping after the first `max_seconds`.
+        """
+        if sample_rate is None and channels is None and max_seconds is None:
+            samples, file_rate = sf.read(path, dtype="float32", always_2d=True)
+            return cls(samples, file_rate)
+
+        file_rate, file_channels = audio_format(path)
+        rate = sample_rate or file_rate
+        limit = int(max_seconds * rate) if max_seconds is not None else None
+        blocks, frames = [], 0
+        source = iter_blocks(path, sample_rate, channels)
+        try:
+            for block in source:
+                blocks.append(block)
+                frames += block.shape[0]
+                if limit is not None and frames >= limit:
+                    break
+        finally:
+            source.close()
+        if not blocks:
+            return cls(np.zeros((0, channels or file_channels), dtype=np.float32), rate)
+        return cls(np.concatenate(blocks)[:limit], rate)
+
+    @property
+    def frames(self) -> int:
+        return self.samples.shape[0]
+
+    @property
+    def channels(self) -> int:
+        return self.samples.shape[1]
+
+    @property
+    def duration(self) -> float:
+        return self.frames / self.sample_rate
+
+    def to_mono(self) -> "AudioBuffer":
+        return self.with_channels(1)
+
+    def with_channels(self, channels: int) -> "AudioBuffer":
+        if channels == self.channels:
+            return self
+        return AudioBuffer(np.ascontiguousarray(match_channels(self.samples, channels)), self.sample_rate)
+
+    def resample(self, sample_rate: int) -> "AudioBuffer":
+        if sample_rate == self.sample_rate:
+            return self
+        resampler = StreamingResampler(self.sample_rate, sample_rate, self.channels)
+        return AudioBuffer(np.concatenate([resampler.process(self.samples), resampler.flush()]), sample_rate)
+
+    def write(self, path: str):
+        sf.write(path, self.samples, self.sample_rate)
+
+
+def audio_duration(source: Union[str, AudioBuffer]) -> float:
+    """
+    Length in seconds of a file or buffer, without decoding a file.
+    """
+    if isinstance(source, AudioBuffer):
+        return source.duration
+    return sf.info(source).duration
+
+
+def audio_format(source: Union[str, AudioBuffer]) -> Tuple[int, int]:
+    """
+    Sample rate and channel count of a file or buffer, without decoding a file.
+    """
+    if isinstance(source, AudioBuffer):
+        return source.sample_rate, source.channels
+    info = sf.info(source)
+    return info.samplerate, info.channels
+
+
+def frame_levels_db(samples: np.ndarray, frame_size: int) -> np.ndarray:
+    """
+    RMS level in dBFS of consecutive `frame_size` frames of a 1-D signal; a trailing partial frame is dropped.
+    """
+    count = samples.shape[0] // frame_size
+    frames = samples[: count * frame_size].reshape(count, frame_size)
+    return 20 * np.log10(np.sqrt(np.mean(frames**2, axis=1)) + 1e-10)
+
+
+def _convert_blocks(
+    blocks: Iterable[np.ndarray],
+    source_rate: int,
+    source_channels: int,
+    sample_rate: Optional[int],
+    channels: Optional[int],
+) -> Iterator[np.ndarray]:
+    resampler = None
+    if sample_rate and sample_rate != source_rate:
+        resampler = StreamingResampler(source_rate, sample_rate, source_channels)
+    for block in blocks:
+        if resampler:
+            block = resampler.process(block)
+        if block.shape[0]:
+            yield match_channels(block, channels) if channels else block
+    if resampler:
+        tail = resampler.flush()
+        if tail.shape[0]:
+            yield match_channels(tail, channels) if channels else tail
+
+
+def iter_blocks(
+    source: Union[str, AudioBuffer],
+    sample_rate: Optional[int] = None,
+    channels: Optional[int] = None,
+    block_frames: Optional[int] = None,
+) -> Iterator[np.ndarray]:
+    """
+    Yields float32 (frames, channels) blocks of a file or buffer, optionally resampled and channel-levelled.
+    """
+    block_frames = block_frames or BLOCK_FRAMES
+    if isinstance(source, AudioBuffer):
+        blocks = (source.samples[i : i + block_frames] for i in range(0, source.frames, block_frames))
+        yield from _convert_blocks(blocks, source.sample_rate, source.channels, sample_rate, channels)
+        return
+
+    with sf.SoundFile(source) as f:
+        blocks = f.blocks(blocksize=block_frames, dtype="float32", always_2d=True)
+        yield from _convert_blocks(blocks, f.samplerate, f.channels, sample_rate, channels)
+
+
+def write_blocks(path: str, blocks: Iterable[np.ndarray], sample_rate: int, channels: int):
+    """
+    Writes (frames, channels) blocks to an audio file as they arrive.
+    """
+    with sf.SoundFile(path, "w", samplerate=sample_rate, channels=channels) as f:
+        for block in blocks:
+            f.write(block)
+
+
+class BlockReader:
+    """
+    Hands out exactly the number of frames asked for from a block iterator of any block size.
+    """
+
+    def __init__(self, blocks: Iterator[np.ndarray]):
+        self._blocks = blocks
+        self._pending = []
+        self._pending_frames = 0
+
+    def read(self, frames: int) -> np.ndarray:
+        """
+        Returns up to `frames` frames; fewer only at the end of the stream.
+        """
+        while self._pending_frames < frames:
+            block = next(self._blocks, None)
+            if block is None:
+                break
+            self._pending.append(block)
+            self._pending_frames += block.shape[0]
+        if not self._pending:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        data = np.concatenate(self._pending) if len(self._pending) > 1 else self._pending[0]
+        result, rest = data[:frames], data[frames:]
+        self._pending = [rest] if rest.shape[0] else []
+        self._pending_frames = rest.shape[0]
+        return result
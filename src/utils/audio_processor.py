@@ -1,16 +1,15 @@
 import logging
 import os
-import subprocess
-from typing import Optional
+from typing import Optional, Union
 
-import soundfile as sf
+import numpy as np
 
-try:
-    import torch
-    import torchaudio
-except ImportError:
-    torch = None
-    torchaudio = None
+from src.utils.audio_io import AudioBuffer, BlockReader, audio_format, frame_levels_db, iter_blocks, write_blocks
+from src.utils.lazy_import import optional_import
+from src.utils.worker_process import PersistentWorker, WorkerError, WorkerStartupError
+
+# Separation and denoising run in worker processes; torch is only bound here to report the device
+torch = None
 
 logger = logging.getLogger(__name__)
 
@@ -20,8 +19,76 @@ class AudioProcessor:
     Handles audio manipulation, separation, and denoising.
     """
 
+    SEPARATION_MODEL = "htdemucs"
+    DENOISE_MODEL = "DeepFilterNet3"
+    # Clips whose quietest frames sit this far below their speech are treated as dry voice-over
+    DRY_VO_THRESHOLD_DB = -40.0
+    # Frames below this are digital silence (padding), not a recording's noise floor
+    DIGITAL_SILENCE_DB = -90.0
+
     def __init__(self):
-        self.device = "cuda" if torch and torch.cuda.is_available() else "cpu"
+        self._demucs_worker: Optional[PersistentWorker] = None
+        self._denoise_worker: Optional[PersistentWorker] = None
+        self._denoise_unavailable = False
+
+    @property
+    def device(self) -> str:
+        """
+        Device torch would run the models on in this process. Imports torch on first use.
+        """
+        global torch
+        torch = torch or optional_import("torch")
+        return "cuda" if torch and torch.cuda.is_available() else "cpu"
+
+    @property
+    def demucs_worker(self) -> PersistentWorker:
+        """
+        Lazily creates the long-lived Demucs worker.
+        It runs demucs_wrapper.py in its own process so the torchaudio.save patch stays isolated,
+        and it keeps the htdemucs weights loaded between files.
+        """
+        if self._demucs_worker is None:
+            cmd = ["uv", "run", "python", os.path.join(os.path.dirname(__file__), "demucs_wrapper.py"), "--serve"]
+            self._demucs_worker = PersistentWorker(cmd, name="Demucs")
+        return self._demucs_worker
+
+    @property
+    def denoise_worker(self) -> PersistentWorker:
+        """
+        Lazily creates the long-lived DeepFilterNet worker.
+        It runs in an isolated uv environment with torch 2.5.1, which bypasses the conflict between
+        DeepFilterNet and torchaudio 2.8+ in the main project, and keeps DeepFilterNet3 loaded between files.
+        """
+        if self._denoise_worker is None:
+            cmd = [
+                "uv",
+                "run",
+                "--no-project",
+                "--python",
+                "3.12",
+                "--with",
+                "deepfilternet",
+                "--with",
+                "torch==2.5.1",
+                "--with",
+                "torchaudio==2.5.1",
+                "--with",
+                "soundfile",
+                "python",
+                os.path.join(os.path.dirname(__file__), "deepfilter_wrapper.py"),
+                "--model",
+                self.DENOISE_MODEL,
+            ]
+            self._denoise_worker = PersistentWorker(cmd, name="DeepFilterNet", max_retries=2)
+        return self._denoise_worker
+
+    def close(self):
+        """
+        Stops any background workers started by this processor.
+        """
+        for worker in (self._demucs_worker, self._denoise_worker):
+            if worker is not None:
+                worker.close()
 
     def _resolve_demucs_paths(self, output_dir: str, audio_path: str) -> Optional[dict[str, str]]:
         """Resolves the output paths for Demucs separation."""
@@ -39,8 +106,8 @@ class AudioProcessor:
     def separate_vocals(self, audio_path: str, output_dir: str) -> Optional[dict[str, str]]:
         """
         Uses Demucs to separate vocals from background music/sfx.
-        Returns a dictionary with 'vocals' and 'background' paths.
-        Now runs in a separate process to avoid monkey-patching torchaudio.
+        Stems are written to output_dir/htdemucs/<clip name>/.
+        Returns a dictionary with 'vocals' and 'background' paths, or None if separation failed.
         """
         if not os.path.exists(audio_path):
             logger.error(f"Audio file not found: {audio_path}")
@@ -48,138 +115,92 @@ class AudioProcessor:
 
         logger.info(f"Separating vocals for: {audio_path}")
         try:
-            # We use subprocess instead of in-process call to avoid global monkey-patching
-            # and to isolate dependency issues (like the backend problems on Windows).
-            # The demucs CLI is expected to be in the environment.
-            cmd = [
-                "uv",
-                "run",
-                "python",
-                os.path.join(os.path.dirname(__file__), "demucs_wrapper.py"),
-                "--two-stems",
-                "vocals",
-                "-o",
-                output_dir,
-                audio_path,
-            ]
-
-            logger.info(f"Running Demucs via subprocess: {' '.join(cmd)}")
-            result = subprocess.run(cmd, capture_output=True, text=True)
-
-            if result.returncode != 0:
-                logger.error(f"Demucs separation failed with exit code {result.returncode}")
-                logger.error(f"STDERR: {result.stderr}")
-                return None
+            response = self.demucs_worker.request({"audio_path": audio_path, "output_dir": output_dir})
+        except WorkerError as e:
+            logger.error(f"Demucs separation failed: {e}")
+            return None
 
-            return self._resolve_demucs_paths(output_dir, audio_path)
-        except Exception as e:
-            logger.error(f"Demucs separation failed: {e}", exc_info=True)
+        if not response.get("ok"):
+            logger.error(f"Demucs separation failed for {audio_path}: {response.get('error')}")
             return None
+        return self._resolve_demucs_paths(output_dir, audio_path)
 
     def denoise_vocals(self, vocal_path: str, output_path: str) -> Optional[str]:
         """
         Uses DeepFilterNet to clean vocal audio.
+        Returns the output path, or None where denoising failed or is unavailable.
         """
-        if not os.path.exists(vocal_path):
+        if self._denoise_unavailable or not os.path.exists(vocal_path):
             return None
 
         logger.info(f"Denoising vocals: {vocal_path}")
         try:
-            # DeepFilterNet typically provides a CLI
-            # We use 'uvx' (tool run) to run DeepFilterNet in an isolated environment with compatible torch versions
-            # This bypasses the conflict between DeepFilterNet and torchaudio 2.8+ in the main project
-            cmd = [
-                "uvx",
-                "--python",
-                "3.12",
-                "--from",
-                "deepfilternet",
-                "--with",
-                "torch==2.5.1",
-                "--with",
-                "torchaudio==2.5.1",
-                "--with",
-                "soundfile",
-                "deepFilter",
-                "-m",
-                "DeepFilterNet3",
-                vocal_path,
-                "-o",
-                os.path.dirname(output_path),
-            ]
-            logger.info(f"Running DeepFilterNet via uvx: {' '.join(cmd)}")
-            result = subprocess.run(
-                cmd,
-                check=True,
-                capture_output=True,
-                text=True,
-            )
-            logger.info(f"DeepFilterNet output: {result.stdout}")
-
-            base_name = os.path.splitext(os.path.basename(vocal_path))[0]
-            out_dir = os.path.dirname(output_path)
-
-            # DeepFilterNet usually appends _DeepFilterNet3 to the filename or similar
-            expected_suffix = "_DeepFilterNet3.wav"
-            potential_path = os.path.join(out_dir, base_name + expected_suffix)
-
-            if os.path.exists(output_path):
-                return output_path
-            elif os.path.exists(potential_path):
-                os.replace(potential_path, output_path)
-                return output_path
-
-            return output_path if os.path.exists(output_path) else None
-        except subprocess.CalledProcessError as e:
-            if "ModuleNotFoundError" in e.stderr:
-                logger.warning(f"DeepFilterNet unavailable (dependency issue): {e.stderr.strip().splitlines()[-1]}")
-                logger.warning("Continuing with original vocals (no denoising).")
-            else:
-                logger.error(f"DeepFilterNet denoising failed with exit code {e.returncode}")
-                logger.error(f"STDOUT: {e.stdout}")
-                logger.error(f"STDERR: {e.stderr}")
+            response = self.denoise_worker.request({"input_path": vocal_path, "output_path": output_path})
+        except WorkerStartupError as e:
+            # Usually a dependency issue in the isolated environment; it will not fix itself mid-batch
+            logger.warning(f"DeepFilterNet unavailable: {e}")
+            logger.warning("Continuing with original vocals (no denoising).")
+            self._denoise_unavailable = True
             return None
-        except Exception as e:
+        except WorkerError as e:
             logger.error(f"DeepFilterNet denoising failed: {e}")
             return None
 
-    def mix_audio(self, vocal_path: str, background_path: str, output_path: str):
-        """
-        Combines vocals and background tracks using torchaudio.
+        if not response.get("ok"):
+            logger.error(f"DeepFilterNet denoising failed for {vocal_path}: {response.get('error')}")
+            return None
+        return output_path if os.path.exists(output_path) else None
+
+    def background_level(self, audio_path: str, max_seconds: Optional[float] = 60.0) -> float:
         """
-        if not torch or not torchaudio:
-            logger.error("torch/torchaudio not found. Mixing is not possible without these dependencies.")
-            return
+        Estimates how much non-vocal sound a clip carries: the level of its quietest 20 ms frames
+        (10th percentile) relative to its loudest (95th percentile), in dB, over the first `max_seconds`.
+        Leading and trailing digital silence is left out, so padding does not pass for a quiet floor.
 
+        Dry voice-over falls close to silence between words and lands far below 0; a music or
+        ambiance bed keeps those gaps filled and brings it towards 0. Silent clips give 0.
+        """
+        audio = AudioBuffer.read(audio_path, 16000, 1, max_seconds=max_seconds)
+        levels = frame_levels_db(audio.samples[:, 0], 320)
+        (audible,) = np.nonzero(levels > self.DIGITAL_SILENCE_DB)
+        if audible.size == 0:
+            return 0.0
+        floor, peak = np.percentile(levels[audible[0] : audible[-1] + 1], [10, 95])
+        return float(floor - peak)
+
+    def mix_audio(self, vocals: Union[str, AudioBuffer], background: Union[str, AudioBuffer], output_path: str):
+        """
+        Combines vocals and background tracks block by block, so memory stays flat however long the tracks are.
+        Either track may be a file or an in-memory buffer. The background is resampled to the vocals' rate
+        on the fly, mono is spread over the other track's channels, and the result is trimmed to the shorter track.
+        """
         logger.info(f"Mixing audio to: {output_path}")
-        vocal_data, sr_v = sf.read(vocal_path, always_2d=True)
-        # sf reads as (frames, channels), torchaudio expects (channels, frames)
-        vocal = torch.from_numpy(vocal_data.T).float()
-
-        bg_data, sr_b = sf.read(background_path, always_2d=True)
-        bg = torch.from_numpy(bg_data.T).float()
-
-        # Ensure same sample rate and length (trim/pad if necessary)
-        if sr_v != sr_b:
-            bg = torchaudio.transforms.Resample(sr_b, sr_v)(bg)
-
-        # Handle channel mismatch (e.g., mono vocals + stereo background)
-        if vocal.shape[0] != bg.shape[0]:
-            logger.info(f"Channel mismatch: vocals={vocal.shape[0]}, bg={bg.shape[0]}. Leveling...")
-            if vocal.shape[0] == 1 and bg.shape[0] == 2:
-                vocal = vocal.expand(2, -1)
-            elif vocal.shape[0] == 2 and bg.shape[0] == 1:
-                bg = bg.expand(2, -1)
-            else:
-                logger.warning("Unusual channel counts, simple expansion might not work perfectly.")
-
-        min_len = min(vocal.shape[1], bg.shape[1])
-        # Prevent digital clipping by reducing gain (simple additive mix can exceed 1.0)
-        mixed = (vocal[:, :min_len] + bg[:, :min_len]) * 0.5
-
-        # Use soundfile for saving to avoid torchaudio/torchcodec issues on Windows
-        data = mixed.cpu().detach().numpy().T
-        sf.write(output_path, data, sr_v)
+        sample_rate, vocal_channels = audio_format(vocals)
+        _, bg_channels = audio_format(background)
+        channels = max(vocal_channels, bg_channels)
+        if vocal_channels != bg_channels:
+            logger.info(f"Channel mismatch: vocals={vocal_channels}, bg={bg_channels}. Leveling...")
+            if 1 not in (vocal_channels, bg_channels):
+                logger.warning("Unusual channel counts; the track with fewer channels is down-mixed to mono first.")
+
+        bg_blocks = iter_blocks(background, sample_rate, channels)
+        bg_reader = BlockReader(bg_blocks)
+
+        def mixed_blocks():
+            for vocal in iter_blocks(vocals, channels=channels):
+                bg = bg_reader.read(vocal.shape[0])
+                frames = bg.shape[0]
+                if frames == 0:
+                    return
+                # Prevent digital clipping by reducing gain (simple additive mix can exceed 1.0)
+                yield (vocal[:frames] + bg) * 0.5
+                if frames < vocal.shape[0]:
+                    return
+
+        try:
+            write_blocks(output_path, mixed_blocks(), sample_rate, channels)
+        finally:
+            bg_blocks.close()
 
 
 if __name__ == "__main__":
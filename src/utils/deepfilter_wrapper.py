@@ -0,0 +1,51 @@
+import argparse
+import json
+import os
+import sys
+
+# This script runs inside an isolated environment (DeepFilterNet needs torch 2.5.x, which conflicts
+# with the torchaudio 2.8+ used by the main project), so it must not import anything from `src`.
+
+
+def serve(model_name: str):
+    """
+    Loads DeepFilterNet once and denoises every file requested on stdin.
+    Each request is a JSON line {"input_path": ..., "output_path": ...}; each answer is one JSON line.
+    """
+    protocol = sys.stdout
+    # Keep library prints away from the protocol channel
+    sys.stdout = sys.stderr
+
+    def reply(message: dict):
+        protocol.write(json.dumps(message) + "\n")
+        protocol.flush()
+
+    try:
+        from df.enhance import enhance, init_df, load_audio, save_audio
+
+        model, df_state, _ = init_df(default_model=model_name, log_file=None)
+    except Exception as e:
+        reply({"ready": False, "error": f"{type(e).__name__}: {e}"})
+        return 1
+    reply({"ready": True})
+
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+            audio, _ = load_audio(request["input_path"], sr=df_state.sr())
+            enhanced = enhance(model, df_state, audio)
+            os.makedirs(os.path.dirname(os.path.abspath(request["output_path"])), exist_ok=True)
+            save_audio(request["output_path"], enhanced, df_state.sr())
+            reply({"ok": True, "output_path": request["output_path"]})
+        except Exception as e:
+            reply({"ok": False, "error": f"{type(e).__name__}: {e}"})
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Persistent DeepFilterNet denoise worker")
+    parser.add_argument("--model", default="DeepFilterNet3")
+    args = parser.parse_args()
+    sys.exit(serve(args.model))
@@ -1,9 +1,13 @@
+import json
+import os
 import sys
 
 import soundfile as sf
 import torch
 import torchaudio
 
+MODEL_NAME = "htdemucs"
+
 
 # Monkey-patch torchaudio.save to use soundfile
 # This bypasses the TorchCodec requirement on Windows which often fails to load DLLs
@@ -26,11 +30,84 @@ def patched_save(filepath, src, sample_rate, channels_first=True, **kwargs):
 # Apply the patch
 torchaudio.save = patched_save
 
+
+def separate_track(model, audio_path: str, output_dir: str, device: str) -> dict:
+    """
+    Splits one track into vocals and no_vocals using an already loaded model.
+    Mirrors `demucs --two-stems vocals` so the output layout is the same as the CLI's.
+    """
+    from demucs.apply import apply_model
+    from demucs.audio import save_audio
+    from demucs.separate import load_track
+
+    wav = load_track(audio_path, model.audio_channels, model.samplerate)
+    ref = wav.mean(0)
+    wav = (wav - ref.mean()) / ref.std()
+
+    with torch.no_grad():
+        sources = apply_model(model, wav[None], device=device, shifts=1, split=True, overlap=0.25, progress=False)[0]
+    sources = sources * ref.std() + ref.mean()
+
+    sources = list(sources)
+    vocals = sources.pop(model.sources.index("vocals"))
+    background = torch.zeros_like(sources[0])
+    for source in sources:
+        background += source
+
+    track_dir = os.path.join(output_dir, MODEL_NAME, os.path.splitext(os.path.basename(audio_path))[0])
+    os.makedirs(track_dir, exist_ok=True)
+    paths = {"vocals": os.path.join(track_dir, "vocals.wav"), "background": os.path.join(track_dir, "no_vocals.wav")}
+
+    save_kwargs = {"samplerate": model.samplerate, "clip": "rescale", "as_float": False, "bits_per_sample": 16}
+    save_audio(vocals, paths["vocals"], **save_kwargs)
+    save_audio(background, paths["background"], **save_kwargs)
+    return paths
+
+
+def serve():
+    """
+    Loads the model once and separates every track requested on stdin.
+    Each request is a JSON line {"audio_path": ..., "output_dir": ...}; each answer is one JSON line.
+    """
+    from demucs.pretrained import get_model
+
+    protocol = sys.stdout
+    # Keep library prints away from the protocol channel
+    sys.stdout = sys.stderr
+
+    def reply(message: dict):
+        protocol.write(json.dumps(message) + "\n")
+        protocol.flush()
+
+    try:
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        model = get_model(MODEL_NAME)
+        model.to(device)
+        model.eval()
+    except Exception as e:
+        reply({"ready": False, "error": str(e)})
+        return 1
+    reply({"ready": True})
+
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+            paths = separate_track(model, request["audio_path"], request["output_dir"], device)
+            reply({"ok": True, **paths})
+        except Exception as e:
+            reply({"ok": False, "error": f"{type(e).__name__}: {e}"})
+    return 0
+
+
 # Import and run demucs
 try:
     from demucs.separate import main
 
     if __name__ == "__main__":
+        if "--serve" in sys.argv[1:]:
+            sys.exit(serve())
         main()
 except ImportError:
     print("Error: Demucs not found in the current environment.")
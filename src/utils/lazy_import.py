@@ -0,0 +1,25 @@
+import importlib
+from types import ModuleType
+from typing import Optional
+
+
+def optional_import(name: str) -> Optional[ModuleType]:
+    """
+    Imports a module, or returns None if it (or one of its dependencies) is not installed.
+
+    torch, torchaudio, faster-whisper, qwen-tts and demucs take seconds to import, so modules bind them
+    through this when a model is first used rather than at import time. That keeps `dub --help`, the
+    job server's startup and worker spawns from paying for libraries they may never touch.
+    """
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
+def cuda_available() -> bool:
+    """
+    Whether torch is installed and sees a CUDA device. Imports torch.
+    """
+    torch = optional_import("torch")
+    return bool(torch is not None and torch.cuda.is_available())
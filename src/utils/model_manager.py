@@ -2,31 +2,31 @@ import logging
 import os
 import subprocess
 
-# Try imports, handle gracefully if not installed
-try:
-    from faster_whisper import download_model as download_whisper
-except ImportError:
-    download_whisper = None
+from src.utils.lazy_import import optional_import
 
-try:
-    from demucs.pretrained import get_model as get_demucs_model
-except ImportError:
-    get_demucs_model = None
+# Bound by _import_downloaders() when a download starts; both libraries are slow to import
+download_whisper = None
+get_demucs_model = None
 
 try:
     from src.models.translator import OllamaTranslator
 except ImportError:
     OllamaTranslator = None
 
-try:
-    # DeepFilterNet handles downloads internally usually
-    import deepfilternet  # noqa: F401
-except ImportError:
-    deepfilternet = None
-
 logger = logging.getLogger(__name__)
 
 
+def _import_downloaders():
+    """
+    Binds the download functions still unset (None if their library is not installed).
+    """
+    global download_whisper, get_demucs_model
+    faster_whisper = optional_import("faster_whisper")
+    download_whisper = download_whisper or getattr(faster_whisper, "download_model", None)
+    demucs_pretrained = optional_import("demucs.pretrained")
+    get_demucs_model = get_demucs_model or getattr(demucs_pretrained, "get_model", None)
+
+
 def download_all_models(output_dir: str = "models", model_size: str = "large-v3-turbo"):
     """
     Downloads all necessary models for the pipeline.
@@ -36,6 +36,7 @@ def download_all_models(output_dir: str = "models", model_size: str = "large-v3-
         model_size (str): Whisper model size to download.
     """
     os.makedirs(output_dir, exist_ok=True)
+    _import_downloaders()
 
     logger.info("Starting model downloads...")
 
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """
+    Canonical form of a source line for cache lookups: trimmed, with runs of whitespace collapsed.
+    Case and punctuation are kept because they change the translation.
+    """
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class TranslationCache:
+    """
+    Persistent SQLite cache of translation results.
+
+    Entries are keyed by the normalized source text, target language, model name and a hash of the
+    prompt template, so changing any of them naturally misses. The least recently used entries are
+    evicted once the cache holds more than `max_entries` results. The database is opened in WAL mode
+    so several worker processes can share one file.
+
+    Hits do not write on their own: last-used times are saved once `touch_batch` entries were hit, and
+    before any eviction. The entry count is counted once at open and kept up to date by this
+    instance's inserts, so entries added by other processes only count from their next open.
+    """
+
+    def __init__(self, path: str, max_entries: int = 200_000, touch_batch: int = 100):
+        self.path = path
+        self.max_entries = max_entries
+        self.touch_batch = max(1, touch_batch)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Key -> last-used time of hits not written yet
+        self._touched: Dict[str, float] = {}
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS translations ("
+            " key TEXT PRIMARY KEY, result TEXT NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS translations_last_used ON translations (last_used)")
+        self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+
+    @staticmethod
+    def make_key(text: str, target_lang: str, model: str, prompt_version: str, context: Optional[str] = None) -> str:
+        parts = [normalize_text(text), target_lang.strip().lower(), model, prompt_version, context or ""]
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            try:
+                row = self._conn.execute("SELECT result FROM translations WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return None
+                self._touched[key] = time.time()
+                if len(self._touched) >= self.touch_batch:
+                    self._flush_touches()
+                    self._conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Translation cache lookup failed: {e}")
+                self.misses += 1
+                return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, result: dict):
+        now = time.time()
+        with self._lock:
+            try:
+                exists = self._conn.execute("SELECT 1 FROM translations WHERE key = ?", (key,)).fetchone()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO translations (key, result, created, last_used) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(result, ensure_ascii=False), now, now),
+                )
+                self._touched.pop(key, None)
+                if not exists:
+                    self._count += 1
+                if self._count > self.max_entries:
+                    self._evict()
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Translation cache write failed: {e}")
+
+    def _flush_touches(self):
+        """
+        Writes the last-used times of pending hits. Caller holds the lock and commits.
+        """
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE translations SET last_used = ? WHERE key = ?",
+                [(used, key) for key, used in self._touched.items()],
+            )
+            self._touched.clear()
+
+    def _evict(self):
+        """
+        Deletes the least recently used entries beyond max_entries. Caller holds the lock and commits.
+        """
+        self._flush_touches()
+        (self._count,) = self._conn.execute("SELECT COUNT(*) FROM translations").fetchone()
+        excess = self._count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM translations WHERE key IN (SELECT key FROM translations ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+            self._count = self.max_entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self)}
+
+    def close(self):
+        with self._lock:
+            try:
+                self._flush_touches()
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Translation cache write failed: {e}")
+            self._conn.close()
@@ -0,0 +1,210 @@
+import json
+import logging
+import os
+import queue
+import signal
+import subprocess
+import threading
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerError(RuntimeError):
+    """
+    Raised when a persistent worker cannot be started or stops answering.
+    """
+
+
+class WorkerStartupError(WorkerError):
+    """
+    Raised when the worker cannot be launched or fails to load its model.
+    Retrying is pointless, so callers usually disable the feature for the rest of the run.
+    """
+
+
+class WorkerTimeoutError(WorkerError):
+    """
+    Raised when the worker does not answer a request in time. The same input would most likely
+    take as long again, so the request is not retried; the worker restarts on the next request.
+    """
+
+
+class PersistentWorker:
+    """
+    Keeps a helper script alive in its own process and exchanges JSON lines with it.
+
+    The helper must print a `{"ready": true}` line once its model is loaded and then answer
+    every request line on stdin with exactly one JSON line on stdout. Any other stdout output
+    is ignored, and stderr is inherited so the helper's logs end up in our console.
+    If the process dies mid-request it is restarted and the request is retried up to `max_retries` times.
+    A request that times out is not retried.
+
+    The helper runs in its own session, so killing it also kills the processes it started, e.g. the
+    Python interpreter behind a `uv run` launcher that holds the model and its GPU memory.
+    """
+
+    def __init__(
+        self,
+        cmd: List[str],
+        name: str,
+        startup_timeout: float = 900.0,
+        request_timeout: float = 900.0,
+        max_retries: int = 1,
+    ):
+        self.cmd = cmd
+        self.name = name
+        self.startup_timeout = startup_timeout
+        self.request_timeout = request_timeout
+        self.max_retries = max_retries
+        self.restarts = 0
+        self._process: Optional[subprocess.Popen] = None
+        self._responses: Optional[queue.Queue] = None
+        self._reader: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def is_alive(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def _start(self):
+        logger.info(f"Starting {self.name} worker: {' '.join(self.cmd)}")
+        try:
+            self._process = subprocess.Popen(
+                self.cmd,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                text=True,
+                encoding="utf-8",
+                bufsize=1,
+                start_new_session=True,
+            )
+        except OSError as e:
+            self._process = None
+            raise WorkerStartupError(f"Could not start {self.name} worker: {e}") from e
+
+        self._responses = queue.Queue()
+        self._reader = threading.Thread(
+            target=self._read_stdout,
+            args=(self._process, self._responses),
+            name=f"{self.name}-reader",
+            daemon=True,
+        )
+        self._reader.start()
+
+        try:
+            ready = self._await_response(self.startup_timeout)
+        except WorkerError as e:
+            raise WorkerStartupError(str(e)) from e
+        if not ready.get("ready"):
+            self.close()
+            raise WorkerStartupError(f"{self.name} worker failed to start: {ready.get('error', ready)}")
+        logger.info(f"{self.name} worker ready (pid {self._process.pid})")
+
+    @staticmethod
+    def _read_stdout(process: subprocess.Popen, responses: queue.Queue):
+        """Forwards protocol lines from the worker to the response queue until EOF."""
+        for line in process.stdout:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                responses.put(json.loads(line))
+            except json.JSONDecodeError:
+                logger.debug(f"Ignoring non-protocol worker output: {line}")
+        # EOF: the worker exited or closed its stdout
+        responses.put(None)
+
+    def _await_response(self, timeout: float) -> Dict[str, Any]:
+        try:
+            response = self._responses.get(timeout=timeout)
+        except queue.Empty:
+            # Still busy with the request, so it would not notice stdin closing
+            self._kill()
+            raise WorkerTimeoutError(f"{self.name} worker did not answer within {timeout:.0f}s")
+
+        if response is None:
+            returncode = self._process.wait() if self._process else None
+            self.close()
+            raise WorkerError(f"{self.name} worker exited unexpectedly (exit code {returncode})")
+        return response
+
+    def request(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Sends one request and waits for its answer, starting the worker if it is not running.
+        A worker that crashes while handling the request is restarted and the request retried;
+        one that times out is stopped and the error raised.
+        """
+        with self._lock:
+            attempt = 0
+            while True:
+                try:
+                    return self._request_once(payload)
+                except (WorkerStartupError, WorkerTimeoutError):
+                    raise
+                except WorkerError as e:
+                    if attempt >= self.max_retries:
+                        raise
+                    attempt += 1
+                    self.restarts += 1
+                    logger.warning(f"{e}. Restarting and retrying ({attempt}/{self.max_retries})...")
+
+    def _request_once(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if not self.is_alive():
+            self._start()
+        try:
+            self._process.stdin.write(json.dumps(payload) + "\n")
+            self._process.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            self.close()
+            raise WorkerError(f"Lost connection to {self.name} worker: {e}") from e
+        return self._await_response(self.request_timeout)
+
+    def _kill(self):
+        process, self._process = self._process, None
+        if process is not None:
+            self._kill_group(process)
+            self._release(process)
+
+    @staticmethod
+    def _kill_group(process: subprocess.Popen):
+        """
+        Kills the worker and everything it started, then reaps it.
+        """
+        try:
+            if hasattr(os, "killpg"):
+                os.killpg(process.pid, signal.SIGKILL)
+            else:
+                process.kill()
+        except (ProcessLookupError, PermissionError):
+            # Already gone
+            pass
+        process.wait()
+
+    def _release(self, process: subprocess.Popen):
+        """
+        Closes the pipes of an exited worker once its reader thread has seen the end of stdout.
+        """
+        if self._reader is not None:
+            self._reader.join(timeout=5)
+            self._reader = None
+        for pipe in (process.stdin, process.stdout):
+            try:
+                if pipe:
+                    pipe.close()
+            except OSError:
+                pass
+
+    def close(self):
+        """
+        Stops the worker. Closing stdin lets it finish its loop; it is killed if it does not.
+        """
+        process, self._process = self._process, None
+        if process is None:
+            return
+        try:
+            if process.stdin:
+                process.stdin.close()
+            process.wait(timeout=10)
+        except (OSError, subprocess.TimeoutExpired):
+            self._kill_group(process)
+        self._release(process)
@@ -0,0 +1,93 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import soundfile as sf
+
+from src.utils.audio_classifier import AudioClassifier, ClassifierThresholds
+from src.utils.audio_io import AudioBuffer
+
+RATE = 16000
+
+
+def _speech(seconds):
+    """Voiced harmonics with a gliding pitch, pulsed at syllable rate with pauses between phrases."""
+    t = np.arange(int(RATE * seconds)) / RATE
+    phase = 2 * np.pi * np.cumsum(130 + 20 * np.sin(2 * np.pi * 0.5 * t)) / RATE
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 25))
+    syllables = np.clip(np.sin(2 * np.pi * 4 * t), 0, None) ** 0.7
+    phrases = np.sin(2 * np.pi * 0.4 * t) > -0.6
+    return 0.3 * voiced * syllables * phrases
+
+
+def _chord(seconds):
+    t = np.arange(int(RATE * seconds)) / RATE
+    return 0.1 * sum(np.sin(2 * np.pi * f * k * t) / k for f in (220, 277, 330) for k in range(1, 5))
+
+
+class TestAudioClassifier(unittest.TestCase):
+    def setUp(self):
+        self.classifier = AudioClassifier()
+        self.rng = np.random.default_rng(0)
+
+    def _label(self, samples, sample_rate=RATE):
+        return self.classifier.classify_audio(AudioBuffer(samples, sample_rate)).label
+
+    def test_speech_is_voice(self):
+        self.assertEqual(self._label(_speech(8)), "voice")
+        self.assertEqual(self._label(_speech(2)), "voice")
+
+    def test_speech_over_music_is_voice(self):
+        self.assertEqual(self._label(_speech(10) + 0.5 * _chord(10)), "voice")
+
+    def test_non_voice_labels(self):
+        self.assertEqual(self._label(_chord(20)), "music")
+        self.assertEqual(self._label(0.1 * self.rng.standard_normal(RATE * 20)), "ambiance")
+        burst = np.zeros(RATE * 2)
+        burst[:4000] = 0.5 * self.rng.standard_normal(4000) * np.exp(-np.arange(4000) / 800)
+        self.assertEqual(self._label(burst), "sfx")
+        self.assertEqual(self._label(np.zeros(RATE * 3)), "silence")
+        self.assertEqual(self._label(np.zeros(100)), "silence")
+
+    def test_other_sample_rates_and_stereo(self):
+        stereo = np.stack([_speech(4)] * 2, axis=1)
+        buffer = AudioBuffer(stereo, RATE).resample(44100)
+        self.assertEqual(self.classifier.classify_audio(buffer).label, "voice")
+
+    def test_thresholds_are_configurable(self):
+        strict = AudioClassifier(ClassifierThresholds(min_speech_ratio=0.9))
+        result = strict.classify_audio(AudioBuffer(_speech(4), RATE))
+        self.assertEqual(result.label, "sfx")
+        self.assertFalse(result.is_voice)
+        self.assertIn("speech_ratio", result.to_dict()["features"])
+
+    def _classify_file(self, samples, max_seconds):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "long.wav")
+            sf.write(path, np.asarray(samples, dtype=np.float32), RATE)
+            return AudioClassifier(ClassifierThresholds(max_seconds=max_seconds)).classify(path)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_classify_stops_at_the_first_voice_window(self):
+        result = self._classify_file(np.concatenate([_speech(5), np.zeros(RATE * 60)]), max_seconds=5)
+        self.assertEqual(result.label, "voice")
+        self.assertEqual(result.features["duration"], 65.0)
+        self.assertEqual(result.features["windows"], 1)
+
+    def test_dialogue_after_a_long_music_intro_is_voice(self):
+        """Tests that a file is not skipped as music on the strength of its first window alone."""
+        result = self._classify_file(np.concatenate([_chord(12), _speech(6)]), max_seconds=5)
+        self.assertEqual(result.label, "voice")
+        self.assertEqual(result.features["windows"], 3)
+
+        result = self._classify_file(np.concatenate([np.zeros(RATE * 6), _chord(12)]), max_seconds=5)
+        self.assertEqual(result.label, "music")
+        self.assertEqual(result.features["windows"], 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
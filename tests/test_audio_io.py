@@ -0,0 +1,117 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import soundfile as sf
+
+from src.utils.audio_io import (
+    AudioBuffer,
+    BlockReader,
+    StreamingResampler,
+    channel_matrix,
+    iter_blocks,
+    match_channels,
+    resampler_kernels,
+)
+
+
+class TestStreamingResampler(unittest.TestCase):
+    def _resample(self, signal, sr_in, sr_out, block):
+        resampler = StreamingResampler(sr_in, sr_out, signal.shape[1])
+        parts = [resampler.process(signal[i : i + block]) for i in range(0, len(signal), block)]
+        return np.concatenate(parts + [resampler.flush()])
+
+    def test_block_size_does_not_change_output(self):
+        signal = np.random.default_rng(0).standard_normal((20000, 2)).astype(np.float32)
+        whole = self._resample(signal, 44100, 16000, len(signal))
+        pieces = self._resample(signal, 44100, 16000, 777)
+        self.assertEqual(whole.shape, (int(np.ceil(20000 * 16000 / 44100)), 2))
+        np.testing.assert_allclose(pieces, whole, atol=1e-6)
+
+    def test_sine_is_preserved(self):
+        for sr_in, sr_out in [(22050, 48000), (48000, 24000), (44100, 16000)]:
+            t = np.arange(sr_in) / sr_in
+            signal = np.sin(2 * np.pi * 300 * t).astype(np.float32)[:, None]
+            output = self._resample(signal, sr_in, sr_out, 4096)[:, 0]
+            expected = np.sin(2 * np.pi * 300 * np.arange(len(output)) / sr_out)
+            self.assertEqual(len(output), sr_out)
+            self.assertLess(np.abs(output - expected)[200:-200].max(), 1e-3, (sr_in, sr_out))
+
+    def test_kernels_are_built_once_per_rate_pair(self):
+        resampler_kernels.cache_clear()
+        first = StreamingResampler(44100, 16000, 2)
+        second = StreamingResampler(44100, 16000, 1)
+        self.assertIs(first.kernels, second.kernels)
+        self.assertFalse(first.kernels.flags.writeable)
+        self.assertEqual(resampler_kernels.cache_info().misses, 1)
+        self.assertIsNot(StreamingResampler(48000, 16000, 1).kernels, first.kernels)
+
+    def test_same_rate_passes_through(self):
+        block = np.ones((10, 1), dtype=np.float32)
+        resampler = StreamingResampler(16000, 16000, 1)
+        self.assertIs(resampler.process(block), block)
+        self.assertEqual(resampler.flush().shape, (0, 1))
+
+
+class TestBlockHelpers(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_match_channels(self):
+        mono = np.array([[1.0], [2.0]], dtype=np.float32)
+        stereo = np.array([[1.0, 3.0], [2.0, 4.0]], dtype=np.float32)
+        np.testing.assert_array_equal(match_channels(mono, 2), [[1.0, 1.0], [2.0, 2.0]])
+        np.testing.assert_array_equal(match_channels(stereo, 1), [[2.0], [3.0]])
+        self.assertIs(match_channels(stereo, 2), stereo)
+
+    def test_surround_folds_down_to_stereo(self):
+        # FL, FR, C, LFE, SL, SR
+        surround = np.array([[1.0, 0.0, 1.0, 1.0, 0.0, 0.0]], dtype=np.float32)
+        stereo = match_channels(surround, 2)
+        self.assertEqual(stereo.dtype, np.float32)
+        self.assertGreater(stereo[0, 0], stereo[0, 1])
+        self.assertAlmostEqual(float(stereo[0, 1]), 0.7071 / 2.4142, places=4)
+        self.assertIs(channel_matrix(6, 2), channel_matrix(6, 2))
+
+    def test_iter_blocks_and_block_reader(self):
+        path = os.path.join(self.temp_dir, "a.wav")
+        data = np.linspace(-1, 1, 1000, dtype=np.float32)
+        sf.write(path, data, 8000, subtype="FLOAT")
+
+        blocks = list(iter_blocks(path, channels=2, block_frames=300))
+        self.assertEqual([block.shape for block in blocks], [(300, 2), (300, 2), (300, 2), (100, 2)])
+        self.assertEqual(blocks[0].dtype, np.float32)
+
+        reader = BlockReader(iter_blocks(path, block_frames=300))
+        self.assertEqual(reader.read(450).shape[0], 450)
+        self.assertEqual(reader.read(450).shape[0], 450)
+        self.assertEqual(reader.read(450).shape[0], 100)
+        self.assertEqual(reader.read(450).shape[0], 0)
+
+    def test_audio_buffer_round_trip(self):
+        path = os.path.join(self.temp_dir, "b.wav")
+        buffer = AudioBuffer(np.linspace(-0.5, 0.5, 4800), 48000)
+        self.assertEqual((buffer.frames, buffer.channels, buffer.samples.dtype), (4800, 1, np.float32))
+        buffer.write(path)
+
+        loaded = AudioBuffer.read(path)
+        self.assertEqual(loaded.samples.dtype, np.float32)
+        self.assertAlmostEqual(loaded.duration, 0.1)
+        mono_16k = AudioBuffer(np.zeros((4800, 2)), 48000).to_mono().resample(16000)
+        self.assertEqual((mono_16k.frames, mono_16k.channels), (1600, 1))
+
+        converted = AudioBuffer.read(path, sample_rate=16000, channels=2)
+        self.assertEqual((converted.frames, converted.channels, converted.sample_rate), (1600, 2, 16000))
+
+        blocks = list(iter_blocks(buffer, sample_rate=16000, channels=2, block_frames=1000))
+        self.assertEqual(sum(block.shape[0] for block in blocks), 1600)
+        self.assertEqual(blocks[0].shape[1], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
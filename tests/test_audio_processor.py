@@ -49,48 +49,12 @@ class TestAudioProcessor(unittest.TestCase):
         bg_data = np.random.uniform(-1, 1, (100, bg_channels)).astype(np.float32)
         sf.write(self.bg_path, bg_data, 16000)
 
-        # Mock torch.from_numpy to return objects with shape
-        import sys
-
-        mock_torch = sys.modules["torch"]
-
-        def mock_from_numpy(array):
-            m = MagicMock()
-            # Array from sf.read is (frames, channels), code transposes it
-            # So from_numpy gets (channels, frames)
-            # We need to reflect that in shape
-            m.shape = array.shape
-            m.float.return_value = m
-            # Support addition and multiplication
-            m.__add__.return_value = m
-            m.__mul__.return_value = m
-            m.__radd__.return_value = m
-            m.__rmul__.return_value = m
-            # Handle slicing
-            m.__getitem__.return_value = m
-            # Handle .cpu().detach().numpy().T
-            m.cpu.return_value.detach.return_value.numpy.return_value.T = np.zeros((100, expected_channels))
-
-            # For expand logic
-            m.expand.return_value = m
-
-            return m
-
-        mock_torch.from_numpy.side_effect = mock_from_numpy
-
-        # Mock torchaudio resample
-        mock_torchaudio = sys.modules["torchaudio"]
-        # Resample returns a callable, which returns a tensor
-        resample_transform = MagicMock()
-        resample_transform.side_effect = lambda x: x
-        mock_torchaudio.transforms.Resample.return_value = resample_transform
-
         self.processor.mix_audio(self.vocal_path, self.bg_path, self.output_path)
 
         # Verify output
         self.assertTrue(os.path.exists(self.output_path))
         data, sr = sf.read(self.output_path)
-        self.assertEqual(data.shape[1], expected_channels)
+        self.assertEqual(data.shape, (100, expected_channels))
         self.assertEqual(sr, 16000)
 
     def test_mix_audio_channel_matching_mono_stereo(self):
@@ -101,35 +65,78 @@ class TestAudioProcessor(unittest.TestCase):
         """Tests that stereo vocals and mono background are mixed to stereo output."""
         self._create_dummy_and_mix(vocal_channels=2, bg_channels=1, expected_channels=2)
 
+    def test_mix_audio_streams_long_tracks(self):
+        """Tests that blockwise mixing with resampling matches mixing the whole tracks at once."""
+        sr_v, sr_b = 24000, 44100
+        t_v = np.arange(sr_v * 3) / sr_v
+        vocal = (0.5 * np.sin(2 * np.pi * 220 * t_v)).astype(np.float32)
+        t_b = np.arange(int(sr_b * 3.5)) / sr_b
+        bg = np.stack([0.4 * np.sin(2 * np.pi * 110 * t_b), 0.4 * np.sin(2 * np.pi * 330 * t_b)], axis=1)
+        sf.write(self.vocal_path, vocal, sr_v, subtype="FLOAT")
+        sf.write(self.bg_path, bg.astype(np.float32), sr_b, subtype="FLOAT")
+
+        with patch("src.utils.audio_io.BLOCK_FRAMES", 4096):
+            self.processor.mix_audio(self.vocal_path, self.bg_path, self.output_path)
+
+        data, sr = sf.read(self.output_path)
+        self.assertEqual(sr, sr_v)
+        self.assertEqual(data.shape, (len(vocal), 2))
+        expected_left = 0.5 * (vocal + 0.4 * np.sin(2 * np.pi * 110 * t_v))
+        # 16-bit output and the resampler's filter leave only tiny errors away from the edges
+        self.assertLess(np.abs(data[1000:-1000, 0] - expected_left[1000:-1000]).max(), 2e-3)
+
+    def test_mix_audio_does_not_need_torch(self):
+        self.modules_patcher.stop()
+        with patch.dict("sys.modules", {"torch": None, "torchaudio": None}):
+            sys.modules.pop("src.utils.audio_processor", None)
+            from src.utils.audio_processor import AudioProcessor
+
+            sf.write(self.vocal_path, np.zeros((50, 1), dtype=np.float32), 16000)
+            sf.write(self.bg_path, np.zeros((80, 1), dtype=np.float32), 16000)
+            AudioProcessor().mix_audio(self.vocal_path, self.bg_path, self.output_path)
+
+        self.assertEqual(sf.info(self.output_path).frames, 50)
+        self.modules_patcher.start()
+
     def test_separate_vocals_returns_dict(self):
-        """Tests that separate_vocals returns the expected dictionary format and calls subprocess."""
+        """Tests that separate_vocals returns the expected dictionary format and asks the Demucs worker."""
         audio_path = "input.wav"
         output_dir = "out"
 
-        with patch("subprocess.run") as mock_run, patch("os.path.exists") as mock_exists:
-            # Simulate subprocess success
-            mock_run.return_value = MagicMock(returncode=0)
-            # Simulate files being created
-            mock_exists.side_effect = lambda p: True
+        mock_worker = MagicMock()
+        mock_worker.request.return_value = {"ok": True}
+        self.processor._demucs_worker = mock_worker
 
+        with patch("os.path.exists", return_value=True):
             result = self.processor.separate_vocals(audio_path, output_dir)
 
-            self.assertIsInstance(result, dict)
-            self.assertIn("vocals", result)
-            self.assertIn("background", result)
-
-            # Verify subprocess.run call
-            self.assertTrue(mock_run.called)
-            cmd = mock_run.call_args[0][0]
-            self.assertIn("uv", cmd)
-            self.assertIn("run", cmd)
-            self.assertIn("python", cmd)
-            self.assertIn("demucs_wrapper.py", cmd[3])
-            self.assertIn("--two-stems", cmd)
-            self.assertIn("vocals", cmd)
-            self.assertIn("-o", cmd)
-            self.assertIn(output_dir, cmd)
-            self.assertIn(audio_path, cmd)
+        self.assertIsInstance(result, dict)
+        self.assertIn("vocals", result)
+        self.assertIn("background", result)
+        mock_worker.request.assert_called_once_with({"audio_path": audio_path, "output_dir": output_dir})
+
+    def test_demucs_worker_command(self):
+        """Tests that the persistent Demucs worker runs demucs_wrapper.py in serve mode through uv."""
+        cmd = self.processor.demucs_worker.cmd
+        self.assertEqual(cmd[:3], ["uv", "run", "python"])
+        self.assertIn("demucs_wrapper.py", cmd[3])
+        self.assertIn("--serve", cmd)
+
+    def test_separations_reuse_worker(self):
+        """Tests that clips are separated by one worker and failures are reported per clip."""
+        from src.utils.worker_process import WorkerError
+
+        mock_worker = MagicMock()
+        mock_worker.request.side_effect = [{"ok": True}, {"ok": False, "error": "bad file"}, WorkerError("crashed")]
+        self.processor._demucs_worker = mock_worker
+
+        with patch("os.path.exists", return_value=True):
+            results = [self.processor.separate_vocals(name, "out") for name in ["a.wav", "b.wav", "c.wav"]]
+
+        self.assertEqual(mock_worker.request.call_count, 3)
+        self.assertEqual(results[0]["vocals"], os.path.join("out", "htdemucs", "a", "vocals.wav"))
+        self.assertIsNone(results[1])
+        self.assertIsNone(results[2])
 
     def test_resolve_demucs_paths(self):
         """Tests the logic for resolving Demucs output paths."""
@@ -143,31 +150,70 @@ class TestAudioProcessor(unittest.TestCase):
             self.assertEqual(paths["vocals"], os.path.join(output_dir, "htdemucs", "input_audio", "vocals.wav"))
             self.assertEqual(paths["background"], os.path.join(output_dir, "htdemucs", "input_audio", "no_vocals.wav"))
 
-    def test_denoise_vocals_subprocess_call(self):
-        """Tests that denoise_vocals calls df-process with correct security flags."""
+    def test_denoise_worker_command(self):
+        """Tests that the DeepFilterNet worker runs in an isolated environment with pinned torch."""
+        cmd = self.processor.denoise_worker.cmd
+        self.assertEqual(cmd[:3], ["uv", "run", "--no-project"])
+        self.assertEqual(cmd[cmd.index("--python") + 1], "3.12")
+        self.assertIn("--with", cmd)
+        self.assertIn("deepfilternet", cmd)
+        self.assertIn("torch==2.5.1", cmd)
+        self.assertIn("soundfile", cmd)
+        self.assertTrue(any(part.endswith("deepfilter_wrapper.py") for part in cmd))
+        self.assertIn("--model", cmd)
+        self.assertIn("DeepFilterNet3", cmd)
+
+    def test_denoise_vocals_uses_worker(self):
+        """Tests that denoise_vocals sends the stem to the persistent worker."""
         vocal_path = "vocal.wav"
         output_path = "vocal_clean.wav"
 
-        with patch("os.path.exists", return_value=True), patch("subprocess.run") as mock_run:
-            mock_run.return_value = MagicMock(stdout="Success")
-
-            self.processor.denoise_vocals(vocal_path, output_path)
-
-            # Verify the call pattern
-            args, kwargs = mock_run.call_args
-            cmd_list = args[0]
-            self.assertEqual(cmd_list[0], "uvx")
-            self.assertEqual(cmd_list[1], "--python")
-            self.assertEqual(cmd_list[2], "3.12")
-            self.assertEqual(cmd_list[3], "--from")
-            self.assertEqual(cmd_list[4], "deepfilternet")
-            self.assertIn("--with", cmd_list)
-            self.assertIn("torch==2.5.1", cmd_list)
-            self.assertIn("soundfile", cmd_list)
-            self.assertIn("deepFilter", cmd_list)
-            self.assertIn("-m", cmd_list)
-            self.assertIn("DeepFilterNet3", cmd_list)
-            self.assertIn(vocal_path, cmd_list)
+        mock_worker = MagicMock()
+        mock_worker.request.return_value = {"ok": True, "output_path": output_path}
+        self.processor._denoise_worker = mock_worker
+
+        with patch("os.path.exists", return_value=True):
+            result = self.processor.denoise_vocals(vocal_path, output_path)
+
+        self.assertEqual(result, output_path)
+        mock_worker.request.assert_called_once_with({"input_path": vocal_path, "output_path": output_path})
+
+    def test_denoise_disables_after_startup_failure(self):
+        """Tests that a worker that cannot load is not restarted for every remaining stem."""
+        from src.utils.worker_process import WorkerStartupError
+
+        mock_worker = MagicMock()
+        mock_worker.request.side_effect = WorkerStartupError("No module named 'df'")
+        self.processor._denoise_worker = mock_worker
+
+        with patch("os.path.exists", return_value=True):
+            results = [self.processor.denoise_vocals(name, f"{name}_clean.wav") for name in ["a.wav", "b.wav"]]
+
+        self.assertEqual(results, [None, None])
+        mock_worker.request.assert_called_once()
+
+    def test_background_level_tells_dry_vo_from_a_music_bed(self):
+        """Tests that words separated by near silence count as dry and a constant bed does not."""
+        t = np.arange(16000 * 4) / 16000
+        words = 0.5 * np.sin(2 * np.pi * 200 * t) * (np.sin(2 * np.pi * 2 * t) > 0)
+        bed = 0.1 * np.sin(2 * np.pi * 110 * t)
+        noise = 0.0005 * np.random.default_rng(0).standard_normal(t.size)
+
+        sf.write(self.vocal_path, (words + noise).astype(np.float32), 16000)
+        self.assertLess(self.processor.background_level(self.vocal_path), -40)
+
+        sf.write(self.bg_path, (words + bed).astype(np.float32), 16000)
+        self.assertGreater(self.processor.background_level(self.bg_path), -20)
+
+    def test_background_level_ignores_silent_padding(self):
+        """Tests that a music-bed clip padded with digital silence is not mistaken for dry voice-over."""
+        t = np.arange(16000 * 3) / 16000
+        words = 0.5 * np.sin(2 * np.pi * 200 * t) * (np.sin(2 * np.pi * 2 * t) > 0)
+        bed = 0.1 * np.sin(2 * np.pi * 110 * t)
+        padding = np.zeros(16000)
+
+        sf.write(self.bg_path, np.concatenate([padding, words + bed, padding]).astype(np.float32), 16000)
+        self.assertGreater(self.processor.background_level(self.bg_path), -20)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,67 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from benchmarks.corpus import CorpusSpec, make_corpus
+from benchmarks.fakes import BackendLatency, FakeOllamaServer, fake_translation
+from benchmarks.run import compare, run_benchmark
+from src.models.translator import OllamaTranslator
+from src.utils.audio_classifier import AudioClassifier
+from src.utils.audio_io import AudioBuffer
+
+
+class TestBenchmarks(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_corpus_is_reproducible_and_sounds_like_speech(self):
+        spec = CorpusSpec(clips=6, median_seconds=1.5, max_seconds=3.0, repeat_ratio=0.0, seed=3)
+        first = make_corpus(spec, os.path.join(self.temp_dir, "a"))
+        second = make_corpus(spec, os.path.join(self.temp_dir, "b"))
+
+        for a, b, seconds in zip(first, second, spec.durations()):
+            audio = AudioBuffer.read(a)
+            np.testing.assert_array_equal(audio.samples, AudioBuffer.read(b).samples)
+            self.assertAlmostEqual(audio.duration, seconds, places=2)
+            self.assertTrue(AudioClassifier().classify_audio(audio).is_voice)
+        self.assertTrue(all(spec.min_seconds <= seconds <= spec.max_seconds for seconds in spec.durations()))
+
+    def test_fake_ollama_serves_the_real_translator(self):
+        with FakeOllamaServer(BackendLatency().scaled(0)) as ollama:
+            translator = OllamaTranslator(base_url=ollama.url)
+            batch = translator.translate_batch(["Hold this position.", "Cover me!"], "Portuguese")
+            single = translator.translate("Reloading", "Portuguese")
+
+        self.assertEqual([result["text"] for result in batch], ["dloH siht noitisop.", "revoC em!"])
+        self.assertEqual(single["text"], fake_translation("Reloading"))
+        self.assertEqual(single["target_language"], "portuguese")
+        self.assertEqual(ollama.requests, 2)
+
+    def test_benchmark_reports_each_mode(self):
+        spec = CorpusSpec(clips=6, median_seconds=1.5, max_seconds=6.0, repeat_ratio=0.3, seed=1)
+
+        results = run_benchmark(spec, self.temp_dir, latency_scale=0)
+
+        self.assertEqual([run["mode"] for run in results["runs"]], ["pipelined", "sequential"])
+        for run in results["runs"]:
+            self.assertEqual(run["failed"], 0)
+            self.assertEqual(run["missing_outputs"], 0)
+            self.assertGreater(run["clips_per_minute"], 0)
+            self.assertTrue({"transcribe", "translate", "synthesize", "mix"} <= set(run["stage_seconds"]))
+            self.assertGreater(run["output_bytes"], 0)
+            self.assertGreater(run["peak_rss_mb"], 0)
+        # Results survive a JSON round trip and can be compared with an earlier run
+        results = json.loads(json.dumps(results))
+        self.assertEqual(len(compare(results, results)), 2)
+        self.assertIn("(+0.0%)", compare(results, results)[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,6 +2,8 @@ from unittest.mock import patch
 
 from typer.testing import CliRunner
 
+from src.core.stage_cache import StageCache
+from src.core.state_manager import StateManager
 from src.interface.cli import app
 
 runner = CliRunner()
@@ -27,3 +29,54 @@ def test_download_custom_args(mock_download):
     assert result.exit_code == 0
     assert "Starting download of models to custom_models..." in result.stdout
     mock_download.assert_called_once_with(output_dir="custom_models", model_size="tiny")
+
+
+def test_cache_prune(tmp_path):
+    cache = StageCache(str(tmp_path / ".cache" / "stages"))
+    cache.put_json("transcribe", "a", ["x" * 100])
+    cache.close()
+
+    result = runner.invoke(app, ["cache", "prune", "--output-dir", str(tmp_path), "--max-gb", "0"])
+    assert result.exit_code == 0
+    assert "Removed 1 entries" in result.stdout
+
+
+def test_report_lists_skipped_files(tmp_path):
+    theme, line = tmp_path / "theme.wav", tmp_path / "line.wav"
+    theme.write_bytes(b"theme")
+    line.write_bytes(b"line")
+    state = StateManager(str(tmp_path / "output"))
+    state.mark_skipped(str(theme), "Classified as music", {"classification": {"label": "music"}})
+    state.mark_completed(str(line), {"dry_vo": True, "background_level_db": -62.0})
+    state.close()
+
+    result = runner.invoke(app, ["report", "--output-dir", str(tmp_path / "output")])
+    assert result.exit_code == 0
+    assert "completed=1, skipped=1" in result.stdout
+    assert "Skipped by label: music=1" in result.stdout
+    assert "Dry VO bypass: 1 of 1 measured files (100%)" in result.stdout
+    assert f"{theme}: Classified as music" in result.stdout
+
+
+def test_unknown_classifier_threshold_is_rejected(tmp_path):
+    (tmp_path / "a.wav").write_bytes(b"")
+    result = runner.invoke(app, ["dub-batch", "--input-dir", str(tmp_path), "--classifier-threshold", "loudness=1"])
+    assert result.exit_code != 0
+
+
+@patch("src.interface.cli.DubbingPipeline")
+def test_speaker_map_is_planned_and_passed_to_pipeline(mock_pipeline, tmp_path):
+    for name in ("hero_1.wav", "hero_2.wav"):
+        (tmp_path / name).write_bytes(b"")
+    map_path = tmp_path / "map.json"
+    map_path.write_text('{"hero_*": "hero"}')
+    output = tmp_path / "output"
+
+    result = runner.invoke(
+        app, ["dub-batch", "--input-dir", str(tmp_path), "--output-dir", str(output), "--speaker-map", str(map_path)]
+    )
+
+    assert result.exit_code == 0, result.stdout
+    plan = mock_pipeline.call_args.kwargs["speaker_plan"]
+    assert plan.speaker_of(str(tmp_path / "hero_2.wav")) == "hero"
+    assert (output / "speakers.json").exists()
@@ -0,0 +1,67 @@
+import threading
+import time
+import unittest
+
+from src.core.dedup import LineDeduplicator
+
+
+class TestLineDeduplicator(unittest.TestCase):
+    def test_identical_lines_share_a_group(self):
+        dedup = LineDeduplicator()
+        first = dedup.group_for("Get down!", "Portuguese", "voice-a")
+        self.assertIs(dedup.group_for("  get   DOWN! ", "portuguese", "voice-a"), first)
+        self.assertIsNot(dedup.group_for("Get down!", "Portuguese", "voice-b"), first)
+        self.assertIsNot(dedup.group_for("Get down!", "Spanish", "voice-a"), first)
+        self.assertEqual(dedup.stats(), {"lines": 4, "unique": 3, "matches": 1, "reused_dubs": 0})
+
+    def test_threshold_matches_similar_lines(self):
+        """Tests that lines above the similarity threshold join the group and keep its source text."""
+        exact = LineDeduplicator()
+        similar = LineDeduplicator(threshold=0.9)
+        for dedup in (exact, similar):
+            dedup.group_for("Enemy spotted, take cover", "Portuguese", "voice")
+
+        self.assertEqual(exact.group_for("Enemy spotted, take cover!", "Portuguese", "voice").id, 1)
+        group = similar.group_for("Enemy spotted, take cover!", "Portuguese", "voice")
+        self.assertEqual(group.text, "Enemy spotted, take cover")
+        self.assertEqual(similar.group_for("Reloading", "Portuguese", "voice").id, 1)
+
+    def test_old_groups_are_forgotten(self):
+        dedup = LineDeduplicator(max_groups=2)
+        first = dedup.group_for("One", "Portuguese", "voice")
+        first.dub_path = "/nonexistent/0.wav"
+        dedup.group_for("Two", "Portuguese", "voice")
+        dedup.group_for("Three", "Portuguese", "voice")
+
+        self.assertIsNone(first.dub_path)
+        self.assertIsNot(dedup.group_for("One", "Portuguese", "voice"), first)
+
+    def test_eviction_does_not_block_on_a_busy_group(self):
+        """
+        Tests that a clip holding its group's lock (e.g. during TTS) can still count a reuse and look up
+        groups while another thread evicts that group and waits to delete its dub.
+        """
+        dedup = LineDeduplicator(max_groups=1)
+        first = dedup.group_for("One", "Portuguese", "voice")
+        first.dub_path = "/nonexistent/0.wav"
+
+        with first.lock:
+            evicting = threading.Thread(target=dedup.group_for, args=("Two", "Portuguese", "voice"))
+            evicting.start()
+            while len(dedup._recent) > 1 or 0 in dedup._recent:
+                time.sleep(0.01)
+            others = threading.Thread(
+                target=lambda: (dedup.record_reuse(), dedup.group_for("Three", "Portuguese", "voice"))
+            )
+            others.start()
+            others.join(timeout=5)
+            self.assertFalse(others.is_alive())
+        evicting.join(timeout=5)
+
+        self.assertFalse(evicting.is_alive())
+        self.assertIsNone(first.dub_path)
+        self.assertEqual(dedup.stats()["reused_dubs"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import json
+import os
+import re
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Libraries that take seconds to import; only the stages that run a model may pull them in
+HEAVY_PACKAGES = ["torch", "torchaudio", "faster_whisper", "ctranslate2", "qwen_tts", "transformers", "demucs", "df"]
+# Generous bound on importing the CLI, far below what torch alone costs
+IMPORT_BUDGET_SECONDS = 2.0
+
+# Records every attempt to import a heavy package, installed or not, then runs the CLI
+SCRIPT = """
+import importlib.abc
+import json
+import sys
+
+attempted = []
+
+
+class Spy(importlib.abc.MetaPathFinder):
+    def find_spec(self, name, path, target=None):
+        if name.split(".")[0] in {heavy}:
+            attempted.append(name)
+        return None
+
+
+sys.meta_path.insert(0, Spy())
+sys.argv = ["dub", *{args}]
+from src.interface.cli import app
+
+try:
+    app()
+except SystemExit:
+    pass
+print(json.dumps(attempted))
+"""
+
+
+# Builds a pipeline and reads its stats, as a fully cached run or `report` does
+PIPELINE_SCRIPT = """
+import importlib.abc
+import json
+import sys
+import tempfile
+
+attempted = []
+
+
+class Spy(importlib.abc.MetaPathFinder):
+    def find_spec(self, name, path, target=None):
+        if name.split(".")[0] in {heavy}:
+            attempted.append(name)
+        return None
+
+
+sys.meta_path.insert(0, Spy())
+from src.core.pipeline import DubbingPipeline
+
+with tempfile.TemporaryDirectory() as output_dir:
+    pipeline = DubbingPipeline(output_dir, "Portuguese")
+    pipeline.stats()
+    pipeline.close()
+print(json.dumps(attempted))
+"""
+
+
+def _run_cli(*args):
+    """
+    Runs the CLI with `python -X importtime`. Returns the heavy imports attempted and the
+    cumulative import time in seconds of each module.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", SCRIPT.format(heavy=HEAVY_PACKAGES, args=list(args))],
+        capture_output=True,
+        text=True,
+        cwd=ROOT,
+        timeout=120,
+    )
+    if result.returncode != 0:
+        raise AssertionError(f"CLI failed:\n{result.stderr[-2000:]}")
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|\s*(\S+)", line)
+        if match:
+            cumulative[match.group(2)] = int(match.group(1)) / 1e6
+    return json.loads(result.stdout.strip().splitlines()[-1]), cumulative
+
+
+class TestImportTime(unittest.TestCase):
+    def test_help_does_not_import_ml_libraries(self):
+        for args in (["--help"], ["hello"], ["dub-batch", "--help"], ["serve", "--help"]):
+            with self.subTest(args=args):
+                attempted, cumulative = _run_cli(*args)
+                self.assertEqual(attempted, [])
+                self.assertFalse(set(cumulative) & set(HEAVY_PACKAGES))
+                self.assertLess(cumulative["src.interface.cli"], IMPORT_BUDGET_SECONDS)
+
+    def test_building_a_pipeline_does_not_import_ml_libraries(self):
+        """Tests that the models only resolve their device, which imports torch, once they are loaded."""
+        result = subprocess.run(
+            [sys.executable, "-c", PIPELINE_SCRIPT.format(heavy=HEAVY_PACKAGES)],
+            capture_output=True,
+            text=True,
+            cwd=ROOT,
+            timeout=120,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr[-2000:])
+        self.assertEqual(json.loads(result.stdout.strip().splitlines()[-1]), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+from src.models import model_registry
+from src.models.model_registry import ModelRegistry, shared_registry
+
+MIB = 1024**2
+
+
+class TestModelRegistry(unittest.TestCase):
+    def setUp(self):
+        # Each load grows the "process" by the size the loader announces
+        self.rss = 100 * MIB
+        self.rss_patcher = patch.object(model_registry, "resident_bytes", side_effect=lambda: self.rss)
+        self.rss_patcher.start()
+
+    def tearDown(self):
+        self.rss_patcher.stop()
+
+    def _loader(self, name, size_mb):
+        def load():
+            self.rss += size_mb * MIB
+            return f"model:{name}"
+
+        return MagicMock(side_effect=load)
+
+    def test_shares_loaded_models(self):
+        registry = ModelRegistry()
+        loader = self._loader("whisper", 10)
+
+        self.assertEqual(registry.get("whisper", loader), "model:whisper")
+        self.assertEqual(registry.get("whisper", self._loader("other", 1)), "model:whisper")
+
+        loader.assert_called_once()
+        self.assertEqual(registry.resident(), {"whisper": 10 * MIB})
+        self.assertEqual(registry.stats()["hits"], 1)
+
+    def test_evicts_least_recently_used_over_budget(self):
+        registry = ModelRegistry(budget_bytes=25 * MIB)
+        unload = MagicMock()
+        registry.get("whisper", self._loader("whisper", 10), unload)
+        registry.get("tts", self._loader("tts", 12))
+        # Using whisper again makes tts the least recently used
+        registry.get("whisper", self._loader("whisper", 10), unload)
+
+        registry.get("llm", self._loader("llm", 8))
+
+        self.assertEqual(list(registry.resident()), ["whisper", "llm"])
+        unload.assert_not_called()
+        self.assertEqual(registry.stats()["evictions"], 1)
+
+    def test_reload_makes_room_first_from_known_size(self):
+        registry = ModelRegistry(budget_bytes=25 * MIB)
+        unload = MagicMock()
+        registry.get("whisper", self._loader("whisper", 10), unload)
+        registry.get("tts", self._loader("tts", 12))
+        registry.evict("tts")
+        self.rss -= 12 * MIB
+        registry.get("demucs", self._loader("demucs", 10))
+
+        resident_before_load = []
+        loader = self._loader("tts", 12)
+        loader.side_effect = lambda: resident_before_load.append(list(registry.resident())) or "model:tts"
+        registry.get("tts", loader)
+
+        # The 12 MiB tts did not fit next to both, so the older model went before loading started
+        self.assertEqual(resident_before_load, [["demucs"]])
+        unload.assert_called_once_with("model:whisper")
+
+    def test_failed_load_registers_nothing(self):
+        registry = ModelRegistry()
+        with self.assertRaises(RuntimeError):
+            registry.get("tts", MagicMock(side_effect=RuntimeError("no weights")))
+        self.assertNotIn("tts", registry)
+
+    def test_concurrent_requests_load_once(self):
+        registry = ModelRegistry()
+        loader = self._loader("whisper", 10)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(registry.get("whisper", loader))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        loader.assert_called_once()
+        self.assertEqual(results, ["model:whisper"] * 8)
+
+    def test_lowering_budget_unloads(self):
+        registry = ModelRegistry()
+        registry.get("whisper", self._loader("whisper", 10))
+        registry.get("tts", self._loader("tts", 12))
+
+        registry.set_budget(15 * MIB)
+
+        self.assertEqual(list(registry.resident()), ["tts"])
+        self.assertEqual(registry.stats()["budget_mb"], 15)
+
+    def test_leased_models_are_not_unloaded(self):
+        """Tests that a model in use stays loaded when another one does not fit next to it, with a warning."""
+        registry = ModelRegistry(budget_bytes=15 * MIB)
+        unload = MagicMock()
+        with registry.lease("whisper"):
+            registry.get("whisper", self._loader("whisper", 10), unload)
+            with self.assertLogs("src.models.model_registry", level="WARNING") as logs:
+                registry.get("tts", self._loader("tts", 12))
+            self.assertFalse(registry.evict("whisper"))
+
+        unload.assert_not_called()
+        self.assertEqual(list(registry.resident()), ["whisper", "tts"])
+        self.assertIn("too small", logs.output[0])
+
+        registry.set_budget(15 * MIB)
+        self.assertEqual(list(registry.resident()), ["tts"])
+
+    def test_warns_when_models_keep_replacing_each_other(self):
+        """Tests that reloading a model that the budget cannot hold next to the others is reported once."""
+        registry = ModelRegistry(budget_bytes=15 * MIB)
+        registry.get("whisper", self._loader("whisper", 10))
+        registry.get("tts", self._loader("tts", 12))
+
+        with self.assertLogs("src.models.model_registry", level="WARNING") as logs:
+            registry.get("whisper", self._loader("whisper", 10))
+            registry.get("tts", self._loader("tts", 12))
+
+        warnings = [line for line in logs.output if line.startswith("WARNING")]
+        self.assertEqual(len(warnings), 1)
+        self.assertIn("Reloading whisper", warnings[0])
+
+    def test_shared_registry_is_process_wide(self):
+        self.assertIs(shared_registry(), shared_registry())
+
+
+if __name__ == "__main__":
+    unittest.main()
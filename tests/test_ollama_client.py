@@ -0,0 +1,167 @@
+import json
+import re
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.models.ollama_client import OllamaClient, OllamaUnavailableError
+from src.models.translator import OllamaTranslator
+
+
+class StubOllama:
+    """
+    A local HTTP server imitating Ollama's /api/generate.
+    mode: "ok" answers with a fake translation, "error" returns 500, "missing" returns 404 (model not pulled),
+    "hang" sleeps past the client timeout.
+    """
+
+    def __init__(self, mode="ok", delay=0.0):
+        self.mode = mode
+        self.delay = delay
+        self.requests = 0
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with stub._lock:
+                    stub.requests += 1
+                    stub.active += 1
+                    stub.max_active = max(stub.max_active, stub.active)
+                try:
+                    if stub.mode == "hang":
+                        time.sleep(1.0)
+                    time.sleep(stub.delay)
+                    if stub.mode == "missing":
+                        self.send_response(404)
+                        self.end_headers()
+                        return
+                    if stub.mode != "ok" or self.path != "/api/generate":
+                        self.send_response(500)
+                        self.end_headers()
+                        return
+                    answer = stub.answer(body["prompt"])
+                    data = json.dumps({"response": json.dumps(answer)}).encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    with stub._lock:
+                        stub.active -= 1
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @staticmethod
+    def answer(prompt):
+        lines = re.search(r"###\s*(.*?)\s*###", prompt, re.S).group(1)
+        if lines.startswith("["):
+            return {
+                "translations": [
+                    {"id": line["id"], "text": f"PT {line['text']}", "target_language": "portuguese"}
+                    for line in json.loads(lines)
+                ]
+            }
+        return {"text": f"PT {lines}", "target_language": "portuguese"}
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TestOllamaClient(unittest.TestCase):
+    def setUp(self):
+        self.stubs = []
+
+    def tearDown(self):
+        for stub in self.stubs:
+            stub.close()
+
+    def _stub(self, *args, **kwargs):
+        stub = StubOllama(*args, **kwargs)
+        self.stubs.append(stub)
+        return stub
+
+    def test_requests_run_concurrently(self):
+        """Tests that individual lines are translated with several requests in flight at once."""
+        stub = self._stub(delay=0.05)
+        translator = OllamaTranslator(base_url=stub.url, max_concurrency=4)
+
+        results = translator.translate_batch([f"line {i}" for i in range(8)], "Portuguese", batch_size=1)
+
+        self.assertEqual([r["text"] for r in results], [f"PT line {i}" for i in range(8)])
+        self.assertEqual(stub.requests, 8)
+        self.assertGreater(stub.max_active, 1)
+        self.assertLessEqual(stub.max_active, 4)
+
+    def test_batches_are_spread_across_endpoints(self):
+        """Tests that batch chunks go to several hosts and map back correctly."""
+        first, second = self._stub(delay=0.05), self._stub(delay=0.05)
+        translator = OllamaTranslator(base_url=[first.url, second.url], max_concurrency=4)
+
+        results = translator.translate_batch([f"line {i}" for i in range(12)], "Portuguese", batch_size=3)
+
+        self.assertEqual([r["text"] for r in results], [f"PT line {i}" for i in range(12)])
+        self.assertGreater(first.requests, 0)
+        self.assertGreater(second.requests, 0)
+
+    def test_failing_endpoint_drops_out(self):
+        """Tests that a broken host is retried elsewhere and then avoided while it cools down."""
+        broken, healthy = self._stub(mode="error"), self._stub()
+        client = OllamaClient([broken.url, healthy.url], max_concurrency=1)
+
+        for _ in range(5):
+            result = client.post_json("/api/generate", {"prompt": "###\nhi\n###"})
+            self.assertEqual(json.loads(result["response"])["text"], "PT hi")
+
+        self.assertEqual(broken.requests, 1)
+        self.assertEqual(healthy.requests, 5)
+        stats = {s["base_url"]: s for s in client.stats()}
+        self.assertFalse(stats[broken.url]["healthy"])
+
+    def test_hung_endpoint_times_out(self):
+        """Tests that a host that never answers is abandoned after the timeout."""
+        hung, healthy = self._stub(mode="hang"), self._stub()
+        client = OllamaClient([hung.url, healthy.url], max_concurrency=2, timeout=0.2)
+
+        start = time.monotonic()
+        results = [client.post_json("/api/generate", {"prompt": "###\nhi\n###"}) for _ in range(4)]
+
+        self.assertTrue(all(results))
+        self.assertEqual(hung.requests, 1)
+        self.assertLess(time.monotonic() - start, 2.0)
+
+    def test_missing_model_does_not_cool_down_host(self):
+        """Tests that a 404 (model not pulled) returns None and leaves the host healthy."""
+        missing = self._stub(mode="missing")
+        client = OllamaClient(missing.url)
+
+        self.assertIsNone(client.post_json("/api/generate", {"prompt": "###\nhi\n###"}))
+        self.assertIsNone(client.post_json("/api/generate", {"prompt": "###\nhi\n###"}))
+
+        self.assertEqual(missing.requests, 2)
+        (stats,) = client.stats()
+        self.assertTrue(stats["healthy"])
+
+    def test_no_endpoint_available(self):
+        broken = self._stub(mode="error")
+        client = OllamaClient(broken.url)
+        with self.assertRaises(OllamaUnavailableError):
+            client.post_json("/api/generate", {"prompt": "###\nhi\n###"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,6 +6,13 @@ import sys
 import unittest
 from unittest.mock import MagicMock, patch
 
+import numpy as np
+import soundfile as sf
+
+from src.core.stage_cache import StageCache
+from src.utils.audio_classifier import Classification
+from src.utils.audio_io import AudioBuffer
+
 # Removed global sys.modules patching
 # from src.core.pipeline import DubbingPipeline will be done in setUp
 
@@ -41,11 +48,22 @@ class TestDubbingPipeline(unittest.TestCase):
         self.pipeline.tts = MagicMock()
         self.pipeline.processor = MagicMock()
         self.pipeline.state = MagicMock()
+        self.pipeline.stage_cache.close()
+        self.pipeline.stage_cache = None
+        self.pipeline.classifier = None
+        self.pipeline.dry_vo_threshold_db = None
 
         # Default behavior: processed check returns False
         self.pipeline.state.is_processed.return_value = False
 
+        # The flow tests use made-up vocal paths; hand stages a labelled buffer instead of decoding them
+        self.read_patcher = patch(
+            "src.core.pipeline.AudioBuffer.read", side_effect=lambda path: MagicMock(name=f"buffer:{path}")
+        )
+        self.mock_read = self.read_patcher.start()
+
     def tearDown(self):
+        self.read_patcher.stop()
         if os.path.exists(self.output_dir):
             shutil.rmtree(self.output_dir)
         self.modules_patcher.stop()
@@ -76,7 +94,7 @@ class TestDubbingPipeline(unittest.TestCase):
             "text": "Olá mundo",
             "tts_instruction": "Brazilian Portuguese accent and pronunciation",
         }
-        self.pipeline.tts.generate_dub.return_value = "temp/dub.wav"
+        self.pipeline.tts.synthesize.return_value = MagicMock(name="dub")
 
         # Ensure os.path.exists returns True so we enter the mix_audio branch
         mock_exists.return_value = True
@@ -102,6 +120,10 @@ class TestDubbingPipeline(unittest.TestCase):
 
         # 6. Verify success
         self.pipeline.state.mark_completed.assert_called_once()
+        self.assertEqual(
+            set(self.pipeline.stats()["stage_seconds"]),
+            {"separate", "denoise", "transcribe", "translate", "synthesize", "mix"},
+        )
 
     @patch("src.core.pipeline.shutil")
     @patch("tempfile.TemporaryDirectory")
@@ -121,14 +143,361 @@ class TestDubbingPipeline(unittest.TestCase):
 
         self.pipeline.stt.transcribe.return_value = [{"text": "Hello"}]
         self.pipeline.translator.translate.return_value = {"text": "Olá", "tts_instruction": ""}
-        self.pipeline.tts.generate_dub.return_value = "temp/dub.wav"
 
         mock_temp_dir.return_value.__enter__.return_value = "temp_dir_path"
 
         self.pipeline.process_file(audio_path)
 
-        # Verify transcribe called with ORIGINAL vocals
-        self.pipeline.stt.transcribe.assert_called_once_with("temp/vocals.wav")
+        # Verify transcribe called with ORIGINAL vocals, decoded once and shared with TTS
+        self.mock_read.assert_called_once_with("temp/vocals.wav")
+        transcribed = self.pipeline.stt.transcribe.call_args.args[0]
+        self.assertIs(self.pipeline.tts.synthesize.call_args.args[1], transcribed)
+
+    @patch("src.core.pipeline.shutil.rmtree")
+    @patch("src.core.pipeline.shutil.copy")
+    @patch("src.core.pipeline.os.makedirs")
+    @patch("tempfile.mkdtemp")
+    def test_process_batch_records_every_file(self, mock_mkdtemp, mock_makedirs, mock_copy, mock_rmtree):
+        """
+        Tests that pipelined batch mode runs every stage per file and records each outcome once.
+        """
+        mock_mkdtemp.side_effect = lambda **kwargs: "temp_dir_path"
+        self.pipeline.state.is_processed.side_effect = lambda path: path == "input/done.wav"
+
+        def separate(audio_path, output_dir):
+            if audio_path == "input/broken.wav":
+                return None
+            return {"vocals": f"{audio_path}.vocals.wav", "background": None}
+
+        self.pipeline.processor.separate_vocals.side_effect = separate
+        self.pipeline.processor.denoise_vocals.return_value = None
+        self.pipeline.stt.transcribe_batch.side_effect = lambda audios: [[{"text": "Hello"}] for _ in audios]
+        self.pipeline.translator.translate_batch.side_effect = lambda texts, lang: [
+            {"text": "Olá", "target_language": "portuguese"} for _ in texts
+        ]
+        self.pipeline.tts.synthesize_batch.side_effect = lambda requests: [MagicMock() for _ in requests]
+
+        finished = []
+        files = ["input/a.wav", "input/b.wav", "input/broken.wav", "input/done.wav"]
+        results = self.pipeline.process_batch(files, queue_size=1, on_result=lambda path, ok: finished.append(path))
+
+        self.assertEqual(
+            results, {"input/a.wav": True, "input/b.wav": True, "input/broken.wav": False, "input/done.wav": True}
+        )
+        self.assertEqual(sorted(finished), sorted(files))
+        self.assertEqual(self.pipeline.state.mark_completed.call_count, 2)
+        self.pipeline.state.mark_failed.assert_called_once_with("input/broken.wav", "Vocal separation failed")
+        # The failed clip never reaches transcription, the skipped one is never separated
+        transcribed = sum(len(call.args[0]) for call in self.pipeline.stt.transcribe_batch.call_args_list)
+        self.assertEqual(transcribed, 2)
+        self.pipeline.stt.transcribe.assert_not_called()
+        translated = sum(len(call.args[0]) for call in self.pipeline.translator.translate_batch.call_args_list)
+        self.assertEqual(translated, 2)
+        self.pipeline.translator.translate.assert_not_called()
+        synthesized = sum(len(call.args[0]) for call in self.pipeline.tts.synthesize_batch.call_args_list)
+        self.assertEqual(synthesized, 2)
+        self.pipeline.tts.synthesize.assert_not_called()
+        self.assertEqual(self.pipeline.processor.separate_vocals.call_count, 3)
+        self.assertEqual(mock_rmtree.call_count, 3)
+
+    def test_process_batch_reuses_dub_for_repeated_lines(self):
+        """
+        Tests that clips with the same line and voice are translated and synthesized once
+        but mixed over their own backgrounds.
+        """
+        self.read_patcher.stop()
+        self.read_patcher = patch("src.core.pipeline.AudioBuffer.read", wraps=AudioBuffer.read)
+        self.read_patcher.start()
+        vocals_path = os.path.join(self.output_dir, "bark_vocals.wav")
+        sf.write(vocals_path, np.full(1600, 0.1, dtype=np.float32), 16000)
+
+        self.pipeline.processor.separate_vocals.side_effect = lambda audio_path, output_dir: {
+            "vocals": vocals_path,
+            "background": f"{audio_path}.bg.wav",
+        }
+        self.pipeline.processor.denoise_vocals.return_value = None
+        self.pipeline.stt.transcribe_batch.side_effect = lambda audios: [[{"text": "Get down!"}] for _ in audios]
+        self.pipeline.translator.translate_batch.side_effect = lambda texts, lang: [{"text": "Abaixe"} for _ in texts]
+
+        self.pipeline.tts.synthesize_batch.side_effect = lambda requests: [
+            AudioBuffer(np.zeros(2400), 24000) for _ in requests
+        ]
+
+        with patch("src.core.pipeline.os.path.exists", side_effect=lambda path: not path.endswith(".bg.wav")):
+            results = self.pipeline.process_batch(["input/a.wav", "input/b.wav", "input/c.wav"], queue_size=1)
+        dedup_stats = self.pipeline.stats()["dedup"]
+        self.pipeline.close()
+
+        self.assertEqual(set(results.values()), {True})
+        synthesized = [
+            request for call in self.pipeline.tts.synthesize_batch.call_args_list for request in call.args[0]
+        ]
+        self.assertEqual(len(synthesized), 1)
+        translated = [text for call in self.pipeline.translator.translate_batch.call_args_list for text in call.args[0]]
+        self.assertEqual(translated, ["Get down!"])
+        dubbed = sorted(name for name in os.listdir(self.output_dir) if name.endswith(".wav"))
+        self.assertEqual(dubbed, ["a.wav", "b.wav", "bark_vocals.wav", "c.wav"])
+        self.assertFalse([name for name in os.listdir(self.output_dir) if name.startswith("dub_")])
+        self.assertEqual(dedup_stats, {"lines": 3, "unique": 1, "matches": 2, "reused_dubs": 2})
+
+    def test_synthesize_batch_generates_repeats_once(self):
+        """
+        Tests that a batch holding the same line twice sends it to the model once and shares the dub.
+        """
+        from src.core.pipeline import ClipJob
+
+        self.read_patcher.stop()
+        self.read_patcher = patch("src.core.pipeline.AudioBuffer.read", wraps=AudioBuffer.read)
+        self.read_patcher.start()
+        jobs = [ClipJob(f"input/{name}.wav", self.output_dir) for name in ("a", "b", "c")]
+        for job, text in zip(jobs, ("Get down!", "Get down!", "Over here!")):
+            job.original_text = job.translated_text = text
+            job.vocals = AudioBuffer(np.zeros(1600), 16000)
+            job.dedup_group = self.pipeline.dedup.group_for(text, "Portuguese", "voice")
+        self.pipeline.tts.synthesize_batch.side_effect = lambda requests: [
+            AudioBuffer(np.full(2400, i + 1.0) / 10, 24000) for i in range(len(requests))
+        ]
+
+        self.pipeline._synthesize_batch(jobs)
+        self.pipeline.close()
+
+        (requests,) = self.pipeline.tts.synthesize_batch.call_args.args
+        self.assertEqual(len(requests), 2)
+        tts_request = sys.modules["src.core.pipeline"].TTSRequest
+        self.assertEqual([call.args[0] for call in tts_request.call_args_list], ["Get down!", "Over here!"])
+        self.assertFalse([job.error for job in jobs if job.error])
+        np.testing.assert_allclose(jobs[1].dub.samples, jobs[0].dub.samples, atol=1e-4)
+        self.assertEqual(self.pipeline.dedup.stats()["reused_dubs"], 1)
+
+    def test_failed_file_resumes_from_stage_cache(self):
+        """
+        Tests that a file that failed at TTS skips separation, denoising and transcription when retried.
+        """
+        self.read_patcher.stop()
+        self.read_patcher = patch("src.core.pipeline.AudioBuffer.read", wraps=AudioBuffer.read)
+        self.read_patcher.start()
+        self.pipeline.stage_cache = StageCache(os.path.join(self.output_dir, "stages"))
+        self.pipeline.state.content_hash.return_value = "source-hash"
+        self.pipeline.dedup = None
+
+        def separate(audio_path, output_dir):
+            os.makedirs(output_dir, exist_ok=True)
+            stems = {"vocals": os.path.join(output_dir, "vocals.wav"), "background": os.path.join(output_dir, "bg.wav")}
+            for path in stems.values():
+                sf.write(path, np.zeros(1600, dtype=np.float32), 16000)
+            return stems
+
+        def denoise(vocal_path, output_path):
+            shutil.copy(vocal_path, output_path)
+            return output_path
+
+        self.pipeline.processor.separate_vocals.side_effect = separate
+        self.pipeline.processor.denoise_vocals.side_effect = denoise
+        self.pipeline.stt.transcribe.return_value = [{"text": "Hello"}]
+        self.pipeline.translator.translate.return_value = {"text": "Olá", "target_language": "portuguese"}
+        self.pipeline.tts.synthesize.return_value = None
+
+        self.assertFalse(self.pipeline.process_file("input/cutscene.wav"))
+
+        self.pipeline.tts.synthesize.return_value = AudioBuffer(np.zeros(2400), 24000)
+        self.assertTrue(self.pipeline.process_file("input/cutscene.wav"))
+
+        self.pipeline.processor.separate_vocals.assert_called_once()
+        self.pipeline.processor.denoise_vocals.assert_called_once()
+        self.pipeline.stt.transcribe.assert_called_once()
+        self.assertEqual(self.pipeline.tts.synthesize.call_count, 2)
+        self.assertIsInstance(self.pipeline.tts.synthesize.call_args.args[1], AudioBuffer)
+        mixed_background = self.pipeline.processor.mix_audio.call_args.args[1]
+        self.assertTrue(mixed_background.endswith("background.wav"))
+        self.pipeline.stage_cache.close()
+
+    def test_cached_files_that_vanish_while_linked_are_a_miss(self):
+        """Tests that a stage cache entry pruned between its lookup and the link runs the stage again."""
+        from src.core.pipeline import ClipJob
+
+        job = ClipJob("input/cutscene.wav", os.path.join(self.output_dir, "job"))
+        self.pipeline.stage_cache = MagicMock()
+        self.pipeline.stage_cache.get_files.return_value = {
+            "vocals.wav": os.path.join(self.output_dir, "pruned", "vocals.wav")
+        }
+
+        self.assertIsNone(self.pipeline._restore_files(job, "key", "separate"))
+        self.assertFalse(os.path.exists(os.path.join(job.temp_dir, "cached", "separate")))
+
+    def test_non_voice_file_is_skipped_before_separation(self):
+        """
+        Tests that a file classified as music is copied to the output and recorded as skipped
+        without any model running, while voice files go through every stage.
+        """
+        source = os.path.join(self.output_dir, "theme.wav")
+        sf.write(source, np.zeros(1600, dtype=np.float32), 16000)
+        self.pipeline.classifier = MagicMock()
+        self.pipeline.classifier.classify.return_value = Classification("music", {"speech_ratio": 0.0})
+        output_dir = os.path.join(self.output_dir, "out")
+        os.makedirs(output_dir)
+        self.pipeline.output_dir = output_dir
+
+        self.assertTrue(self.pipeline.process_file(source))
+
+        self.pipeline.processor.separate_vocals.assert_not_called()
+        self.pipeline.stt.transcribe.assert_not_called()
+        self.assertTrue(os.path.exists(os.path.join(output_dir, "theme.wav")))
+        path, reason, metadata = self.pipeline.state.mark_skipped.call_args.args
+        self.assertEqual((path, reason), (source, "Classified as music"))
+        self.assertEqual(metadata["classification"]["label"], "music")
+        self.pipeline.state.mark_completed.assert_not_called()
+        self.assertEqual(self.pipeline.stats()["classifier"], {"music": 1})
+
+    def test_dry_voice_over_skips_separation_and_denoising(self):
+        """
+        Tests that a clip without a background bed is transcribed from the source file
+        and its dub is written to the output without mixing.
+        """
+        self.pipeline.dry_vo_threshold_db = -40.0
+        self.pipeline.processor.background_level.return_value = -60.0
+        self.pipeline.stt.transcribe.return_value = [{"text": "Hello"}]
+        self.pipeline.translator.translate.return_value = {"text": "Olá", "target_language": "portuguese"}
+        dub = MagicMock()
+        self.pipeline.tts.synthesize.return_value = dub
+
+        self.assertTrue(self.pipeline.process_file("input/line.wav"))
+
+        self.pipeline.processor.separate_vocals.assert_not_called()
+        self.pipeline.processor.denoise_vocals.assert_not_called()
+        self.pipeline.processor.mix_audio.assert_not_called()
+        self.mock_read.assert_called_once_with("input/line.wav")
+        dub.write.assert_called_once_with(os.path.join(self.output_dir, "line.wav"))
+        metadata = self.pipeline.state.mark_completed.call_args.args[1]
+        self.assertEqual((metadata["dry_vo"], metadata["background_level_db"]), (True, -60.0))
+        self.assertEqual(self.pipeline.stats()["dry_vo"], {"bypassed": 1, "separated": 0})
+
+        self.pipeline.processor.background_level.return_value = -12.0
+        self.pipeline.processor.separate_vocals.return_value = None
+        self.assertFalse(self.pipeline.process_file("input/music_bed.wav"))
+        self.pipeline.processor.separate_vocals.assert_called_once()
+        self.assertEqual(self.pipeline.stats()["dry_vo"], {"bypassed": 1, "separated": 1})
+
+    def test_transcribe_batch_transcribes_uncached_clips_together(self):
+        """
+        Tests that clips waiting for STT are sent in one batched call and that a clip
+        with an empty transcript fails alone.
+        """
+        from src.core.pipeline import ClipJob
+
+        jobs = [ClipJob(f"input/{name}.wav", "temp_dir_path") for name in ("a", "b", "c")]
+        for job in jobs:
+            job.vocal_path = f"{job.audio_path}.vocals.wav"
+        self.pipeline.stt.transcribe_batch.return_value = [
+            [{"text": "Halt!"}],
+            [],
+            [{"text": "Who"}, {"text": "goes?"}],
+        ]
+
+        self.pipeline._transcribe_batch(jobs)
+
+        self.pipeline.stt.transcribe_batch.assert_called_once()
+        self.assertEqual(len(self.pipeline.stt.transcribe_batch.call_args.args[0]), 3)
+        self.assertEqual([job.original_text for job in jobs], ["Halt!", "", "Who goes?"])
+        self.assertEqual([job.error for job in jobs], [None, "Transcription returned no segments", None])
+
+    def test_segment_mode_places_segments_and_retries_failed_ones(self):
+        """
+        Tests that in segment mode each segment is translated and synthesized on its own, placed at its
+        start time, and that a retry after a failed segment only synthesizes that segment again.
+        """
+        self.read_patcher.stop()
+        self.read_patcher = patch("src.core.pipeline.AudioBuffer.read", wraps=AudioBuffer.read)
+        self.read_patcher.start()
+        source = os.path.join(self.output_dir, "cutscene.wav")
+        sf.write(source, np.zeros(48000, dtype=np.float32), 16000)
+        output_dir = os.path.join(self.output_dir, "out")
+        os.makedirs(output_dir)
+        self.pipeline.output_dir = output_dir
+        self.pipeline.segment_mode = True
+        self.pipeline.stage_cache = StageCache(os.path.join(self.output_dir, "stages"))
+        self.pipeline.state.content_hash.return_value = "source-hash"
+        self.pipeline.dry_vo_threshold_db = -40.0
+        self.pipeline.processor.background_level.return_value = -60.0
+        self.pipeline.stt.transcribe.return_value = [
+            {"start": 0.0, "end": 0.8, "text": "Listen."},
+            {"start": 1.0, "end": 1.8, "text": "The gate is open."},
+            {"start": 2.0, "end": 2.5, "text": "Go!"},
+        ]
+        self.pipeline.translator.translate_batch.side_effect = lambda texts, lang: [
+            {"text": f"pt:{text}", "target_language": "portuguese"} for text in texts
+        ]
+
+        def dub(level):
+            return AudioBuffer(np.full(2400, level, dtype=np.float32), 24000)
+
+        self.pipeline.tts.synthesize_batch.side_effect = lambda requests: [dub(0.1), None, dub(0.3)]
+        self.assertFalse(self.pipeline.process_file(source))
+        self.pipeline.state.mark_failed.assert_called_once_with(source, "TTS synthesis failed for 1 of 3 segments")
+
+        self.pipeline.tts.synthesize_batch.side_effect = lambda requests: [dub(0.2)]
+        self.assertTrue(self.pipeline.process_file(source))
+        self.pipeline.stage_cache.close()
+
+        tts_request = sys.modules["src.core.pipeline"].TTSRequest
+        texts = [call.args[0] for call in tts_request.call_args_list]
+        self.assertEqual(texts, ["pt:Listen.", "pt:The gate is open.", "pt:Go!", "pt:The gate is open."])
+        self.assertEqual(len(self.pipeline.tts.synthesize_batch.call_args.args[0]), 1)
+        self.pipeline.stt.transcribe.assert_called_once()
+        self.pipeline.tts.synthesize.assert_not_called()
+        output, rate = sf.read(os.path.join(output_dir, "cutscene.wav"), dtype="float32")
+        self.assertEqual((rate, len(output)), (24000, 72000))
+        self.assertAlmostEqual(float(output[1000]), 0.1, places=4)
+        self.assertAlmostEqual(float(output[24000 + 1000]), 0.2, places=4)
+        self.assertAlmostEqual(float(output[48000 + 1000]), 0.3, places=4)
+        self.assertEqual(float(np.abs(output[3000:24000]).max()), 0.0)
+        metadata = self.pipeline.state.mark_completed.call_args.args[1]
+        self.assertEqual(metadata["translated_text"], "pt:Listen. pt:The gate is open. pt:Go!")
+        self.assertEqual([segment["start"] for segment in metadata["segments"]], [0.0, 1.0, 2.0])
+
+    def test_config_fingerprint_covers_options_that_change_the_dub(self):
+        """Tests that options changing the dub are part of the manifest fingerprint only while turned on."""
+        from src.core.speakers import SpeakerPlan
+
+        with patch("src.core.pipeline.config_fingerprint", side_effect=lambda config: config):
+            self.assertNotIn("segment_mode", self.pipeline.config_fingerprint())
+
+            self.pipeline.segment_mode = True
+            self.pipeline.dry_vo_threshold_db = -40.0
+            self.pipeline.speaker_plan = SpeakerPlan({"/in/a.wav": "hero"}, {"hero": "/in/a.wav"})
+            config = self.pipeline.config_fingerprint()
+
+        self.assertTrue(config["segment_mode"])
+        self.assertEqual(config["dry_vo_threshold_db"], -40.0)
+        self.assertEqual(config["speaker_references"], {"hero": "a.wav"})
+
+    def test_speaker_clips_clone_shared_reference(self):
+        """
+        Tests that clips of a planned speaker are all cloned from the representative clip's vocals
+        and transcript, prepared once, while clips without a speaker clone themselves.
+        """
+        from src.core.speakers import SpeakerPlan
+
+        reference = os.path.abspath("input/hero_ref.wav")
+        clips = [os.path.abspath("input/hero_1.wav"), os.path.abspath("input/hero_2.wav")]
+        self.pipeline.speaker_plan = SpeakerPlan(dict.fromkeys([*clips, reference], "hero"), {"hero": reference})
+        self.pipeline.dry_vo_threshold_db = -40.0
+        self.pipeline.processor.background_level.return_value = -60.0
+        buffers = {}
+        self.mock_read.side_effect = lambda path: buffers.setdefault(os.path.basename(path), MagicMock())
+        self.pipeline.stt.transcribe.side_effect = lambda audio: [
+            {"text": next(name for name, buffer in buffers.items() if buffer is audio)}
+        ]
+        self.pipeline.translator.translate.return_value = {"text": "Olá"}
+
+        for path in [*clips, "input/narrator.wav"]:
+            self.assertTrue(self.pipeline.process_file(path))
+
+        self.assertEqual(self.pipeline.stt.transcribe.call_count, 4)
+        references = [(call.args[1], call.kwargs["ref_text"]) for call in self.pipeline.tts.synthesize.call_args_list]
+        self.assertEqual(references[:2], [(buffers["hero_ref.wav"], "hero_ref.wav")] * 2)
+        self.assertEqual(references[2], (buffers["narrator.wav"], "narrator.wav"))
+        speakers = [call.args[1].get("speaker") for call in self.pipeline.state.mark_completed.call_args_list]
+        self.assertEqual(speakers, ["hero", "hero", None])
 
 
 if __name__ == "__main__":
@@ -1,6 +1,7 @@
 import numpy as np
 import pytest
 
+from src.models.model_registry import ModelRegistry
 from src.models.tts import TTSWrapper
 
 
@@ -8,12 +9,12 @@ from src.models.tts import TTSWrapper
 def tts_wrapper(mocker):
     # Mocking the heavy model loading for unit tests
     mocker.patch("qwen_tts.Qwen3TTSModel.from_pretrained")
-    return TTSWrapper()
+    return TTSWrapper(registry=ModelRegistry())
 
 
 def test_tts_wrapper_initialization(tts_wrapper):
     assert tts_wrapper.model_id == "Qwen/Qwen3-TTS-12Hz-1.7B-Base"
-    assert tts_wrapper._model is None
+    assert tts_wrapper.model_key not in tts_wrapper.registry
 
 
 def test_generate_dub_basic(tts_wrapper, tmp_path, mocker):
@@ -29,7 +30,7 @@ def test_generate_dub_basic(tts_wrapper, tmp_path, mocker):
     mock_model = mocker.Mock()
     # model.generate_voice_clone returns (wavs, sr)
     mock_model.generate_voice_clone.return_value = ([np.zeros(16000)], 24000)
-    tts_wrapper._model = mock_model
+    tts_wrapper.registry.put(tts_wrapper.model_key, mock_model)
 
     # Mock soundfile.write
     mock_sf_write = mocker.patch("soundfile.write")
@@ -0,0 +1,198 @@
+import http.client
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+
+import numpy as np
+import soundfile as sf
+
+from src.core.pipeline import ClipJob
+from src.core.state_manager import StateManager
+from src.interface.server import JobServer, make_http_server
+from src.models.model_registry import ModelRegistry
+
+
+class FakePipeline:
+    """Copies each file to the output and records it in the manifest; files named bad_* fail at TTS."""
+
+    def __init__(self, target_lang, output_dir):
+        self.target_lang = target_lang
+        self.output_dir = output_dir
+        self.state = StateManager(output_dir, target_lang)
+        self.models = ModelRegistry()
+        self.stt = MagicMock()
+        self.tts = MagicMock()
+        self.processed = []
+        self.closed = False
+
+    def process_clip(self, audio_path, force=False):
+        if not force and self.state.is_processed(audio_path):
+            return None
+        name = os.path.basename(audio_path)
+        self.processed.append(name)
+        if name.startswith("bad_"):
+            return ClipJob(audio_path, "", error="TTS synthesis failed", timings={"synthesize": 0.25})
+        output_path = os.path.join(self.output_dir, name)
+        shutil.copyfile(audio_path, output_path)
+        self.state.mark_completed(audio_path)
+        return ClipJob(audio_path, "", output_path=output_path, timings={"transcribe": 0.5, "synthesize": 1.0})
+
+    def close(self):
+        self.state.close()
+        self.closed = True
+
+
+class _UnixConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path):
+        super().__init__("localhost")
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+
+class TestJobServer(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.pipelines = {}
+
+        def factory(target_lang, output_dir):
+            self.pipelines[target_lang] = FakePipeline(target_lang, output_dir)
+            return self.pipelines[target_lang]
+
+        self.job_server = JobServer(os.path.join(self.temp_dir, "output"), factory)
+        self.http_server = None
+
+    def tearDown(self):
+        if self.http_server:
+            self.http_server.shutdown()
+            self.http_server.server_close()
+        self.job_server.stop()
+        shutil.rmtree(self.temp_dir)
+
+    def _clip(self, name):
+        """A clip of its own noise, so no two clips count as the same take."""
+        path = os.path.join(self.temp_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        sf.write(path, np.random.default_rng().uniform(-0.1, 0.1, 1600).astype(np.float32), 16000)
+        return path
+
+    def _run(self, files):
+        job = self.job_server.submit(files)
+        deadline = time.time() + 10
+        while job.status not in ("completed", "failed") and time.time() < deadline:
+            time.sleep(0.02)
+        return job
+
+    def _serve(self, **kwargs):
+        self.http_server = make_http_server(self.job_server, port=0, **kwargs)
+        threading.Thread(target=self.http_server.serve_forever, daemon=True).start()
+
+    def _request(self, connection, method, path, body=None):
+        connection.request(method, path, body=json.dumps(body) if body is not None else None)
+        response = connection.getresponse()
+        data = response.read()
+        if response.getheader("Content-Type") == "application/json":
+            data = json.loads(data)
+        return response.status, data
+
+    def _wait(self, connection, job_id):
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            status, job = self._request(connection, "GET", f"/jobs/{job_id}")
+            if job["status"] in ("completed", "failed"):
+                return job
+            time.sleep(0.02)
+        self.fail(f"Job {job_id} did not finish")
+
+    def test_submit_poll_and_fetch_over_http(self):
+        self.job_server.start(warmup=False)
+        self._serve()
+        connection = http.client.HTTPConnection("127.0.0.1", self.http_server.server_port)
+        line, bad = self._clip("line_01.wav"), self._clip("bad_02.wav")
+
+        status, job = self._request(connection, "POST", "/jobs", {"files": [line, bad], "target_lang": "German"})
+        self.assertEqual(status, 202)
+        job = self._wait(connection, job["id"])
+
+        self.assertEqual(job["status"], "failed")
+        first, second = job["files"]
+        self.assertEqual((first["status"], first["timings"]), ("completed", {"transcribe": 0.5, "synthesize": 1.0}))
+        self.assertEqual((second["status"], second["error"]), ("failed", "TTS synthesis failed"))
+        self.assertIsNotNone(job["timings"]["total"])
+        self.assertEqual(self.pipelines["German"].output_dir, os.path.join(self.temp_dir, "output", "german"))
+
+        status, data = self._request(connection, "GET", f"/jobs/{job['id']}/files/0")
+        self.assertEqual(status, 200)
+        with open(line, "rb") as f:
+            self.assertEqual(data, f.read())
+        self.assertEqual(self._request(connection, "GET", f"/jobs/{job['id']}/files/1")[0], 409)
+        self.assertEqual(self._request(connection, "GET", "/jobs/unknown")[0], 404)
+        status, error = self._request(connection, "POST", "/jobs", {"files": ["missing.wav"]})
+        self.assertEqual(status, 400)
+        self.assertIn("missing.wav", error["error"])
+        status, health = self._request(connection, "GET", "/health")
+        self.assertEqual((status, health["queued_files"]), (200, 0))
+
+    def test_higher_priority_files_go_first(self):
+        low = self.job_server.submit([self._clip(f"low_{i}.wav") for i in range(3)])
+        urgent = self.job_server.submit([self._clip("urgent.wav")], priority=10)
+
+        self.job_server.start(warmup=False)
+        deadline = time.time() + 10
+        while low.status != "completed" and time.time() < deadline:
+            time.sleep(0.02)
+
+        self.assertEqual(urgent.status, "completed")
+        self.assertEqual(self.pipelines["Portuguese"].processed, ["urgent.wav", "low_0.wav", "low_1.wav", "low_2.wav"])
+
+    def test_jobs_keep_their_own_outputs(self):
+        """
+        Tests that files of the same name in different jobs each get their own dub, and that a file
+        dubbed earlier gets its recorded output, or is dubbed again when that output is gone.
+        """
+        hero, guard = self._clip("hero/line.wav"), self._clip("guard/line.wav")
+        self.job_server.start(warmup=False)
+
+        first, second = self._run([hero]), self._run([guard])
+        again = self._run([hero])
+
+        outputs = [job.files[0].output_path for job in (first, second, again)]
+        self.assertEqual(len(set(outputs)), 3)
+        for output_path, source in zip(outputs, (hero, guard, hero)):
+            with open(output_path, "rb") as f, open(source, "rb") as expected:
+                self.assertEqual(f.read(), expected.read())
+        self.assertEqual(self.pipelines["Portuguese"].processed, ["line.wav", "line.wav"])
+
+        self.job_server._outputs.clear()
+        os.remove(os.path.join(self.temp_dir, "output", "portuguese", "line.wav"))
+        redubbed = self._run([guard])
+        self.assertEqual(redubbed.files[0].status, "completed")
+        self.assertTrue(os.path.exists(redubbed.files[0].output_path))
+        self.assertEqual(len(self.pipelines["Portuguese"].processed), 3)
+
+    def test_unix_socket(self):
+        socket_path = os.path.join(self.temp_dir, "dubber.sock")
+        self.job_server.start(warmup=False)
+        self._serve(socket_path=socket_path)
+        connection = _UnixConnection(socket_path)
+
+        status, job = self._request(connection, "POST", "/jobs", {"files": [self._clip("line.wav")]})
+        self.assertEqual(status, 202)
+        self.assertEqual(self._wait(connection, job["id"])["status"], "completed")
+
+    def test_stop_closes_pipelines(self):
+        self.job_server.start(warmup=True)
+        self.job_server.stop()
+        self.assertTrue(self.pipelines["Portuguese"].closed)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import soundfile as sf
+
+from src.core.speakers import SpeakerPlan, load_speaker_map, plan_speakers, speaker_embedding
+from src.utils.audio_io import AudioBuffer
+
+RATE = 16000
+
+# Pitch and formants (center, bandwidth) of three synthetic voices
+VOICES = {
+    "low": (110, [(700, 150), (1200, 200), (2500, 300)]),
+    "high": (210, [(400, 120), (2000, 250), (2900, 300)]),
+    "mid": (140, [(550, 150), (1700, 250), (2600, 300)]),
+}
+
+
+def _voice(name, seconds, seed):
+    """Harmonics of a wavering pitch shaped by the voice's formants, pulsed at syllable rate."""
+    f0, formants = VOICES[name]
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(RATE * seconds)) / RATE
+    pitch = f0 * (1 + 0.08 * np.sin(2 * np.pi * rng.uniform(0.3, 0.8) * t + rng.uniform(0, 6)))
+    phase = 2 * np.pi * np.cumsum(pitch) / RATE
+    samples = np.zeros_like(t)
+    for k in range(1, 40):
+        if k * f0 > 7000:
+            break
+        amplitude = sum(np.exp(-(((k * f0 - center) / width) ** 2)) for center, width in formants) + 0.02
+        samples += amplitude * np.sin(k * phase + rng.uniform(0, 6))
+    syllables = np.clip(np.sin(2 * np.pi * rng.uniform(3, 5) * t + rng.uniform(0, 6)), 0, None) ** 0.7
+    return (0.2 * samples * syllables / np.abs(samples).max()).astype(np.float32)
+
+
+class TestSpeakers(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _write(self, relative, samples):
+        path = os.path.join(self.temp_dir, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        sf.write(path, samples, RATE)
+        return os.path.abspath(path)
+
+    def test_embedding_needs_sound(self):
+        self.assertIsNone(speaker_embedding(AudioBuffer(np.zeros(RATE), RATE)))
+        self.assertEqual(speaker_embedding(AudioBuffer(_voice("low", 2, 0), RATE)).shape, (38,))
+
+    def test_clusters_clips_by_voice(self):
+        paths = {}
+        for name in VOICES:
+            for i, seconds in enumerate((4, 6, 2.5)):
+                paths[self._write(f"{name}_{i}.wav", _voice(name, seconds, i * 7 + len(name)))] = name
+        lone = self._write("lone.wav", np.zeros(RATE, dtype=np.float32))
+
+        plan = plan_speakers([*paths, lone], self.temp_dir)
+
+        self.assertEqual(len(plan.references), 3)
+        for name in VOICES:
+            speakers = {plan.speaker_of(path) for path, voice in paths.items() if voice == name}
+            self.assertEqual(len(speakers), 1)
+            speaker = speakers.pop()
+            # The representative is one of the speaker's own clips of a comfortable length
+            reference = plan.reference_of(speaker)
+            self.assertEqual(paths[reference], name)
+            self.assertFalse(reference.endswith("_2.wav"))
+        self.assertIsNone(plan.speaker_of(lone))
+
+    def test_speaker_map_assigns_without_clustering(self):
+        hero = [self._write(f"hero/line_{i}.wav", _voice("low", 4 + i, i)) for i in range(2)]
+        guard = self._write("guard_01.wav", _voice("high", 4, 3))
+        other = self._write("misc.wav", _voice("mid", 4, 4))
+        map_path = os.path.join(self.temp_dir, "speakers.json")
+        with open(map_path, "w") as f:
+            json.dump({"hero/*": "hero", "guard_*.wav": "guard"}, f)
+
+        plan = plan_speakers([*hero, guard, other], self.temp_dir, load_speaker_map(map_path), cluster=False)
+
+        self.assertEqual([plan.speaker_of(path) for path in hero], ["hero", "hero"])
+        self.assertEqual(plan.speaker_of(guard), "guard")
+        self.assertIsNone(plan.speaker_of(other))
+        self.assertIn(plan.reference_of("hero"), hero)
+        self.assertEqual(plan.reference_of("guard"), guard)
+
+    def test_invalid_speaker_map(self):
+        map_path = os.path.join(self.temp_dir, "speakers.json")
+        with open(map_path, "w") as f:
+            json.dump(["hero/*"], f)
+        with self.assertRaises(ValueError):
+            load_speaker_map(map_path)
+
+    def test_plan_round_trip(self):
+        plan = SpeakerPlan({"/clips/a.wav": "hero"}, {"hero": "/clips/a.wav"})
+        path = os.path.join(self.temp_dir, "plan.json")
+        plan.save(path)
+        self.assertEqual(SpeakerPlan.load(path), plan)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from src.core.stage_cache import StageCache
+
+
+class TestStageCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.root = os.path.join(self.temp_dir, "stages")
+        self.cache = StageCache(self.root, max_bytes=250)
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _file(self, name, size):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, "wb") as f:
+            f.write(b"x" * size)
+        return path
+
+    def test_key_depends_on_inputs_and_settings(self):
+        key = StageCache.make_key("denoise", "abc", "DeepFilterNet3")
+        self.assertEqual(key, StageCache.make_key("denoise", "abc", "DeepFilterNet3"))
+        self.assertNotEqual(key, StageCache.make_key("denoise", "abd", "DeepFilterNet3"))
+        self.assertNotEqual(key, StageCache.make_key("denoise", "abc", "DeepFilterNet2"))
+        self.assertNotEqual(key, StageCache.make_key("separate", "abc", "DeepFilterNet3"))
+
+    def test_files_and_json_round_trip(self):
+        self.assertIsNone(self.cache.get_files("k1"))
+        self.cache.put_files("separate", "k1", {"vocals.wav": self._file("v.wav", 10)})
+        cached = self.cache.get_files("k1")
+        self.assertEqual(list(cached), ["vocals.wav"])
+        self.assertEqual(os.path.getsize(cached["vocals.wav"]), 10)
+
+        self.cache.put_json("transcribe", "k2", [{"text": "Olá", "start": 0.0}])
+        self.assertEqual(self.cache.get_json("k2"), [{"text": "Olá", "start": 0.0}])
+
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["entries"]), (2, 1, 2))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        self.cache.put_files("synthesize", "old", {"dub.wav": self._file("a.wav", 100)})
+        self.cache.put_files("synthesize", "used", {"dub.wav": self._file("b.wav", 100)})
+        time.sleep(0.01)
+        self.assertIsNotNone(self.cache.get_files("old"))
+        self.cache.put_files("synthesize", "new", {"dub.wav": self._file("c.wav", 100)})
+
+        self.assertIsNone(self.cache.get_files("used"))
+        self.assertIsNotNone(self.cache.get_files("old"))
+        self.assertIsNotNone(self.cache.get_files("new"))
+        self.assertLessEqual(self.cache.size(), 250)
+
+    def test_hits_are_written_in_batches(self):
+        """Tests that hits update last-used times in one write per batch and on close."""
+        self.cache.close()
+        self.cache = StageCache(self.root, touch_batch=3)
+        for key in "abc":
+            self.cache.put_json("transcribe", key, [key])
+        self.cache._conn.execute("UPDATE entries SET last_used = 0")
+        self.cache._conn.commit()
+
+        def last_used():
+            connection = sqlite3.connect(os.path.join(self.root, "index.sqlite3"))
+            try:
+                return connection.execute("SELECT MIN(last_used) FROM entries").fetchone()[0]
+            finally:
+                connection.close()
+
+        self.cache.get_json("a")
+        self.cache.get_json("b")
+        self.assertEqual(last_used(), 0)
+        self.cache.get_json("c")
+        self.assertGreater(last_used(), 0)
+
+        self.cache._conn.execute("UPDATE entries SET last_used = 0 WHERE key = 'a'")
+        self.cache._conn.commit()
+        self.cache.get_json("a")
+        self.cache.close()
+        self.assertGreater(last_used(), 0)
+        self.cache = StageCache(self.root)
+
+    def test_prune_to_smaller_budget_and_orphans(self):
+        """Tests that prune shrinks the cache and drops directories the index does not know."""
+        self.cache.put_files("synthesize", "a", {"dub.wav": self._file("a.wav", 100)})
+        self.cache.put_files("synthesize", "b", {"dub.wav": self._file("b.wav", 100)})
+        orphan = os.path.join(self.root, "zz", "zz-orphan")
+        os.makedirs(orphan)
+
+        result = self.cache.prune(max_bytes=150)
+
+        self.assertEqual(result, {"removed": 2, "freed_bytes": 100})
+        self.assertFalse(os.path.exists(orphan))
+        self.assertEqual(self.cache.stats()["entries"], 1)
+
+    def test_deleted_entry_is_a_miss(self):
+        self.cache.put_json("transcribe", "k", ["segment"])
+        shutil.rmtree(os.path.join(self.root, "k", "k"))
+        self.assertIsNone(self.cache.get_json("k"))
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+    def test_entry_evicted_during_get_files_is_a_miss(self):
+        """Tests that an entry removed by another process right after its lookup is treated as a miss."""
+        self.cache.put_files("separate", "k", {"vocals.wav": self._file("vocals.wav", 10)})
+        with patch("src.core.stage_cache.os.listdir", side_effect=FileNotFoundError("gone")):
+            self.assertIsNone(self.cache.get_files("k"))
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (0, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import threading
+import time
+import unittest
+
+from src.core.stage_runner import Stage, run_stages
+
+
+class Item:
+    def __init__(self, value):
+        self.value = value
+        self.seen = []
+
+
+class TestStageRunner(unittest.TestCase):
+    def test_items_pass_through_every_stage(self):
+        """Tests that each item is handled by every stage in order."""
+
+        def add(name):
+            return lambda item: item.seen.append(name)
+
+        stages = [Stage("a", add("a")), Stage("b", add("b"), workers=3), Stage("c", add("c"))]
+        results = list(run_stages((Item(i) for i in range(20)), stages, queue_size=2))
+
+        self.assertEqual(sorted(item.value for item in results), list(range(20)))
+        for item in results:
+            self.assertEqual(item.seen, ["a", "b", "c"])
+
+    def test_stages_overlap(self):
+        """Tests that two slow stages work on different items at the same time."""
+        active = set()
+        overlap = threading.Event()
+        lock = threading.Lock()
+
+        def slow(name):
+            def fn(item):
+                with lock:
+                    active.add(name)
+                    if len(active) > 1:
+                        overlap.set()
+                time.sleep(0.02)
+                with lock:
+                    active.discard(name)
+
+            return fn
+
+        list(run_stages((Item(i) for i in range(6)), [Stage("first", slow("first")), Stage("second", slow("second"))]))
+        self.assertTrue(overlap.is_set())
+
+    def test_raising_stage_does_not_stop_the_run(self):
+        """Tests that an exception in a stage function is logged and the item still comes out."""
+
+        def explode(item):
+            if item.value == 1:
+                raise ValueError("boom")
+
+        with self.assertLogs("src.core.stage_runner", level="ERROR"):
+            results = list(run_stages((Item(i) for i in range(3)), [Stage("explode", explode)]))
+        self.assertEqual(len(results), 3)
+
+    def test_batched_stage_receives_lists(self):
+        """Tests that a batched stage gets lists of queued items and every item still comes out once."""
+        sizes = []
+        release = threading.Event()
+
+        def gate(item):
+            # Hold the first item so the rest pile up in front of the batched stage
+            if item.value == 0:
+                release.wait(timeout=1)
+
+        def batched(items):
+            sizes.append(len(items))
+            for item in items:
+                item.seen.append("batched")
+
+        threading.Timer(0.05, release.set).start()
+        stages = [Stage("gate", gate), Stage("batched", batched, batch_size=4)]
+        results = list(run_stages((Item(i) for i in range(9)), stages, queue_size=8))
+
+        self.assertEqual(sorted(item.value for item in results), list(range(9)))
+        self.assertTrue(all(item.seen == ["batched"] for item in results))
+        self.assertEqual(sum(sizes), 9)
+        self.assertLessEqual(max(sizes), 4)
+
+    def test_batch_is_not_capped_by_queue_size(self):
+        """Tests that a batched stage's queue makes room for a full batch even with a small queue size."""
+        sizes = []
+
+        def batched(items):
+            # While the first call is busy, the rest of the input piles up in front of the stage
+            if not sizes:
+                time.sleep(0.2)
+            sizes.append(len(items))
+
+        stages = [Stage("pass", lambda item: None), Stage("batched", batched, batch_size=8)]
+        results = list(run_stages((Item(i) for i in range(17)), stages, queue_size=2))
+
+        self.assertEqual(len(results), 17)
+        self.assertEqual(sum(sizes), 17)
+        self.assertEqual(max(sizes), 8)
+
+    def test_empty_input(self):
+        self.assertEqual(list(run_stages([], [Stage("noop", lambda item: None, workers=2)])), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,220 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from src.core.state_manager import StateManager, config_fingerprint
+
+
+class TestStateManager(unittest.TestCase):
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.manifest_path = os.path.join(self.output_dir, "manifest.json")
+        self.journal_path = os.path.join(self.output_dir, "manifest.journal")
+        self.input_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+        shutil.rmtree(self.input_dir, ignore_errors=True)
+
+    def _write(self, name, data=None):
+        path = os.path.join(self.input_dir, name)
+        with open(path, "wb") as f:
+            f.write(data if data is not None else name.encode("utf-8"))
+        return path
+
+    def test_updates_append_to_journal(self):
+        """Tests that marking files appends journal lines and does not rewrite manifest.json."""
+        a, b = self._write("a.wav"), self._write("b.wav")
+        manager = StateManager(self.output_dir)
+        manager.mark_completed(a, {"original_text": "Hi"})
+        manager.mark_failed(b, "TTS synthesis failed")
+
+        self.assertFalse(os.path.exists(self.manifest_path))
+        with open(self.journal_path, encoding="utf-8") as f:
+            self.assertEqual(len(f.readlines()), 2)
+
+        reloaded = StateManager(self.output_dir)
+        self.assertTrue(reloaded.is_processed(a))
+        self.assertFalse(reloaded.is_processed(b))
+        self.assertEqual(reloaded.state[reloaded.key_for(b)]["error"], "TTS synthesis failed")
+
+    def test_compaction_writes_snapshot_and_empties_journal(self):
+        manager = StateManager(self.output_dir, compact_every=3)
+        for name in ["a.wav", "b.wav", "c.wav", "d.wav"]:
+            manager.mark_completed(self._write(name))
+
+        with open(self.manifest_path, encoding="utf-8") as f:
+            self.assertEqual(len(json.load(f)), 3)
+        with open(self.journal_path, encoding="utf-8") as f:
+            self.assertEqual(len(f.readlines()), 1)
+
+        manager.close()
+        with open(self.manifest_path, encoding="utf-8") as f:
+            self.assertEqual(len(json.load(f)), 4)
+        self.assertEqual(os.path.getsize(self.journal_path), 0)
+        self.assertEqual(len(StateManager(self.output_dir).state), 4)
+
+    def test_close_leaves_a_journal_it_only_replayed(self):
+        """Tests that a manager compacts on close only what it wrote, and that a read-only one never writes."""
+        writer = StateManager(self.output_dir)
+        writer.mark_completed(self._write("a.wav"))
+
+        StateManager(self.output_dir).close()
+        reader = StateManager(self.output_dir, read_only=True)
+        reader.mark_completed(self._write("b.wav"))
+        reader.close()
+
+        self.assertFalse(os.path.exists(self.manifest_path))
+        with open(self.journal_path, encoding="utf-8") as f:
+            self.assertEqual(len(f.readlines()), 1)
+        self.assertTrue(reader.is_processed(os.path.join(self.input_dir, "b.wav")))
+
+    def test_imports_existing_manifest(self):
+        """Tests that path-keyed entries from older versions still count while the file is unchanged."""
+        old_path = self._write("old.wav")
+        edited_path = self._write("edited.wav")
+        legacy_time = (datetime.now() + timedelta(seconds=5)).isoformat()
+        with open(self.manifest_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    os.path.relpath(old_path): {"status": "completed", "timestamp": legacy_time},
+                    os.path.relpath(edited_path): {"status": "completed", "timestamp": "2020-01-01T00:00:00"},
+                },
+                f,
+                indent=4,
+            )
+
+        manager = StateManager(self.output_dir)
+        self.assertTrue(manager.is_processed(old_path))
+        self.assertFalse(manager.is_processed(edited_path))
+        manager.mark_completed(self._write("new.wav"))
+        manager.close()
+
+        with open(self.manifest_path, encoding="utf-8") as f:
+            self.assertEqual(len(json.load(f)), 3)
+
+    def test_truncated_journal_line_is_skipped(self):
+        a = self._write("a.wav")
+        manager = StateManager(self.output_dir)
+        manager.mark_completed(a)
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.write('{"key": "b.wav", "entry": {"sta')
+
+        with self.assertLogs("src.core.state_manager", level="WARNING"):
+            reloaded = StateManager(self.output_dir)
+        self.assertTrue(reloaded.is_processed(a))
+        self.assertNotIn("b.wav", reloaded.state)
+
+    def test_record_after_truncated_journal_line_survives(self):
+        """Tests that the first update after a torn journal line is not appended onto it."""
+        a, b = self._write("a.wav"), self._write("b.wav")
+        manager = StateManager(self.output_dir)
+        manager.mark_completed(a)
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.write('{"key": "c.wav", "entry": {"sta')
+
+        with self.assertLogs("src.core.state_manager", level="WARNING"):
+            resumed = StateManager(self.output_dir)
+        resumed.mark_completed(b)
+
+        reloaded = StateManager(self.output_dir)
+        self.assertTrue(reloaded.is_processed(a))
+        self.assertTrue(reloaded.is_processed(b))
+
+    def test_corrupt_manifest_is_kept_aside(self):
+        """Tests that an unreadable manifest is preserved rather than silently discarded."""
+        with open(self.manifest_path, "w", encoding="utf-8") as f:
+            f.write('{"a.wav": {"status": "comp')
+
+        with self.assertLogs("src.core.state_manager", level="ERROR"):
+            manager = StateManager(self.output_dir)
+
+        self.assertEqual(manager.state, {})
+        backups = [name for name in os.listdir(self.output_dir) if name.startswith("manifest.json.corrupt-")]
+        self.assertEqual(len(backups), 1)
+
+    def test_moved_file_is_still_processed(self):
+        """Tests that resumes survive renaming files and running from another directory."""
+        original = self._write("take.wav", b"RIFF take one")
+        manager = StateManager(self.output_dir, "cfg")
+        manager.mark_completed(original)
+        manager.close()
+        with open(os.path.join(self.output_dir, "take.wav"), "wb") as f:
+            f.write(b"RIFF dubbed")
+
+        moved = os.path.join(self.input_dir, "renamed.wav")
+        os.rename(original, moved)
+        cwd = os.getcwd()
+        try:
+            os.chdir(self.output_dir)
+            self.assertTrue(StateManager(self.output_dir, "cfg").is_processed(moved))
+        finally:
+            os.chdir(cwd)
+        with open(os.path.join(self.output_dir, "renamed.wav"), "rb") as f:
+            self.assertEqual(f.read(), b"RIFF dubbed")
+
+    def test_identical_file_under_another_name_gets_its_own_output(self):
+        """Tests that a duplicate take is given a copy of the recorded output, or re-dubbed when that is gone."""
+        first = self._write("bark_01.wav", b"RIFF bark")
+        manager = StateManager(self.output_dir, "cfg")
+        manager.mark_completed(first)
+        duplicate = self._write("bark_02.wav", b"RIFF bark")
+        self.assertFalse(manager.is_processed(duplicate))
+
+        with open(os.path.join(self.output_dir, "bark_01.wav"), "wb") as f:
+            f.write(b"RIFF dubbed bark")
+        self.assertTrue(manager.is_processed(duplicate))
+        with open(os.path.join(self.output_dir, "bark_02.wav"), "rb") as f:
+            self.assertEqual(f.read(), b"RIFF dubbed bark")
+        manager.close()
+
+        entry = StateManager(self.output_dir, "cfg").state[manager.key_for(first)]
+        self.assertEqual(entry["outputs"], ["bark_01.wav", "bark_02.wav"])
+
+    def test_new_take_or_config_is_not_processed(self):
+        """Tests that overwriting a file or changing the pipeline config invalidates its entry."""
+        path = self._write("take.wav", b"RIFF take one")
+        manager = StateManager(self.output_dir, config_fingerprint({"target_lang": "Portuguese"}))
+        manager.mark_completed(path)
+        self.assertTrue(manager.is_processed(path))
+
+        spanish = StateManager(self.output_dir, config_fingerprint({"target_lang": "Spanish"}))
+        self.assertFalse(spanish.is_processed(path))
+
+        time.sleep(0.01)
+        self._write("take.wav", b"RIFF take two")
+        self.assertFalse(manager.is_processed(path))
+
+    def test_unchanged_files_are_not_rehashed(self):
+        """Tests that size and mtime matching the manifest skip reading the file."""
+        path = self._write("a.wav")
+        manager = StateManager(self.output_dir)
+        manager.mark_completed(path)
+        manager.close()
+
+        reloaded = StateManager(self.output_dir)
+        with patch("src.core.state_manager.hash_file") as mock_hash:
+            self.assertTrue(reloaded.is_processed(path))
+        mock_hash.assert_not_called()
+
+    def test_skipped_files_count_as_processed_when_asked(self):
+        """Tests that skipped entries are kept with their reason and honoured only while "skipped" is a done status."""
+        path = self._write("theme.wav")
+        manager = StateManager(self.output_dir)
+        manager.mark_skipped(path, "Classified as music", {"classification": {"label": "music"}})
+        manager.close()
+
+        self.assertTrue(StateManager(self.output_dir).is_processed(path))
+        self.assertFalse(StateManager(self.output_dir, done_statuses=("completed",)).is_processed(path))
+        (entry,) = StateManager(self.output_dir).entries("skipped")
+        self.assertEqual(entry["reason"], "Classified as music")
+        self.assertEqual(entry["metadata"]["classification"]["label"], "music")
+
+
+if __name__ == "__main__":
+    unittest.main()
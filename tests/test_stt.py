@@ -2,6 +2,10 @@ import sys
 import unittest
 from unittest.mock import MagicMock, patch
 
+import numpy as np
+
+from src.utils.audio_io import AudioBuffer
+
 # Mock dependencies before importing the module under test
 # This allows running tests without installing heavy ML libraries
 # Removed global sys.modules patching
@@ -23,9 +27,10 @@ class TestFasterWhisperTranscriber(unittest.TestCase):
 
         if "src.models.stt" in sys.modules:
             del sys.modules["src.models.stt"]
+        from src.models.model_registry import ModelRegistry
         from src.models.stt import FasterWhisperTranscriber
 
-        self.transcriber = FasterWhisperTranscriber(device="cpu")
+        self.transcriber = FasterWhisperTranscriber(device="cpu", registry=ModelRegistry())
 
     def tearDown(self):
         self.modules_patcher.stop()
@@ -34,7 +39,7 @@ class TestFasterWhisperTranscriber(unittest.TestCase):
 
     def test_initialization(self):
         self.assertEqual(self.transcriber.device, "cpu")
-        self.assertIsNone(self.transcriber._model)
+        self.assertNotIn(self.transcriber.model_key, self.transcriber.registry)
 
     def test_lazy_loading(self):
         # We need to inject our mock into the class's global scope or mock where it's used
@@ -64,7 +69,7 @@ class TestFasterWhisperTranscriber(unittest.TestCase):
         mock_model_instance.transcribe.return_value = ([mock_segment], None)
 
         # Inject the mock model into the transcriber
-        self.transcriber._model = mock_model_instance
+        self.transcriber.registry.put(self.transcriber.model_key, mock_model_instance)
 
         with patch("os.path.exists", return_value=True):
             result = self.transcriber.transcribe("test_audio.wav")
@@ -76,11 +81,74 @@ class TestFasterWhisperTranscriber(unittest.TestCase):
 
         mock_model_instance.transcribe.assert_called_with("test_audio.wav", beam_size=5, language="en", vad_filter=True)
 
+    def test_transcribe_buffer_skips_decoding(self):
+        """Tests that an in-memory buffer reaches the model as 16 kHz mono float32 samples."""
+        mock_model_instance = MagicMock()
+        mock_model_instance.transcribe.return_value = ([], None)
+        self.transcriber.registry.put(self.transcriber.model_key, mock_model_instance)
+
+        stereo_48k = AudioBuffer(np.zeros((48000, 2), dtype=np.float32), 48000)
+        self.transcriber.transcribe(stereo_48k)
+
+        audio = mock_model_instance.transcribe.call_args.args[0]
+        self.assertEqual(audio.shape, (16000,))
+        self.assertEqual(audio.dtype, np.float32)
+
     def test_transcribe_file_not_found(self):
         with patch("os.path.exists", return_value=False):
             with self.assertRaises(FileNotFoundError):
                 self.transcriber.transcribe("nonexistent.wav")
 
+    def test_transcribe_batch_packs_clips(self):
+        """
+        Tests that short clips go to the batched pipeline in one call, one item per clip's speech,
+        and that segments come back per clip with clip-relative times.
+        """
+        from src.models import stt
+
+        def segment(start, end, text):
+            return MagicMock(start=start, end=end, text=f" {text}")
+
+        batched = MagicMock()
+        # Clips are 1 s and 2 s long; speech starts 0.25 s into each
+        batched.transcribe.return_value = ([segment(0.25, 1.0, "Halt!"), segment(1.249, 3.0, "Who goes there?")], None)
+        self.transcriber.batch_size = 4
+        speech = {16000: [{"start": 4000, "end": 16000}], 32000: [{"start": 4000, "end": 32000}], 8000: []}
+
+        clips = [AudioBuffer(np.zeros(n, dtype=np.float32), 16000) for n in (16000, 8000, 32000)]
+        with (
+            patch.object(stt, "get_speech_timestamps", side_effect=lambda samples, options: speech[len(samples)]),
+            patch.object(stt, "VadOptions"),
+            patch.object(stt, "BatchedInferencePipeline", return_value=batched),
+        ):
+            result = self.transcriber.transcribe_batch(clips)
+
+        self.assertEqual(
+            result,
+            [
+                [{"start": 0.25, "end": 1.0, "text": "Halt!"}],
+                [],
+                [{"start": 0.249, "end": 2.0, "text": "Who goes there?"}],
+            ],
+        )
+        audio = batched.transcribe.call_args.args[0]
+        self.assertEqual(audio.shape, (48000,))
+        kwargs = batched.transcribe.call_args.kwargs
+        self.assertEqual(kwargs["clip_timestamps"], [{"start": 0.25, "end": 1.0}, {"start": 1.25, "end": 3.0}])
+        self.assertEqual((kwargs["batch_size"], kwargs["beam_size"], kwargs["vad_filter"]), (4, 5, False))
+
+    def test_transcribe_batch_long_clip_goes_alone(self):
+        from src.models import stt
+
+        self.transcriber.transcribe = MagicMock(return_value=[{"start": 0.0, "end": 40.0, "text": "Long"}])
+
+        long_clip = AudioBuffer(np.zeros(16000 * 40, dtype=np.float32), 16000)
+        with patch.object(stt, "BatchedInferencePipeline") as batched:
+            result = self.transcriber.transcribe_batch([long_clip])
+
+        self.assertEqual(result, [[{"start": 0.0, "end": 40.0, "text": "Long"}]])
+        batched.assert_not_called()
+
 
 if __name__ == "__main__":
     unittest.main()
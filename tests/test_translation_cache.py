@@ -0,0 +1,84 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from src.utils.translation_cache import TranslationCache, normalize_text
+
+
+class TestTranslationCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "cache", "translations.sqlite3")
+        self.cache = TranslationCache(self.path, max_entries=2)
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_key_normalizes_whitespace_only(self):
+        self.assertEqual(normalize_text("  Over   here!\n"), "Over here!")
+        key = TranslationCache.make_key("Over  here!", "Portuguese", "llama3.1", "v1")
+        self.assertEqual(key, TranslationCache.make_key("Over here! ", "portuguese", "llama3.1", "v1"))
+        self.assertNotEqual(key, TranslationCache.make_key("over here!", "Portuguese", "llama3.1", "v1"))
+        self.assertNotEqual(key, TranslationCache.make_key("Over here!", "Portuguese", "qwen3", "v1"))
+        self.assertNotEqual(key, TranslationCache.make_key("Over here!", "Portuguese", "llama3.1", "v2"))
+
+    def test_round_trip_and_counters(self):
+        result = {"text": "Por aqui!", "tts_instruction": "accent", "target_language": "portuguese"}
+        self.assertIsNone(self.cache.get("a"))
+        self.cache.put("a", result)
+        self.assertEqual(self.cache.get("a"), result)
+        self.assertEqual(self.cache.stats(), {"hits": 1, "misses": 1, "entries": 1})
+
+    def test_persists_across_instances(self):
+        self.cache.put("a", {"text": "x"})
+        self.cache.close()
+        self.cache = TranslationCache(self.path)
+        self.assertEqual(self.cache.get("a"), {"text": "x"})
+
+    def test_evicts_least_recently_used(self):
+        self.cache.put("a", {"text": "a"})
+        self.cache.put("b", {"text": "b"})
+        # Touch "a" so "b" becomes the oldest
+        self.cache._conn.execute("UPDATE translations SET last_used = last_used - 10 WHERE key = 'b'")
+        self.cache.get("a")
+        self.cache.put("c", {"text": "c"})
+
+        self.assertEqual(len(self.cache), 2)
+        self.assertIsNone(self.cache.get("b"))
+        self.assertIsNotNone(self.cache.get("a"))
+
+    def test_hits_are_written_in_batches(self):
+        """Tests that hits update last-used times in one write per batch and on close."""
+        self.cache.close()
+        self.cache = TranslationCache(self.path, touch_batch=3)
+        for key in "abc":
+            self.cache.put(key, {"text": key})
+        self.cache._conn.execute("UPDATE translations SET last_used = 0")
+        self.cache._conn.commit()
+
+        def last_used():
+            connection = sqlite3.connect(self.path)
+            try:
+                return connection.execute("SELECT MIN(last_used) FROM translations").fetchone()[0]
+            finally:
+                connection.close()
+
+        self.cache.get("a")
+        self.cache.get("b")
+        self.assertEqual(last_used(), 0)
+        self.cache.get("c")
+        self.assertGreater(last_used(), 0)
+
+        self.cache._conn.execute("UPDATE translations SET last_used = 0 WHERE key = 'a'")
+        self.cache._conn.commit()
+        self.cache.get("a")
+        self.cache.close()
+        self.assertGreater(last_used(), 0)
+        self.cache = TranslationCache(self.path)
+
+
+if __name__ == "__main__":
+    unittest.main()
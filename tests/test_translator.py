@@ -8,7 +8,7 @@ class TestOllamaTranslator(unittest.TestCase):
     def setUp(self):
         self.translator = OllamaTranslator()
 
-    @patch("requests.post")
+    @patch("requests.Session.post")
     def test_translate_uses_delimiters(self, mock_post):
         # Mock response from requests
         mock_response = MagicMock()
@@ -31,6 +31,95 @@ class TestOllamaTranslator(unittest.TestCase):
         self.assertIn(text, prompt)
         self.assertIn("Spanish", prompt)
 
+    def _mock_response(self, text):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {"response": text}
+        return mock_response
+
+    @patch("requests.Session.post")
+    def test_translate_batch_single_request(self, mock_post):
+        """Tests that several lines are translated with one request and mapped back by id."""
+        mock_post.return_value = self._mock_response(
+            '{"translations": ['
+            '{"id": 1, "text": "Recarregando!", "tts_instruction": "accent", "target_language": "Portuguese"},'
+            '{"id": 0, "text": "Por aqui!", "tts_instruction": "accent", "target_language": "portuguese"}]}'
+        )
+
+        results = self.translator.translate_batch(["Over here!", "Reloading!"], "Portuguese")
+
+        self.assertEqual(mock_post.call_count, 1)
+        self.assertEqual([r["text"] for r in results], ["Por aqui!", "Recarregando!"])
+        self.assertEqual(results[1]["target_language"], "portuguese")
+        prompt = mock_post.call_args.kwargs["json"]["prompt"]
+        self.assertIn("Over here!", prompt)
+        self.assertIn("Reloading!", prompt)
+
+    @patch("requests.Session.post")
+    def test_translate_batch_falls_back_per_item(self, mock_post):
+        """Tests that lines missing from a short batch answer are translated individually."""
+        mock_post.side_effect = [
+            self._mock_response('[{"id": 0, "text": "Por aqui!"}]'),
+            self._mock_response('{"text": "Recarregando!", "tts_instruction": "", "target_language": "portuguese"}'),
+        ]
+
+        results = self.translator.translate_batch(["Over here!", "Reloading!", "  "], "Portuguese")
+
+        self.assertEqual(mock_post.call_count, 2)
+        self.assertEqual([r["text"] for r in results], ["Por aqui!", "Recarregando!", ""])
+        self.assertIn("Reloading!", mock_post.call_args.kwargs["json"]["prompt"])
+
+    @patch("requests.Session.post")
+    def test_translate_batch_malformed_response(self, mock_post):
+        """Tests that an unparseable batch answer falls back to one request per line."""
+        mock_post.side_effect = [
+            self._mock_response("not json"),
+            self._mock_response('{"text": "Um"}'),
+            self._mock_response('{"text": "Dois"}'),
+        ]
+
+        results = self.translator.translate_batch(["One", "Two"], "Portuguese")
+
+        self.assertEqual(mock_post.call_count, 3)
+        self.assertEqual([r["text"] for r in results], ["Um", "Dois"])
+
+    @patch("requests.Session.post")
+    def test_cache_hits_skip_the_request(self, mock_post):
+        """Tests that successful translations are cached and later lookups never reach Ollama."""
+        import shutil
+        import tempfile
+
+        from src.utils.translation_cache import TranslationCache
+
+        temp_dir = tempfile.mkdtemp()
+        cache = TranslationCache(f"{temp_dir}/translations.sqlite3")
+        translator = OllamaTranslator(cache=cache)
+        try:
+            mock_post.return_value = self._mock_response('{"text": "Recarregando!", "target_language": "portuguese"}')
+            first = translator.translate("Reloading!", "Portuguese")
+            second = translator.translate("Reloading! ", "Portuguese")
+            batch = translator.translate_batch(["Reloading!", "Reloading!"], "Portuguese")
+        finally:
+            cache.close()
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+        self.assertEqual(mock_post.call_count, 1)
+        self.assertEqual(first, second)
+        self.assertEqual([r["text"] for r in batch], ["Recarregando!", "Recarregando!"])
+
+    @patch("requests.Session.post")
+    def test_fallbacks_are_not_cached(self, mock_post):
+        """Tests that an empty answer (original text returned) is not stored."""
+        cache = MagicMock()
+        cache.get.return_value = None
+        translator = OllamaTranslator(cache=cache)
+        mock_post.return_value = self._mock_response("")
+
+        result = translator.translate("Reloading!", "Portuguese")
+
+        self.assertEqual(result["text"], "Reloading!")
+        cache.put.assert_not_called()
+
 
 if __name__ == "__main__":
     unittest.main()
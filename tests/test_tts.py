@@ -1,5 +1,6 @@
 import unittest
 
+from src.models.model_registry import ModelRegistry
 from src.models.tts import TTSWrapper
 
 
@@ -20,14 +21,13 @@ class TestTTSWrapper(unittest.TestCase):
         self.patchers = [
             patch("src.models.tts.Qwen3TTSModel", self.mock_qwen),
             patch("src.models.tts.torch", MagicMock()),
-            patch("src.models.tts.torchaudio", MagicMock()),
             patch("src.models.tts.sf", MagicMock()),
             patch("src.models.tts.os.path.exists", side_effect=exists_side_effect),
         ]
         for p in self.patchers:
             p.start()
 
-        self.tts = TTSWrapper()
+        self.tts = TTSWrapper(registry=ModelRegistry())
         self.ref_path = "test_ref.wav"
         self.output_path = "test_gen.wav"
 
@@ -51,6 +51,24 @@ class TestTTSWrapper(unittest.TestCase):
         self.assertEqual(result, self.output_path)
         self.mock_model_instance.generate_voice_clone.assert_called_once()
 
+    def test_synthesize_in_memory(self):
+        """Tests that synthesize takes a buffer reference and returns the dub without writing it."""
+        import numpy as np
+
+        from src.models import tts
+        from src.utils.audio_io import AudioBuffer
+
+        self.mock_model_instance.generate_voice_clone.return_value = ([np.zeros(2400, dtype=np.float32)], 24000)
+        ref = AudioBuffer(np.zeros((16000, 2), dtype=np.float32), 16000)
+
+        dub = self.tts.synthesize("Olá", ref, ref_text="Hello")
+
+        self.assertEqual((dub.frames, dub.sample_rate), (2400, 24000))
+        ref_audio = self.mock_model_instance.create_voice_clone_prompt.call_args.kwargs["ref_audio"]
+        self.assertEqual(ref_audio[0].shape, (16000,))
+        self.assertEqual(ref_audio[1], 16000)
+        tts.sf.write.assert_not_called()
+
     def test_generate_dub_missing_ref(self):
         """Tests that generate_dub returns None if reference path is missing."""
         result = self.tts.generate_dub("text", "non_existent.wav", self.output_path)
@@ -61,6 +79,118 @@ class TestTTSWrapper(unittest.TestCase):
         result = self.tts.generate_dub("", self.ref_path, self.output_path)
         self.assertIsNone(result)
 
+    def _batch_model(self, fail=None):
+        """Model whose generate_voice_clone returns one waveform per text, or raises `fail(batch_size)`."""
+        import numpy as np
+
+        def generate(text, **kwargs):
+            error = fail(len(text)) if fail else None
+            if error:
+                raise error
+            return [np.full(100, len(t), dtype=np.float32) for t in text], 24000
+
+        self.mock_model_instance.generate_voice_clone.side_effect = generate
+        return self.mock_model_instance.generate_voice_clone
+
+    def test_synthesize_batch_buckets_by_length_and_mode(self):
+        """Tests that similar-length lines share a call and keep their order in the results."""
+        from src.models.tts import TTSRequest
+
+        generate = self._batch_model()
+        texts = ["Hi", "Yo", "Go!", "A much longer line of dialogue", "Another long line of dialogue!"]
+        requests = [TTSRequest(text, self.ref_path, ref_text="ref") for text in texts]
+        requests.append(TTSRequest("No transcript", self.ref_path))
+
+        dubs = self.tts.synthesize_batch(requests)
+
+        self.assertEqual([dub.samples[0, 0] for dub in dubs], [len(text) for text in texts] + [13])
+        batches = sorted(call.kwargs["text"] for call in generate.call_args_list)
+        self.assertEqual(
+            batches,
+            [
+                ["A much longer line of dialogue", "Another long line of dialogue!"],
+                ["Hi", "Yo", "Go!"],
+                ["No transcript"],
+            ],
+        )
+        prompt_modes = [
+            call.kwargs["x_vector_only_mode"]
+            for call in self.mock_model_instance.create_voice_clone_prompt.call_args_list
+        ]
+        self.assertEqual(sorted(prompt_modes), [False] * 5 + [True])
+
+    def test_synthesize_batch_splits_on_out_of_memory(self):
+        """Tests that a batch that runs out of memory is halved and later batches stay small."""
+        from src.models.tts import TTSRequest
+
+        generate = self._batch_model(lambda size: RuntimeError("CUDA out of memory") if size > 2 else None)
+        requests = [TTSRequest(f"Line {i}", self.ref_path, ref_text="ref") for i in range(6)]
+
+        dubs = self.tts.synthesize_batch(requests)
+
+        self.assertTrue(all(dub is not None for dub in dubs))
+        self.assertEqual(self.tts.max_batch_size, 2)
+        sizes = [len(call.kwargs["text"]) for call in generate.call_args_list]
+        self.assertEqual(sizes, [6, 3, 2, 1, 2, 1])
+
+    def test_failed_batch_retries_lines_alone(self):
+        """Tests that a line the model rejects fails on its own, and missing references are skipped."""
+        from src.models.tts import TTSRequest
+
+        def fail(size):
+            return ValueError("bad token") if size > 1 else None
+
+        self._batch_model(fail)
+        requests = [
+            TTSRequest("One", self.ref_path, ref_text="ref"),
+            TTSRequest("Two", self.ref_path, ref_text="ref"),
+            TTSRequest("Three", "non_existent.wav", ref_text="ref"),
+            TTSRequest("   ", self.ref_path, ref_text="ref"),
+        ]
+
+        dubs = self.tts.synthesize_batch(requests)
+
+        self.assertEqual([dub is not None for dub in dubs], [True, True, False, False])
+        self.assertEqual(self.tts.max_batch_size, 8)
+
+    def test_generate_dub_batch_writes_each_output(self):
+        """Tests that every successful dub is written to its own file."""
+        from src.models import tts
+        from src.models.tts import TTSRequest
+
+        self._batch_model()
+        requests = [
+            TTSRequest("One", self.ref_path, ref_text="ref", output_path="one.wav"),
+            TTSRequest("", self.ref_path, ref_text="ref", output_path="empty.wav"),
+        ]
+
+        self.assertEqual(self.tts.generate_dub_batch(requests), ["one.wav", None])
+        tts.sf.write.assert_called_once()
+        self.assertEqual(tts.sf.write.call_args.args[0], "one.wav")
+
+    def test_voice_prompt_is_computed_once_per_voice(self):
+        """Tests that lines in the same voice reuse one clone prompt, in single and batched synthesis."""
+        import numpy as np
+
+        from src.models.tts import TTSRequest
+        from src.utils.audio_io import AudioBuffer
+
+        self._batch_model()
+        voice = AudioBuffer(np.linspace(-1, 1, 1600), 16000)
+        other = AudioBuffer(np.linspace(1, -1, 1600), 16000)
+
+        self.tts.synthesize("One", voice, ref_text="Hello")
+        self.tts.synthesize("Two", voice, ref_text="Hello")
+        self.tts.synthesize_batch(
+            [TTSRequest("Three", voice, ref_text="Hello"), TTSRequest("Four", other, ref_text="Hello")]
+        )
+
+        self.assertEqual(self.mock_model_instance.create_voice_clone_prompt.call_count, 2)
+        batch = self.mock_model_instance.generate_voice_clone.call_args.kwargs
+        self.assertEqual(len(batch["voice_clone_prompt"]), 2)
+        self.assertNotIn("ref_audio", batch)
+        self.assertEqual(self.tts.voice_cache.stats()["hits"], 2)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,87 @@
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from dataclasses import dataclass
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import numpy as np
+
+from src.models.voice_prompt_cache import VoicePromptCache, reference_hash
+from src.utils.audio_io import AudioBuffer
+
+
+@dataclass
+class Prompt:
+    ref_code: list
+    ref_spk_embedding: list
+    ref_text: str = None
+
+
+def _pickle_torch():
+    """Stand-in for torch.save/torch.load that keeps the files readable without torch."""
+
+    def save(obj, path):
+        with open(path, "wb") as f:
+            pickle.dump(obj, f)
+
+    def load(path, map_location=None, weights_only=False):
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+    return SimpleNamespace(save=save, load=load)
+
+
+class TestVoicePromptCache(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_key_depends_on_audio_transcript_and_model(self):
+        voice = AudioBuffer(np.linspace(-1, 1, 1600), 16000)
+        same = AudioBuffer(np.linspace(-1, 1, 1600), 16000)
+        other = AudioBuffer(np.linspace(-1, 1, 1600), 24000)
+        key = VoicePromptCache.make_key(voice, "Hello", "model")
+
+        self.assertEqual(key, VoicePromptCache.make_key(same, "Hello", "model"))
+        self.assertNotEqual(key, VoicePromptCache.make_key(other, "Hello", "model"))
+        self.assertNotEqual(key, VoicePromptCache.make_key(voice, "Hi", "model"))
+        self.assertNotEqual(key, VoicePromptCache.make_key(voice, "Hello", "other-model"))
+
+        path = os.path.join(self.cache_dir, "ref.wav")
+        voice.write(path)
+        self.assertEqual(reference_hash(path), reference_hash(path))
+
+    def test_memory_lru_bound(self):
+        cache = VoicePromptCache(max_entries=2)
+        for key in ("a", "b"):
+            cache.put(key, key.upper())
+        self.assertEqual(cache.get("a"), "A")
+        cache.put("c", "C")
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual((cache.get("a"), cache.get("c")), ("A", "C"))
+        self.assertEqual(cache.stats(), {"hits": 3, "misses": 1, "entries": 2})
+
+    def test_prompts_persist_across_instances(self):
+        with patch("src.models.voice_prompt_cache.torch", _pickle_torch()):
+            VoicePromptCache(cache_dir=self.cache_dir).put("voice", Prompt([1, 2], [0.5], "Hello"))
+            reloaded = VoicePromptCache(cache_dir=self.cache_dir, prompt_factory=Prompt)
+            self.assertEqual(reloaded.get("voice"), Prompt([1, 2], [0.5], "Hello"))
+            self.assertIsNone(reloaded.get("unknown"))
+
+    def test_disk_is_trimmed_to_the_newest_entries(self):
+        with patch("src.models.voice_prompt_cache.torch", _pickle_torch()):
+            cache = VoicePromptCache(max_entries=1, cache_dir=self.cache_dir, max_disk_entries=10)
+            for i in range(100):
+                cache.put(f"voice{i:03d}", Prompt([i], [0.0]))
+                os.utime(os.path.join(self.cache_dir, f"voice{i:03d}.pt"), (i, i))
+        self.assertEqual(sorted(os.listdir(self.cache_dir)), [f"voice{i:03d}.pt" for i in range(90, 100)])
+
+
+if __name__ == "__main__":
+    unittest.main()
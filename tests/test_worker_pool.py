@@ -0,0 +1,162 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from src.core.state_manager import StateManager
+from src.core.worker_pool import run_worker_pool
+
+
+class FakeJob:
+    def __init__(self, audio_path, error=None):
+        self.audio_path = audio_path
+        self.error = error
+
+    def metadata(self):
+        return {"original_text": os.path.basename(self.audio_path)}
+
+
+class FakePipeline:
+    """Stands in for DubbingPipeline inside the spawned worker processes."""
+
+    def __init__(self, output_dir, target_lang, **options):
+        self.output_dir = output_dir
+        self.state = StateManager(output_dir, target_lang, read_only=options.get("read_only_manifest", False))
+        self.dubbed = 0
+
+    def dub_file(self, audio_path):
+        name = os.path.basename(audio_path)
+        if name == "crash.wav":
+            os._exit(3)
+        if name == "bad.wav":
+            return FakeJob(audio_path, error="TTS synthesis failed")
+        self.dubbed += 1
+        return FakeJob(audio_path)
+
+    def stats(self):
+        return {
+            "dedup": {"lines": self.dubbed},
+            "translation_cache": {"entries": 7},
+            "threads": {"omp": int(os.environ.get("OMP_NUM_THREADS", 0))},
+        }
+
+    def close(self):
+        self.state.close()
+
+
+class TestWorkerPool(unittest.TestCase):
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.input_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+        shutil.rmtree(self.input_dir, ignore_errors=True)
+
+    def _make_files(self, *names):
+        paths = []
+        for name in names:
+            path = os.path.join(self.input_dir, name)
+            with open(path, "wb") as f:
+                f.write(name.encode("utf-8"))
+            paths.append(path)
+        return paths
+
+    def test_results_are_recorded_by_the_parent(self):
+        """Tests that every file's outcome reaches the manifest, including a worker that crashed on one."""
+        files = self._make_files("a.wav", "b.wav", "bad.wav", "crash.wav", "c.wav")
+        finished = []
+
+        results = run_worker_pool(
+            files,
+            self.output_dir,
+            "Portuguese",
+            workers=2,
+            on_result=lambda path, ok: finished.append(path),
+            pipeline_factory=FakePipeline,
+        )
+
+        self.assertEqual(
+            {os.path.basename(path): ok for path, ok in results.items()},
+            {"a.wav": True, "b.wav": True, "bad.wav": False, "crash.wav": False, "c.wav": True},
+        )
+        self.assertEqual(sorted(finished), sorted(files))
+
+        state = StateManager(self.output_dir, "Portuguese")
+        a, _, bad, crash, _ = files
+        self.assertTrue(state.is_processed(a))
+        self.assertEqual(state.state[state.key_for(bad)]["error"], "TTS synthesis failed")
+        self.assertIn("exited unexpectedly", state.state[state.key_for(crash)]["error"])
+
+    def test_worker_stats_are_added_up(self):
+        """
+        Tests that every worker's counters reach the parent, summed, with shared cache sizes not multiplied,
+        and that workers start with their thread limit while the parent's environment is left as it was.
+        """
+        files = self._make_files("a.wav", "b.wav", "c.wav", "d.wav")
+        reported = []
+
+        with patch.dict(os.environ):
+            os.environ.pop("OMP_NUM_THREADS", None)
+            run_worker_pool(
+                files, self.output_dir, "Portuguese", workers=2, pipeline_factory=FakePipeline, on_stats=reported.append
+            )
+            self.assertNotIn("OMP_NUM_THREADS", os.environ)
+
+        (stats,) = reported
+        self.assertEqual(stats["dedup"], {"lines": 4})
+        self.assertEqual(stats["translation_cache"], {"entries": 7})
+        self.assertEqual(stats["threads"], {"omp": 2 * max(1, (os.cpu_count() or 1) // 2)})
+
+    def test_processed_files_are_skipped_by_workers(self):
+        """Tests that files already in the manifest for the same configuration are not dubbed again."""
+        (audio_path,) = self._make_files("a.wav")
+        state = StateManager(self.output_dir, "Portuguese")
+        state.mark_completed(audio_path, {"original_text": "earlier run"})
+        state.close()
+
+        results = run_worker_pool([audio_path], self.output_dir, "Portuguese", workers=4, pipeline_factory=FakePipeline)
+
+        self.assertEqual(results, {audio_path: True})
+        state = StateManager(self.output_dir, "Portuguese")
+        self.assertEqual(state.state[state.key_for(audio_path)]["metadata"], {"original_text": "earlier run"})
+
+    def test_duplicate_under_another_name_reuses_the_output(self):
+        """Tests that a worker copies the recorded output for an identical file and the parent records it."""
+        (audio_path,) = self._make_files("a.wav")
+        duplicate = os.path.join(self.input_dir, "copy_of_a.wav")
+        shutil.copyfile(audio_path, duplicate)
+        state = StateManager(self.output_dir, "Portuguese")
+        state.mark_completed(audio_path)
+        state.close()
+        with open(os.path.join(self.output_dir, "a.wav"), "wb") as f:
+            f.write(b"dubbed")
+
+        results = run_worker_pool([duplicate], self.output_dir, "Portuguese", workers=2, pipeline_factory=FakePipeline)
+
+        self.assertEqual(results, {duplicate: True})
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, "copy_of_a.wav")))
+        state = StateManager(self.output_dir, "Portuguese")
+        self.assertEqual(state.state[state.key_for(duplicate)]["outputs"], ["a.wav", "copy_of_a.wav"])
+
+    def test_workers_leave_the_manifest_to_the_parent(self):
+        """
+        Tests that workers closing their pipelines do not compact the manifest over lines the parent
+        appended meanwhile, even with journal lines from an earlier run for them to replay.
+        """
+        earlier, *files = self._make_files("earlier.wav", "a.wav", "b.wav", "c.wav", "d.wav")
+        state = StateManager(self.output_dir, "Portuguese")
+        state.mark_completed(earlier)
+
+        # The parent stops before its own final compaction, as if it were killed there
+        with patch.object(StateManager, "close"):
+            run_worker_pool(files, self.output_dir, "Portuguese", workers=2, pipeline_factory=FakePipeline)
+
+        state = StateManager(self.output_dir, "Portuguese")
+        for audio_path in [earlier, *files]:
+            self.assertTrue(state.is_processed(audio_path), audio_path)
+
+
+if __name__ == "__main__":
+    unittest.main()
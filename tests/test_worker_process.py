@@ -0,0 +1,116 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+from src.utils.worker_process import PersistentWorker, WorkerError, WorkerStartupError, WorkerTimeoutError
+
+ECHO_WORKER = """
+import json, os, subprocess, sys, time
+print("loading model...")
+print(json.dumps({"ready": True}), flush=True)
+for line in sys.stdin:
+    request = json.loads(line)
+    if request.get("crash"):
+        sys.exit(3)
+    if request.get("spawn"):
+        child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+        print(json.dumps({"ok": True, "echo": child.pid}), flush=True)
+        continue
+    if request.get("hang"):
+        time.sleep(30)
+    if request.get("crash_once") and not os.path.exists(request["marker"]):
+        open(request["marker"], "w").close()
+        sys.exit(3)
+    print(json.dumps({"ok": True, "echo": request["value"]}), flush=True)
+"""
+
+
+class TestPersistentWorker(unittest.TestCase):
+    def setUp(self):
+        self.worker = PersistentWorker([sys.executable, "-c", ECHO_WORKER], name="Echo", startup_timeout=30)
+
+    def tearDown(self):
+        self.worker.close()
+
+    def test_requests_share_one_process(self):
+        """Tests that several requests are answered by the same long-lived process."""
+        self.assertEqual(self.worker.request({"value": 1})["echo"], 1)
+        pid = self.worker._process.pid
+        self.assertEqual(self.worker.request({"value": 2})["echo"], 2)
+        self.assertEqual(self.worker._process.pid, pid)
+
+    def test_crash_raises_and_next_request_restarts(self):
+        """Tests that a repeated crash surfaces as WorkerError and the worker comes back on the next request."""
+        self.worker.request({"value": 1})
+        with self.assertRaises(WorkerError):
+            self.worker.request({"crash": True})
+        self.assertFalse(self.worker.is_alive())
+        self.assertEqual(self.worker.request({"value": 5})["echo"], 5)
+
+    def test_crash_is_retried_on_a_fresh_process(self):
+        """Tests that a worker dying mid-request is restarted and the request answered."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            marker = os.path.join(temp_dir, "crashed")
+            response = self.worker.request({"crash_once": True, "marker": marker, "value": 7})
+        self.assertEqual(response["echo"], 7)
+        self.assertEqual(self.worker.restarts, 1)
+
+    def test_timeout_is_not_retried(self):
+        """Tests that a request the worker does not answer in time fails at once, without a retry."""
+        self.worker.request_timeout = 0.5
+        self.worker.max_retries = 2
+        with self.assertRaises(WorkerTimeoutError):
+            self.worker.request({"hang": True, "value": 1})
+        self.assertEqual(self.worker.restarts, 0)
+        self.assertFalse(self.worker.is_alive())
+
+        self.worker.request_timeout = 30
+        self.assertEqual(self.worker.request({"value": 2})["echo"], 2)
+
+    @unittest.skipUnless(os.path.isdir("/proc"), "needs /proc to inspect processes")
+    def test_timeout_kills_the_processes_the_worker_started(self):
+        """
+        Tests that a stuck worker is killed together with its own children, as with a `uv run` launcher,
+        and that its pipes are closed.
+        """
+        child_pid = self.worker.request({"spawn": True, "value": 0})["echo"]
+        process = self.worker._process
+        self.worker.request_timeout = 0.5
+        with self.assertRaises(WorkerTimeoutError):
+            self.worker.request({"hang": True, "value": 1})
+
+        self.assertTrue(process.stdin.closed)
+        self.assertTrue(process.stdout.closed)
+        deadline = time.monotonic() + 5
+        while self._running(child_pid) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertFalse(self._running(child_pid))
+
+    @staticmethod
+    def _running(pid):
+        try:
+            with open(f"/proc/{pid}/stat", encoding="utf-8") as f:
+                # Killed but not yet reaped by init
+                return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+        except FileNotFoundError:
+            return False
+
+    def test_startup_failure_is_not_retried(self):
+        """Tests that a worker reporting a failed model load raises WorkerStartupError."""
+        script = 'import json; print(json.dumps({"ready": False, "error": "no model"}), flush=True)'
+        worker = PersistentWorker([sys.executable, "-c", script], name="Broken")
+        with self.assertRaises(WorkerStartupError):
+            worker.request({"value": 1})
+        self.assertEqual(worker.restarts, 0)
+
+    def test_missing_executable(self):
+        """Tests that a worker command that cannot be started raises WorkerError."""
+        worker = PersistentWorker(["definitely-not-a-real-binary"], name="Missing")
+        with self.assertRaises(WorkerStartupError):
+            worker.request({"value": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()